@@ -0,0 +1,178 @@
+'''
+Precomputed analytics cube of a region's hourly carbon intensity & source production.
+
+The cube is built once from <region>_<direct/lifecycle>_emissions.csv, and holds sums & counts over
+local date x local hour x source:
+    generation - production of each source (MWh)
+    share      - fraction of the hour's total production from each source
+    carbon_intensity (g/kWh, one value per hour)
+Sums & counts are also rolled up over month x local hour, so averages by local hour and/or
+month (e.g., mean solar share by local hour in Jul-Sep) are read from the rollup, without going
+back to the hourly data. The cube is saved next to the dataset, with the hash of the dataset and
+the timezone as its version, and rebuilt only when the dataset changes.
+'''
+
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import timeZones
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SRC_DIR, "..", "data")
+MEASURES = ["carbon_intensity", "generation", "share"]
+GROUP_BY = ["hour", "month", "month_hour", "date", None]
+NON_SOURCE_COLUMNS = ["UTC time", "carbon_intensity", "Unnamed: 0"]
+
+
+class AnalyticsCube:
+    """Sums & counts of carbon intensity and source production, by local date, local hour & source"""
+
+    def __init__(self, dates, sources, sums, counts, version=""):
+        self.dates = np.asarray(dates, dtype="datetime64[D]") # local dates
+        self.sources = list(sources)
+        self.sums = sums # {measure: (date x hour) or (date x hour x source)}
+        self.counts = counts
+        self.version = version
+        # rollup over month x hour
+        months = self.getMonths()
+        self.monthHourSums, self.monthHourCounts = {}, {}
+        for measure in MEASURES:
+            self.monthHourSums[measure] = np.zeros((12,)+self.sums[measure].shape[1:])
+            self.monthHourCounts[measure] = np.zeros((12,)+self.counts[measure].shape[1:])
+            np.add.at(self.monthHourSums[measure], months-1, self.sums[measure])
+            np.add.at(self.monthHourCounts[measure], months-1, self.counts[measure])
+
+    @classmethod
+    def build(cls, dataset, localTimeZone, version=""):
+        '''
+        dataset: DataFrame with "UTC time", "carbon_intensity" and one column per source.
+        '''
+        localDates, localHours = timeZones.getLocalDateAndHour(dataset["UTC time"].values, localTimeZone)
+        dates, dateIdx = np.unique(localDates, return_inverse=True)
+        cells = np.reshape(dateIdx, -1)*24 + localHours
+        numCells = len(dates)*24
+
+        sources = [col for col in dataset.columns if col not in NON_SOURCE_COLUMNS]
+        generation = dataset[sources].to_numpy(dtype=np.float64)
+        carbonIntensity = dataset["carbon_intensity"].to_numpy(dtype=np.float64)
+        totalGeneration = np.nansum(generation, axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(totalGeneration > 0, np.nan_to_num(generation) / totalGeneration, np.nan)
+
+        sums, counts = {}, {}
+        for measure, values in [("carbon_intensity", carbonIntensity[:, np.newaxis]), ("generation", generation),
+                                ("share", share)]:
+            available = ~np.isnan(values)
+            measureSums = np.zeros((numCells, values.shape[1]))
+            measureCounts = np.zeros((numCells, values.shape[1]))
+            for i in range(values.shape[1]):
+                measureSums[:, i] = np.bincount(cells, np.where(available[:, i], values[:, i], 0), numCells)
+                measureCounts[:, i] = np.bincount(cells, available[:, i], numCells)
+            sums[measure] = np.reshape(measureSums, (len(dates), 24, values.shape[1]))
+            counts[measure] = np.reshape(measureCounts, (len(dates), 24, values.shape[1]))
+        sums["carbon_intensity"] = sums["carbon_intensity"][:, :, 0]
+        counts["carbon_intensity"] = counts["carbon_intensity"][:, :, 0]
+        return cls(dates, sources, sums, counts, version)
+
+    def getMonths(self):
+        return self.dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    def save(self, fileName):
+        arrays = {}
+        for measure in MEASURES:
+            arrays[measure+"_sum"] = self.sums[measure]
+            arrays[measure+"_count"] = self.counts[measure]
+        np.savez(fileName, dates=self.dates, sources=np.array(self.sources), version=np.array(self.version),
+                 **arrays)
+
+    @classmethod
+    def load(cls, fileName):
+        with np.load(fileName) as cubeFile:
+            sums = {measure: cubeFile[measure+"_sum"] for measure in MEASURES}
+            counts = {measure: cubeFile[measure+"_count"] for measure in MEASURES}
+            return cls(cubeFile["dates"], cubeFile["sources"].tolist(), sums, counts, str(cubeFile["version"]))
+
+    def average(self, measure, by="hour", months=None, hours=None):
+        '''
+        Average of a measure, grouped by local hour, month, month & hour, local date or over all
+        selected hours (by=None). months/hours: lists of months (1-12) & local hours (0-23) to include.
+        Returns a DataFrame with one column per source (a Series for carbon_intensity).
+        '''
+        if (measure not in MEASURES):
+            raise ValueError(f"Unknown measure: {measure}. Available measures: {MEASURES}")
+        if (by not in GROUP_BY):
+            raise ValueError(f"Unknown grouping: {by}. Available groupings: {GROUP_BY}")
+        monthMask = np.ones(12, dtype=bool) if months is None else np.isin(np.arange(1, 13), months)
+        hourMask = np.ones(24, dtype=bool) if hours is None else np.isin(np.arange(24), hours)
+        if (by == "date"):
+            dateMask = monthMask[self.getMonths()-1]
+            sums = np.sum(self.sums[measure][dateMask][:, hourMask], axis=1)
+            counts = np.sum(self.counts[measure][dateMask][:, hourMask], axis=1)
+            index = pd.DatetimeIndex(self.dates[dateMask], name="date")
+        else:
+            sums = self.monthHourSums[measure][monthMask][:, hourMask]
+            counts = self.monthHourCounts[measure][monthMask][:, hourMask]
+            if (by == "hour"):
+                sums, counts = np.sum(sums, axis=0), np.sum(counts, axis=0)
+                index = pd.Index(np.flatnonzero(hourMask), name="hour")
+            elif (by == "month"):
+                sums, counts = np.sum(sums, axis=1), np.sum(counts, axis=1)
+                index = pd.Index(np.flatnonzero(monthMask)+1, name="month")
+            elif (by == "month_hour"):
+                sums = np.reshape(sums, (-1,)+sums.shape[2:])
+                counts = np.reshape(counts, (-1,)+counts.shape[2:])
+                index = pd.MultiIndex.from_product([np.flatnonzero(monthMask)+1, np.flatnonzero(hourMask)],
+                                                   names=["month", "hour"])
+            else:
+                sums, counts = np.sum(sums, axis=(0, 1))[np.newaxis], np.sum(counts, axis=(0, 1))[np.newaxis]
+                index = pd.Index(["all"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            averages = sums / counts
+        if (measure == "carbon_intensity"):
+            return pd.Series(averages, index=index, name=measure)
+        return pd.DataFrame(averages, index=index, columns=self.sources)
+
+def getDatasetVersion(inFileName, localTimeZone):
+    sha = hashlib.sha1()
+    with open(inFileName, "rb") as inFile:
+        for block in iter(lambda: inFile.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()+"_"+str(localTimeZone)
+
+def getCube(region, emissionFactorType="direct", localTimeZone=None, inFileName=None, cubeFileName=None):
+    """Cube of a region, loaded from its saved file if the dataset has not changed since it was built"""
+    if (inFileName is None):
+        inFileName = os.path.join(DATA_DIR, region, region+"_"+emissionFactorType+"_emissions.csv")
+    if (cubeFileName is None):
+        cubeFileName = os.path.splitext(inFileName)[0]+"_cube.npz"
+    if (localTimeZone is None):
+        localTimeZone = timeZones.getRegionTimeZone(region)
+    version = getDatasetVersion(inFileName, localTimeZone)
+    if (os.path.exists(cubeFileName)):
+        cube = AnalyticsCube.load(cubeFileName)
+        if (cube.version == version):
+            return cube
+        print("Dataset changed since the cube was built. Rebuilding ", cubeFileName)
+    startTime = time.time()
+    cube = AnalyticsCube.build(pd.read_csv(inFileName, header=0), localTimeZone, version)
+    cube.save(cubeFileName)
+    print("Cube built in ", round(time.time()-startTime, 3), "s & saved to ", cubeFileName)
+    return cube
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 3):
+        print("Usage: python3 analyticsCube.py <region> <-l/-d> [months, e.g., 7,8,9]")
+        print("Shows the average source shares & carbon intensity by local hour.")
+        exit(0)
+    emissionFactorType = "lifecycle" if sys.argv[2] == "-l" else "direct"
+    months = None if len(sys.argv) < 4 else [int(month) for month in sys.argv[3].split(",")]
+    cube = getCube(sys.argv[1], emissionFactorType)
+    table = cube.average("share", "hour", months).round(3)
+    table["carbon_intensity"] = cube.average("carbon_intensity", "hour", months).round(3)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(table)
@@ -0,0 +1,91 @@
+'''
+NumPy inference of the first tier ANN (Flatten -> Dense -> Dense -> Dense, see firstTierForecasts.trainANN).
+
+The weights & activations of the Dense layers are exported from the saved Keras model (e.g.,
+best_model_ann.h5) to an .npz file. NumpyANN runs the forward pass with NumPy matmuls only, so
+forecasts can be made without TensorFlow, and without the overhead of model.predict() on every call.
+Only exporting needs Keras.
+'''
+
+import os
+import sys
+
+import numpy as np
+
+SUPPORTED_LAYERS = ["Flatten", "Dense", "InputLayer"]
+
+def relu(x):
+    return np.maximum(x, 0)
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+def elu(x):
+    return np.where(x > 0, x, np.expm1(np.minimum(x, 0)))
+
+ACTIVATIONS = {"linear": lambda x: x, "relu": relu, "tanh": np.tanh, "sigmoid": sigmoid, "elu": elu}
+
+
+class NumpyANN:
+    """Forward pass of a stack of Dense layers, on flattened (samples x hours x features) inputs"""
+
+    def __init__(self, kernels, biases, activations):
+        for activation in activations:
+            if (activation not in ACTIVATIONS):
+                raise ValueError(f"Unknown activation: {activation}. Available activations: {list(ACTIVATIONS)}")
+        self.kernels = [np.asarray(kernel, dtype=np.float32) for kernel in kernels]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+        self.activations = list(activations)
+
+    @classmethod
+    def fromModel(cls, model):
+        kernels, biases, activations = [], [], []
+        for layer in model.layers:
+            layerType = type(layer).__name__
+            if (layerType not in SUPPORTED_LAYERS):
+                raise ValueError(f"Unsupported layer: {layerType}. Supported layers: {SUPPORTED_LAYERS}")
+            if (layerType == "Dense"):
+                kernel, bias = layer.get_weights()
+                kernels.append(kernel)
+                biases.append(bias)
+                activations.append(layer.get_config()["activation"])
+        return cls(kernels, biases, activations)
+
+    def save(self, fileName):
+        arrays = {}
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            arrays["kernel_"+str(i)] = kernel
+            arrays["bias_"+str(i)] = bias
+        np.savez(fileName, activations=np.array(self.activations), **arrays)
+
+    @classmethod
+    def load(cls, fileName):
+        with np.load(fileName) as weightsFile:
+            activations = weightsFile["activations"].tolist()
+            kernels = [weightsFile["kernel_"+str(i)] for i in range(len(activations))]
+            biases = [weightsFile["bias_"+str(i)] for i in range(len(activations))]
+        return cls(kernels, biases, activations)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        # same arguments as model.predict(), so it can be used in place of the Keras model
+        output = np.reshape(np.asarray(x, dtype=np.float32), (len(x), -1))
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            output = ACTIVATIONS[activation](output @ kernel + bias)
+        return output
+
+def exportWeights(modelFileName, outFileName=None):
+    """Exports the Dense layers of a saved Keras model to <model file name>.npz (or outFileName)"""
+    from keras.models import load_model
+    if (outFileName is None):
+        outFileName = os.path.splitext(modelFileName)[0]+".npz"
+    model = NumpyANN.fromModel(load_model(modelFileName, compile=False))
+    model.save(outFileName)
+    print("Weights of ", modelFileName, " exported to ", outFileName)
+    return model
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 2):
+        print("Usage: python3 annInference.py <model.h5> [out_file.npz]")
+        print("Exports the weights of a first tier ANN for NumPy inference.")
+        exit(0)
+    exportWeights(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
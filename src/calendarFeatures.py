@@ -0,0 +1,66 @@
+'''
+Date & time (calendar) features used as model inputs:
+    hour_sin, hour_cos   - hour of day
+    month_sin, month_cos - time of year
+    weekend              - 1 on Saturday & Sunday, 0 otherwise
+
+Features are calculated for the whole series of timestamps at once. Most series are regular
+(e.g., hourly), so features are memoized by (start, end, freq) and reused when the same period is
+used again, e.g., for each source, period & experiment in the first tier.
+'''
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_FEATURES = ["hour_sin", "hour_cos", "month_sin", "month_cos", "weekend"]
+SEC_IN_DAY = 24 * 60 * 60 # Seconds in day
+SEC_IN_YEAR = (365.25) * SEC_IN_DAY # Seconds in year
+
+
+def getNanoseconds(dateTime):
+    # nanoseconds since epoch (UTC for timezone-aware timestamps)
+    return dateTime.values.astype("datetime64[ns]").astype(np.int64)
+
+def calculateCalendarFeatures(dateTime):
+    # dateTime: DatetimeIndex (naive timestamps are treated as UTC)
+    hour = dateTime.hour.values
+    seconds = np.round(getNanoseconds(dateTime) / 1e9, 6) # same as Timestamp.timestamp()
+    features = {
+        "hour_sin": np.sin(hour * (2 * np.pi / 24)),
+        "hour_cos": np.cos(hour * (2 * np.pi / 24)),
+        "month_sin": np.sin(seconds * (2 * np.pi / SEC_IN_YEAR)),
+        "month_cos": np.cos(seconds * (2 * np.pi / SEC_IN_YEAR)),
+        "weekend": (dateTime.weekday.values >= 5).astype(np.int64)
+    }
+    for values in features.values():
+        values.setflags(write=False)
+    return features
+
+@functools.lru_cache(maxsize=32)
+def getCalendarFeaturesForPeriod(start, end, freq):
+    return calculateCalendarFeatures(pd.date_range(start, end, freq=freq))
+
+def getCalendarFeatures(dateTime):
+    '''
+    {feature: read-only array} for each timestamp in dateTime.
+    Features of regular series are memoized by (start, end, freq).
+    '''
+    dateTime = pd.DatetimeIndex(pd.to_datetime(dateTime))
+    if (len(dateTime) > 1):
+        steps = np.diff(getNanoseconds(dateTime))
+        if (steps[0] > 0 and (steps == steps[0]).all()):
+            return getCalendarFeaturesForPeriod(dateTime[0], dateTime[-1], pd.Timedelta(int(steps[0]), unit="ns"))
+    return calculateCalendarFeatures(dateTime)
+
+# Date time feature engineering
+def addDateTimeFeatures(dataset, dateTime, startCol):
+    # features are inserted after column startCol
+    features = getCalendarFeatures(dateTime)
+    print(len(dateTime)-np.sum(features["weekend"]), np.sum(features["weekend"]))
+    loc = startCol+1
+    for i, feature in enumerate(CALENDAR_FEATURES):
+        # copy, as the dataset may be modified in place
+        dataset.insert(loc=loc+i, column=feature, value=np.array(features[feature]))
+    return dataset
@@ -5,54 +5,49 @@ carbon intensity forecasts from source production forecasts (DACF).
 CODE TO WRITE CARBON DATA TO FILE IS CURRENTLY COMMENTED. UNCOMMENT IF REQUIRED.
 '''
 
+import contextlib
 import csv
+import io
+import json
 import math
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as dt
 from datetime import timezone as tz
+from types import MappingProxyType
 import os
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import pytz as pytz
-import tensorflow as tf
 
+import carbonIntensityEngine
+import dataCleaning
+import emissionFactorTables
+import forecastMetrics
+import hourlyReindex
+import timeZones
 from config_manager import Config
-from config import Config
 
 CARBON_INTENSITY_COLUMN = 1 # column for real-time carbon intensity
 SRC_START_COL = 1
+REAL_TIME_SRC_START_COL = 3 # After 'Unnamed: 0', 'UTC time', 'carbon_intensity'
 PREDICTION_WINDOW_HOURS = 96
 MODEL_SLIDING_WINDOW_LEN = 24
 TEST_PERIOD = "Jul_Dec_2021"
+HOURLY_FILL_POLICY = "ffill" # fill policy for hours missing in real-time data (see hourlyReindex.py)
+STREAM_CHUNK_HOURS = 24*365 # no. of rows read at a time in streaming mode
 
-# Operational carbon emission factors
-# Carbon rate used by electricityMap. Checkout this link:
-# https://github.com/electricitymap/electricitymap-contrib/blob/master/config/co2eq_parameters_direct.json
-
-# Median direct emission factors
-carbonRateDirect = {"coal": 760, "biomass": 0, "nat_gas": 370, "geothermal": 0, "hydro": 0,
-                "nuclear": 0, "oil": 406, "solar": 0, "unknown": 575, 
-                "other": 575, "wind": 0} # g/kWh # check for biomass. it is > 0
-forcast_carbonRateDirect = {"avg_coal_production_forecast": 760, "avg_biomass_production_forecast": 0, 
-                "avg_nat_gas_production_forecast": 370, "avg_geothermal_production_forecast": 0, 
-                "avg_hydro_production_forecast": 0, "avg_nuclear_production_forecast": 0, 
-                "avg_oil_production_forecast": 406, "avg_solar_production_forecast": 0, 
-                "avg_unknown_production_forecast": 575, "avg_other_production_forecast": 575, 
-                "avg_wind_production_forecast": 0} # g/kWh # correct biomass
-
-# Median lifecycle emission factors
-carbonRateLifecycle = {"coal": 820, "biomass": 230, "nat_gas": 490, "geothermal": 38, "hydro": 24,
-                "nuclear": 12, "oil": 650, "solar": 45, "unknown": 700, 
-                "other": 700, "wind": 11} # g/kWh
-forcast_carbonRateLifecycle = {"avg_coal_production_forecast": 820, "avg_biomass_production_forecast": 230, 
-                "avg_nat_gas_production_forecast": 490, "avg_geothermal_production_forecast": 38, 
-                "avg_hydro_production_forecast": 24, "avg_nuclear_production_forecast": 12, 
-                "avg_oil_production_forecast": 650, "avg_solar_production_forecast": 45, 
-                "avg_unknown_production_forecast": 700, "avg_other_production_forecast": 700, 
-                "avg_wind_production_forecast": 11} # g/kWh
+# Operational carbon emission factors (read-only). See emissionFactorTables.py for the values.
+# Use emissionFactorTables.getEmissionFactorTable for region specific (e.g., SE) & configured values.
+carbonRateDirect = emissionFactorTables.DEFAULT_CARBON_RATES["direct"]
+forcast_carbonRateDirect = MappingProxyType({emissionFactorTables.getForecastColName(source): rate 
+                for source, rate in carbonRateDirect.items()})
+carbonRateLifecycle = emissionFactorTables.DEFAULT_CARBON_RATES["lifecycle"]
+forcast_carbonRateLifecycle = MappingProxyType({emissionFactorTables.getForecastColName(source): rate 
+                for source, rate in carbonRateLifecycle.items()})
 
 
 def initialize(inFileName):
@@ -69,9 +64,7 @@ def initialize(inFileName):
             
         print(dataset.head(2))
         print(dataset.tail(2))
-        dataset.replace(np.nan, 0, inplace=True)
-        num = dataset._get_numeric_data()
-        num[num<0] = 0
+        dataset = cleanDataset(dataset)
         
         print(dataset.columns)
         return dataset
@@ -86,66 +79,38 @@ def initialize(inFileName):
         print(f"Error reading file {inFileName}: {e}")
         sys.exit(1)
 
-def createHourlyTimeCol(dataset, datetime, startDate):
-    modifiedDataset = pd.DataFrame(np.empty((17544, len(dataset.columns.values))) * np.nan,
-                    columns=dataset.columns.values)
-    startDateTime = np.datetime64(startDate)
-    hourlyDateTime = []
-    hourlyDateTime.append(startDateTime)
-    idx = 0
-    modifiedDataset.iloc[0] = dataset.iloc[0]
-    for i in range(17544-1):
-        hourlyDateTime.append(hourlyDateTime[i] +np.timedelta64(1, 'h'))
-        # # print(datetime[i+1], datetime[i], (datetime[i+1]-datetime[i]).total_seconds())
-        # # if (hourlyDateTime[-1] != datetime[i+1]):
-        # if ((pd.Timestamp(datetime[i+1]).hour-pd.Timestamp(datetime[i]).hour) != 1):
-        #     if (pd.Timestamp(datetime[i]).hour == 23 and pd.Timestamp(datetime[i+1]).hour == 0):
-        #         pass
-        #     else:
-        #     # print(i, hourlyDateTime[-1], datetime[i+1])
-        #         print(i, datetime[i], datetime[i+1], pd.Timestamp(datetime[i]).hour, pd.Timestamp(datetime[i+1]).hour)
-        #     # print(dataset.iloc[i-1])
-        #     # print(dataset.iloc[i])
-    # exit(0)
-    return hourlyDateTime
-
-def calculateCarbonIntensity(dataset, carbonRate, numSources):
+def cleanDataset(dataset):
+    # missing values are 0 and negative values are clipped to 0
+    dataset.replace(np.nan, 0, inplace=True)
+    numericCols = dataset.select_dtypes(include=np.number).columns
+    cleanedData, touched = dataCleaning.cleanData(dataset[numericCols].to_numpy(dtype=np.float64), "zero")
+    for j in np.flatnonzero(touched.any(axis=0)):
+        col = numericCols[j]
+        dataset[col] = cleanedData[:, j].astype(dataset[col].dtype)
+    return dataset
+
+def alignToHourlyGrid(dataset, fillPolicy=HOURLY_FILL_POLICY):
+    """Insert hours missing in a real-time dataset, so that there is exactly one row per hour"""
+    dataset, insertedHours = hourlyReindex.reindexHourly(dataset, "UTC time", fillPolicy)
+    if (insertedHours.any()):
+        print("Inserted ", np.count_nonzero(insertedHours), " missing hours (fill policy: ", fillPolicy, ")")
+    return dataset
+
+def calculateCarbonIntensity(dataset, carbonRate, numSources, previousRow=None):
     global CARBON_INTENSITY_COLUMN
-    carbonIntensity = 0
-    carbonCol = []
     
     # Find the actual source columns by skipping datetime and existing carbon_intensity columns
-    source_start_col = 3  # After 'Unnamed: 0', 'UTC time', 'carbon_intensity'
+    source_start_col = REAL_TIME_SRC_START_COL
     miniDataset = dataset.iloc[:, source_start_col:source_start_col+numSources]
     print("**", miniDataset.columns.values)
-    
-    # Only sum numeric columns (exclude datetime)
-    rowSum = miniDataset.sum(axis=1, numeric_only=True).to_list()
-    
-    for i in range(len(miniDataset)):
-        if(rowSum[i] == 0):
-            # basic algorithm to fill missing values if all sources are missing
-            # just using the previous hour's value
-            # same as electricityMap
-            for j in range(source_start_col, source_start_col + numSources):
-                if(dataset.iloc[i, j] == 0):
-                    dataset.iloc[i, j] = dataset.iloc[i-1, j]
-                miniDataset.iloc[i] = dataset.iloc[i, source_start_col:source_start_col+numSources]
-                # print(miniDataset.iloc[i])
-            rowSum[i] = rowSum[i-1]
-        carbonIntensity = 0
-        for j in range(len(miniDataset.columns.values)):
-            source = miniDataset.columns.values[j]
-            # Handle division by zero
-            if rowSum[i] != 0:
-                sourceContribFrac = miniDataset.iloc[i, j]/rowSum[i]
-            else:
-                sourceContribFrac = 0
-            # print(sourceContribFrac, carbonRate[source])
-            carbonIntensity += (sourceContribFrac * carbonRate[source])
-        if (carbonIntensity == 0):
-            print(miniDataset.iloc[i])
-        carbonCol.append(round(carbonIntensity, 2)) # rounding to 2 values after decimal place
+
+    # previousRow: source values of the hour before the dataset, when it is a chunk of a file
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(miniDataset.columns.values, carbonRate)
+    carbonCol, filledData, zeroRows = carbonIntensityEngine.calculateCarbonIntensity(
+                    miniDataset.to_numpy(dtype=np.float64), emissionFactors, previousRow=previousRow)
+    writeFilledRowsToDataset(dataset, source_start_col, filledData, zeroRows)
+    if (np.any(carbonCol == 0)):
+        print(dataset.iloc[carbonCol == 0, source_start_col:source_start_col+numSources])
     
     # Replace the existing carbon_intensity column or add a new one
     if 'carbon_intensity' in dataset.columns:
@@ -157,46 +122,87 @@ def calculateCarbonIntensity(dataset, carbonRate, numSources):
 def calculateCarbonIntensityFromSourceForecasts(dataset, carbonRate, numSources):
     global SRC_START_COL
     global CARBON_INTENSITY_COLUMN
-    carbonCol = []
     miniDataset = dataset.iloc[:, SRC_START_COL:SRC_START_COL+numSources]
     print("**", miniDataset.columns.values)
-    rowSum = miniDataset.sum(axis=1).to_list()
-    for i in range(len(miniDataset)):
-        if(rowSum[i] == 0):
-            # basic algorithm to fill missing values if all sources are missing
-            # just using the previous hour's value
-            # same as electricityMap
-            for j in range(1, len(dataset.columns.values)):
-                if(dataset.iloc[i, j] == 0):
-                    dataset.iloc[i, j] = dataset.iloc[i-1, j]
-                miniDataset.iloc[i] = dataset.iloc[i, SRC_START_COL:SRC_START_COL+numSources]
-                # print(miniDataset.iloc[i])
-            rowSum[i] = rowSum[i-1]
-        carbonIntensity = 0
-        for j in range(len(miniDataset.columns.values)):
-            source = miniDataset.columns.values[j]
-            # Handle division by zero
-            if rowSum[i] != 0:
-                sourceContribFrac = miniDataset.iloc[i, j]/rowSum[i]
-            else:
-                sourceContribFrac = 0
-            # print(sourceContribFrac, carbonRate[source])
-            carbonIntensity += (sourceContribFrac * carbonRate[source])
-        if (carbonIntensity == 0):
-            print(miniDataset.iloc[i])
-        carbonCol.append(round(carbonIntensity, 2)) # rounding to 2 values after decimal place
+
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(miniDataset.columns.values, carbonRate)
+    carbonCol, _, zeroRows = carbonIntensityEngine.calculateCarbonIntensity(
+                    miniDataset.to_numpy(dtype=np.float64), emissionFactors)
+    if (zeroRows.any()):
+        # all columns after the time column are filled for the missing hours
+        filledData, _, _, _ = dataCleaning.repairZeroRows(dataset.iloc[:, 1:].to_numpy(dtype=np.float64), 
+                        carbonIntensityEngine.ZERO_ROW_LEADING_GAP_POLICY, zeroRows=zeroRows)
+        writeFilledRowsToDataset(dataset, 1, filledData, zeroRows)
+    if (np.any(carbonCol == 0)):
+        print(dataset.iloc[carbonCol == 0, SRC_START_COL:SRC_START_COL+numSources])
     dataset.insert(loc=CARBON_INTENSITY_COLUMN, column="carbon_from_src_forecasts", value=carbonCol)
     return dataset
 
+def writeFilledRowsToDataset(dataset, startCol, filledData, zeroRows):
+    # Write back the values filled for hours where all sources were missing,
+    # keeping the original dtype of each column.
+    if (not zeroRows.any()):
+        return dataset
+    rows = np.flatnonzero(zeroRows)
+    for j in range(filledData.shape[1]):
+        col = startCol + j
+        dataset.iloc[rows, col] = filledData[rows, j].astype(dataset.dtypes.iloc[col])
+    return dataset
+
+
+
+def getSourceColumns(columns, carbonRate, srcStartCol=REAL_TIME_SRC_START_COL):
+    # source columns are the columns after srcStartCol that have an emission factor
+    return [col for col in columns[srcStartCol:] if col in carbonRate]
+
+def getForecastCarbonRate(carbonRate):
+    # source production forecast columns are named avg_<source>_production_forecast
+    # (emission factor tables already accept both column names)
+    if (isinstance(carbonRate, emissionFactorTables.EmissionFactorTable)):
+        return carbonRate
+    return {emissionFactorTables.getForecastColName(source): rate for source, rate in carbonRate.items()}
+
+def getEmissionFactorSets(region, factorFileNames=None, config_file=None):
+    """Get direct, lifecycle and user-defined (what-if) emission factor tables for a region.
+    What-if files are JSON tables of {source: emission factor}. Sources missing in a file
+    use the direct emission factors of the region."""
+    carbonRates = {"direct": emissionFactorTables.getEmissionFactorTable(region, "direct", config_file),
+                   "lifecycle": emissionFactorTables.getEmissionFactorTable(region, "lifecycle", config_file)}
+    if (factorFileNames is None):
+        factorFileNames = []
+    for factorFileName in factorFileNames:
+        with open(factorFileName, "r") as factorFile:
+            factors = json.load(factorFile)
+        name = os.path.splitext(os.path.basename(factorFileName))[0]
+        carbonRates[name] = emissionFactorTables.EmissionFactorTable(region, name, 
+                                {**carbonRates["direct"], **factors})
+    return carbonRates
+
+def calculateCarbonIntensitySweep(dataset, carbonRates, numSources, isForecast):
+    """Calculate carbon intensity for K emission factor sets in one pass over the source data.
+    carbonRates: {name: carbonRate}, with source names (e.g., "coal") as keys.
+    Returns a DataFrame with UTC time and one carbon intensity column per emission factor set."""
+    srcStartCol = REAL_TIME_SRC_START_COL
+    colPrefix = "carbon_intensity_"
+    if (isForecast is True):
+        srcStartCol = SRC_START_COL
+        colPrefix = "carbon_from_src_forecasts_"
+        carbonRates = {name: getForecastCarbonRate(carbonRate) for name, carbonRate in carbonRates.items()}
+    miniDataset = dataset.iloc[:, srcStartCol:srcStartCol+numSources]
+    print("**", miniDataset.columns.values)
+
+    emissionFactors = carbonIntensityEngine.getEmissionFactorMatrix(miniDataset.columns.values, 
+                    list(carbonRates.values()))
+    carbonIntensity, _, _ = carbonIntensityEngine.calculateCarbonIntensity(
+                    miniDataset.to_numpy(dtype=np.float64), emissionFactors)
+
+    sweepDataset = pd.DataFrame(carbonIntensity, columns=[colPrefix+name for name in carbonRates])
+    sweepDataset.insert(loc=0, column="UTC time", value=dataset["UTC time"].values)
+    return sweepDataset
 
 def getDatesInLocalTimeZone(dateTime, localTimezone):
-    dates = []
-    fromZone = pytz.timezone("UTC")
-    for i in range(0, len(dateTime), 24):
-        day = pd.to_datetime(dateTime[i]).replace(tzinfo=fromZone)
-        day = day.astimezone(localTimezone)
-        dates.append(day)    
-    return dates
+    # local time of the first hour of each day
+    return timeZones.getLocalDayStarts(dateTime, localTimezone)
 
 def manipulateTestDataShape(data, slidingWindowLen, predictionWindowHours, isDates=False): 
     X = list()
@@ -212,34 +218,14 @@ def manipulateTestDataShape(data, slidingWindowLen, predictionWindowHours, isDat
     return X
 
 def getMape(dates, actual, forecast, predictionWindowHours):
-    mape = tf.keras.losses.MeanAbsolutePercentageError()
-    # avgDailyMape = []
-    # for i in range(0, len(actual), 24):
-    #     mapeTensor =  mape(actual[i:i+24], forecast[i:i+24])
-    #     mapeScore = mapeTensor.numpy()
-    #     print("Day: ", dates[i], "MAPE: ", mapeScore)
-    #     avgDailyMape.append(mapeScore)
-
-    mse = tf.keras.losses.MeanSquaredError()
-
-    rows, cols = len(actual)//predictionWindowHours, predictionWindowHours//24
-    dailyMapeScore = np.zeros((rows, cols))
-    dailyRmseScore = np.zeros((rows, cols))
-    for i in range(0, len(actual), predictionWindowHours):
-        for j in range(0, predictionWindowHours, 24):
-            mapeTensor =  mape(actual[i+j:i+j+24], forecast[i+j:i+j+24])
-            rmseScore = round(math.sqrt(mse(actual[i+j:i+j+24], forecast[i+j:i+j+24]).numpy()), 6)
-            mapeScore = mapeTensor.numpy()
-            dailyMapeScore[i//predictionWindowHours][j//24] = mapeScore
-            dailyRmseScore[i//predictionWindowHours][j//24] = rmseScore
-
-    mapeTensor =  mape(actual, forecast)
-    mapeScore = mapeTensor.numpy()
-    # return avgDailyMape, mapeScore
+    dailyMapeScore = forecastMetrics.getDailyMAPE(actual, forecast, predictionWindowHours)
+    dailyRmseScore = forecastMetrics.getDailyRMSE(actual, forecast, predictionWindowHours)
+    mapeScore = forecastMetrics.getMAPE(actual, forecast)
     return dailyMapeScore, mapeScore, dailyRmseScore
 
-def runProgram(region, isLifecycle, isForecast, numSources, config_file=None):
-    """Run program with configuration support and fallback to hardcoded paths"""
+def getInputFileNames(region, isLifecycle, isForecast, config_file=None):
+    """Get real-time and source forecast file names, using config with fallback to hardcoded paths"""
+    forecast_file = None
     
     # Try to use config manager first
     try:
@@ -292,79 +278,245 @@ def runProgram(region, isLifecycle, isForecast, numSources, config_file=None):
         print(f"Error: Forecast file not found: {forecast_file}")
         sys.exit(1)
     
-    dataset = initialize(real_time_file)
-    forecastDataset = None
-    if (isForecast is True):
-        forecastDataset = initialize(forecast_file)
+    return real_time_file, forecast_file
 
-    # Special case: SE unknown/other lifecycle CEF was 292.9 as per ElectricityMap
-    # TODO: In later verwsions, make this saem as CEFs of other regions for consistency.
-    if (region == "SE"):
-        forcast_carbonRateLifecycle["avg_unknown_production_forecast"] = 292.9
-        forcast_carbonRateLifecycle["avg_other_production_forecast"] = 292.9
-        carbonRateLifecycle["unknown"] = 292.9
-        carbonRateLifecycle["other"] = 292.9
+def getForecastOutputDataset(dataset, forecastDataset, emissionFactorType):
+    """Actual & forecasted carbon intensity, one row per hour of each 96 hour forecast window"""
+    actual = dataset["carbon_intensity"].values
+    actual = manipulateTestDataShape(actual, 
+                    MODEL_SLIDING_WINDOW_LEN, PREDICTION_WINDOW_HOURS, False)
+    actual = np.reshape(actual, actual.shape[0]*actual.shape[1])
+    forecast = forecastDataset["carbon_from_src_forecasts"].values
+    print("Actual shape: ", actual.shape, " Forecast shape: ", forecast.shape)
+    outputDataset = pd.DataFrame()
+    outputDataset["UTC time"] = forecastDataset["UTC time"].values
+    outputDataset["actual_carbon_intensity_"+emissionFactorType] = actual
+    outputDataset["forecasted_carbon_intensity_"+emissionFactorType] = forecast
+    return outputDataset
 
+def getSourceForecastCarbonIntensity(region, isLifecycle, numSources, config_file=None):
+    """Carbon intensity forecasts from source production forecasts (DACF), along with actual values"""
+    real_time_file, forecast_file = getInputFileNames(region, isLifecycle, True, config_file)
+    dataset = alignToHourlyGrid(initialize(real_time_file))
+    forecastDataset = initialize(forecast_file)
+
+    emissionFactorType = "direct"
     if (isLifecycle is True):
-        if (isForecast is True):
-            print("Calculating carbon intensity from src prod forecasts using lifecycle emission factors...")
-            forecastDataset = calculateCarbonIntensityFromSourceForecasts(forecastDataset, forcast_carbonRateLifecycle, 
-                        numSources)    
-        else:
-            print("Calculating real time carbon intensity using lifecycle emission factors...")
-            dataset = calculateCarbonIntensity(dataset, carbonRateLifecycle, numSources)
-    else:
-        if (isForecast is True):
-            print("Calculating carbon intensity from src prod forecasts using direct emission factors...")
-            forecastDataset = calculateCarbonIntensityFromSourceForecasts(forecastDataset, forcast_carbonRateDirect, 
-                        numSources)            
-        else:
-            print("Calculating real time carbon intensity using direct emission factors...")
-            dataset = calculateCarbonIntensity(dataset, carbonRateDirect, numSources)
+        emissionFactorType = "lifecycle"
+    carbonRate = emissionFactorTables.getEmissionFactorTable(region, emissionFactorType, config_file)
+    print("Calculating carbon intensity from src prod forecasts using "+emissionFactorType+" emission factors...")
+    forecastDataset = calculateCarbonIntensityFromSourceForecasts(forecastDataset, 
+                getForecastCarbonRate(carbonRate), numSources)
+    return getForecastOutputDataset(dataset, forecastDataset, emissionFactorType)
+
+def runProgram(region, isLifecycle, isForecast, numSources, config_file=None):
+    """Run program with configuration support and fallback to hardcoded paths"""
+    # Region specific emission factors (e.g., SE lifecycle unknown/other is 292.9) are read-only
+    # tables shared by all runs of the region.
+    emissionFactorType = "direct"
+    if (isLifecycle is True):
+        emissionFactorType = "lifecycle"
+    summary = {"region": region, "emission_factors": emissionFactorType, 
+               "mode": "forecast" if isForecast is True else "real_time"}
 
     if (isForecast is True):
+        outputDataset = getSourceForecastCarbonIntensity(region, isLifecycle, numSources, config_file)
         print("Carbon intensity forecasts:")
-        actual = dataset["carbon_intensity"].values
-        actual = manipulateTestDataShape(actual, 
-                        MODEL_SLIDING_WINDOW_LEN, PREDICTION_WINDOW_HOURS, False)
-        actual = np.reshape(actual, actual.shape[0]*actual.shape[1])
-        forecast = forecastDataset["carbon_from_src_forecasts"].values
-        print("Actual shape: ", actual.shape, " Forecast shape: ", forecast.shape)
-        dailyAvgMape, avgMape, dailyAvgRmse = getMape(forecastDataset["UTC time"].values, actual, 
+        actual = outputDataset["actual_carbon_intensity_"+emissionFactorType].values
+        forecast = outputDataset["forecasted_carbon_intensity_"+emissionFactorType].values
+        dailyAvgMape, avgMape, dailyAvgRmse = getMape(outputDataset["UTC time"].values, actual, 
                         forecast , PREDICTION_WINDOW_HOURS)
 
         print("Overall Mean MAPE: ", avgMape)
         print("Daywise statistics...")
+        daywiseStatistics = forecastMetrics.getDaywiseStatistics(dailyAvgMape)
         for i in range(0, PREDICTION_WINDOW_HOURS//24):
             print("Prediction day ", i+1, "(", (i*24), " - ", (i+1)*24, " hrs)")
-            print("Mean MAPE: ", np.mean(dailyAvgMape[:, i]))
-            print("Median MAPE: ", np.percentile(dailyAvgMape[:, i], 50))
-            print("90th percentile MAPE: ", np.percentile(dailyAvgMape[:, i], 90))
-            print("95th percentile MAPE: ", np.percentile(dailyAvgMape[:, i], 95))
-            # print("99th percentile MAPE: ", np.percentile(dailyAvgMape[:, i], 99))
-        
-        outputDataset = pd.DataFrame()
-        emissionFactorType = "direct"
-        if (isLifecycle is True):
-            emissionFactorType = "lifecycle"
-        outputDataset["UTC time"] = forecastDataset["UTC time"].values
-        outputDataset["actual_carbon_intensity_"+emissionFactorType] = actual
-        outputDataset["forecasted_carbon_intensity_"+emissionFactorType] = forecast
+            print("Mean MAPE: ", daywiseStatistics["mean"][i])
+            print("Median MAPE: ", daywiseStatistics["p50"][i])
+            print("90th percentile MAPE: ", daywiseStatistics["p90"][i])
+            print("95th percentile MAPE: ", daywiseStatistics["p95"][i])
+            # print("99th percentile MAPE: ", daywiseStatistics["p99"][i])
+        summary["num_hours"] = len(forecast)
+        summary["mean_carbon_intensity"] = np.mean(forecast)
+        summary["mape"] = avgMape
+        for i in range(0, PREDICTION_WINDOW_HOURS//24):
+            summary["day"+str(i+1)+"_mape"] = daywiseStatistics["mean"][i]
         # outputDataset.to_csv(CARBON_FROM_SRC_FORECASTS_OUT_FILE_NAME)
     else:
+        real_time_file, _ = getInputFileNames(region, isLifecycle, isForecast, config_file)
+        dataset = alignToHourlyGrid(initialize(real_time_file))
+        carbonRate = emissionFactorTables.getEmissionFactorTable(region, emissionFactorType, config_file)
+        print("Calculating real time carbon intensity using "+emissionFactorType+" emission factors...")
+        dataset = calculateCarbonIntensity(dataset, carbonRate, numSources)
         print("Real time carbon intensities:")
         # dataset.to_csv(CARBON_FROM_REAL_TIME_SRC_OUT_FILE_NAME)
+        carbonCol = "carbon_intensity"
+        if ("carbon_intensity_calculated" in dataset.columns):
+            carbonCol = "carbon_intensity_calculated"
+            # accuracy of the calculated carbon intensity w.r.t. the values in the file
+            summary["mape"] = forecastMetrics.getMAPE(dataset["carbon_intensity"].values, dataset[carbonCol].values)
+        summary["num_hours"] = len(dataset)
+        summary["mean_carbon_intensity"] = np.mean(dataset[carbonCol].values)
     
-    return
+    return summary
 
 
+def readLastRow(inFileName):
+    # read only the last row of a csv file, by reading the file backwards from the end
+    with open(inFileName, "rb") as inFile:
+        header = inFile.readline()
+        inFile.seek(0, os.SEEK_END)
+        pos = inFile.tell()
+        tail = b""
+        while (pos > len(header) and b"\n" not in tail.rstrip(b"\r\n")):
+            blockSize = min(4096, pos-len(header))
+            pos -= blockSize
+            inFile.seek(pos)
+            tail = inFile.read(blockSize) + tail
+    lastLine = tail.rstrip(b"\r\n").rsplit(b"\n", 1)[-1]
+    return cleanDataset(pd.read_csv(io.BytesIO(header + lastLine), header=0, parse_dates=["UTC time"]))
+
+def calculateCarbonIntensityStreaming(inFileName, outFileName, carbonRate, numSources, 
+                                     chunkHours=STREAM_CHUNK_HOURS):
+    """Calculate real-time carbon intensity chunk by chunk, appending each chunk to outFileName.
+    The last row of each chunk is carried over to fill missing hours at the start of the next chunk,
+    so the result is the same as calculating carbon intensity on the entire file at once."""
+    srcCols = slice(REAL_TIME_SRC_START_COL, REAL_TIME_SRC_START_COL+numSources)
+    # same as the in-memory calculation, missing hours at the start of the file use the last row
+    previousRow = readLastRow(inFileName).iloc[-1, srcCols].to_numpy(dtype=np.float64)
+    numHours, carbonSum = 0, 0
+    chunks = pd.read_csv(inFileName, header=0, parse_dates=["UTC time"], chunksize=chunkHours)
+    for i, chunk in enumerate(chunks):
+        chunk = calculateCarbonIntensity(cleanDataset(chunk), carbonRate, numSources, previousRow)
+        previousRow = chunk.iloc[-1, srcCols].to_numpy(dtype=np.float64)
+        chunk.to_csv(outFileName, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        carbonCol = "carbon_intensity_calculated" if "carbon_intensity_calculated" in chunk.columns else "carbon_intensity"
+        numHours += len(chunk)
+        carbonSum += chunk[carbonCol].sum()
+        print("Chunk ", i+1, ": ", numHours, " hours written to ", outFileName)
+    return numHours, carbonSum/max(numHours, 1)
+
+def runStreaming(region, isLifecycle, numSources, outFileName, chunkHours=STREAM_CHUNK_HOURS, config_file=None):
+    """Calculate real-time carbon intensity of a region with bounded memory"""
+    real_time_file, _ = getInputFileNames(region, isLifecycle, False, config_file)
+    emissionFactorType = "direct"
+    if (isLifecycle is True):
+        emissionFactorType = "lifecycle"
+    carbonRate = emissionFactorTables.getEmissionFactorTable(region, emissionFactorType, config_file)
+    print("Streaming ", real_time_file, " in chunks of ", chunkHours, " hours...")
+    numHours, meanCarbonIntensity = calculateCarbonIntensityStreaming(real_time_file, outFileName, 
+                                        carbonRate, numSources, chunkHours)
+    print("No. of hours: ", numHours, ", mean carbon intensity: ", round(meanCarbonIntensity, 3))
+    return numHours, meanCarbonIntensity
+
+def runSweep(region, isForecast, numSources, factorFileNames=None, config_file=None):
+    """Calculate carbon intensity for direct, lifecycle and what-if emission factors with one load"""
+    real_time_file, forecast_file = getInputFileNames(region, False, isForecast, config_file)
+    inFileName = real_time_file
+    if (isForecast is True):
+        inFileName = forecast_file
+    dataset = initialize(inFileName)
+    if (isForecast is False):
+        dataset = alignToHourlyGrid(dataset)
+
+    carbonRates = getEmissionFactorSets(region, factorFileNames, config_file)
+    print("Calculating carbon intensity for emission factor sets: ", list(carbonRates.keys()))
+    sweepDataset = calculateCarbonIntensitySweep(dataset, carbonRates, numSources, isForecast)
+    print(sweepDataset.iloc[:, 1:].describe())
+    # sweepDataset.to_csv(CARBON_SWEEP_OUT_FILE_NAME)
+    return sweepDataset
+
+def inferNumSources(inFileName, carbonRate, srcStartCol):
+    # no. of consecutive source columns (columns with an emission factor) after srcStartCol
+    columns = pd.read_csv(inFileName, nrows=0).columns.values
+    numSources = 0
+    for col in columns[srcStartCol:]:
+        if (col not in carbonRate):
+            break
+        numSources += 1
+    return numSources
+
+def runRegionJob(job):
+    """Run one region x mode job quietly, and return its summary with run time"""
+    region, isLifecycle, isForecast, config_file = job
+    summary = {"region": region, "emission_factors": "lifecycle" if isLifecycle is True else "direct",
+               "mode": "forecast" if isForecast is True else "real_time"}
+    startTime = time.time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            real_time_file, forecast_file = getInputFileNames(region, isLifecycle, isForecast, config_file)
+            carbonRate = emissionFactorTables.getEmissionFactorTable(region, summary["emission_factors"], config_file)
+            if (isForecast is True):
+                numSources = inferNumSources(forecast_file, getForecastCarbonRate(carbonRate), SRC_START_COL)
+            else:
+                numSources = inferNumSources(real_time_file, carbonRate, REAL_TIME_SRC_START_COL)
+            summary = runProgram(region, isLifecycle, isForecast, numSources, config_file)
+            summary["num_sources"] = numSources
+            summary["status"] = "ok"
+    except (Exception, SystemExit) as e:
+        summary["status"] = "failed: " + str(e)
+    summary["time_s"] = round(time.time() - startTime, 3)
+    return summary
+
+def runAllRegions(numWorkers=None, config_file=None):
+    """Calculate direct/lifecycle, real-time/forecast carbon intensity for all regions in parallel"""
+    regions = Config(config_file).get_regions()
+    jobs = [(region, isLifecycle, isForecast, config_file) for region in regions 
+                for isLifecycle in [False, True] for isForecast in [False, True]]
+    print("Running ", len(jobs), " jobs for regions: ", regions)
+    startTime = time.time()
+    with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+        summaries = list(executor.map(runRegionJob, jobs))
+    totalTime = time.time() - startTime
+    summary = pd.DataFrame(summaries)
+    with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+        print(summary.round(3).to_string(index=False))
+    print("Total time: ", round(totalTime, 3), "s (sum of job times: ", round(summary["time_s"].sum(), 3), "s)")
+    return summary
+
 if __name__ == "__main__":
+    # the repo level config.json (emission factor overrides, data path) is only used with --config
+    config_file = None
+    if ("--config" in sys.argv):
+        idx = sys.argv.index("--config")
+        config_file = sys.argv[idx+1]
+        sys.argv = sys.argv[:idx] + sys.argv[idx+2:]
+        print("Using configuration file: ", config_file)
+    if (len(sys.argv) >= 2 and sys.argv[1] == "--all-regions"):
+        print("CarbonCast: Calculating carbon intensity for all regions")
+        numWorkers = None
+        if (len(sys.argv) > 2):
+            numWorkers = int(sys.argv[2])
+        runAllRegions(numWorkers, config_file)
+        exit(0)
+    if (len(sys.argv) >= 6 and sys.argv[3].lower() == "--stream"):
+        print("CarbonCast: Streaming carbon intensity calculation for region: ", sys.argv[1])
+        chunkHours = STREAM_CHUNK_HOURS
+        if (len(sys.argv) > 6):
+            chunkHours = int(sys.argv[6])
+        runStreaming(sys.argv[1], sys.argv[2].lower() == "-l", int(sys.argv[4]), sys.argv[5], chunkHours,
+                     config_file=config_file)
+        exit(0)
+    if (len(sys.argv) >= 5 and sys.argv[2].lower() == "-s"):
+        print("CarbonCast: Emission factor sweep for region: ", sys.argv[1])
+        isForecast = (sys.argv[3].lower() == "-f")
+        runSweep(sys.argv[1], isForecast, int(sys.argv[4]), sys.argv[5:], config_file)
+        print("Emission factor sweep for region: ", sys.argv[1], " done.")
+        exit(0)
     if (len(sys.argv) != 5):
         print("Usage: python3 carbonIntensityCalculator.py <region> <-l/-d> <-f/-r> <num_sources>")
+        print("       python3 carbonIntensityCalculator.py <region> -s <-f/-r> <num_sources> [factor_file.json ...]")
+        print("       python3 carbonIntensityCalculator.py --all-regions [num_workers]")
+        print("       python3 carbonIntensityCalculator.py <region> <-l/-d> --stream <num_sources> <out_file.csv> [chunk_hours]")
         print("Refer github repo for regions.")
         print("l - lifecycle, d - direct")
+        print("s - sweep over direct, lifecycle & what-if emission factors (JSON files of {source: factor})")
+        print("stream - real-time carbon intensity of large files, written chunk by chunk to out_file.csv")
         print("f - forecast, r - real time")
         print("num_sources - no. of sources producing electricity in the region")
+        print("--config <config.json> - optional, with any of the above. Emission factor overrides (carbon_rates)")
+        print("                         & data path. Without it, config.json is not used.")
         # print("carbon_intensity_col - column no. where carbon_intensity should be inserted")
         exit(0)
     print("CarbonCast: Calculating carbon intensity for region: ", sys.argv[1])
@@ -376,5 +528,5 @@ if __name__ == "__main__":
     if (sys.argv[3].lower() == "-f"):
         isForecast = True
     numSources = int(sys.argv[4])
-    runProgram(region, isLifecycle, isForecast, numSources)
+    runProgram(region, isLifecycle, isForecast, numSources, config_file)
     print("Calculating carbon intensity for region: ", sys.argv[1], " done.")
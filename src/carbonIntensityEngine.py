@@ -0,0 +1,88 @@
+'''
+Vectorized engine to calculate carbon intensity from source production data.
+
+The source mix of every hour is converted into a row-normalized matrix (fraction of electricity
+produced by each source), and carbon intensity is obtained by weighting the columns of that
+matrix with an emission factor vector aligned to the same columns.
+Hours where all sources are missing are repaired in bulk using the previous hour's values
+(see dataCleaning.py).
+
+Only numpy is required, so this module can be used without loading TensorFlow.
+'''
+
+import numpy as np
+
+import dataCleaning
+
+# Zero rows at the start of the data use the last row, same as iloc[i-1] for i = 0
+ZERO_ROW_LEADING_GAP_POLICY = "wrap"
+
+
+def getEmissionFactorVector(sources, carbonRate):
+    # emission factors in the same order as the source columns
+    # emission factor tables (see emissionFactorTables.py) keep a precompiled vector per list of sources
+    if (hasattr(carbonRate, "getVector")):
+        return carbonRate.getVector(sources)
+    return np.array([carbonRate[source] for source in sources], dtype=np.float64)
+
+def getEmissionFactorMatrix(sources, carbonRates):
+    # (sources x K) matrix, one column per emission factor set
+    return np.stack([getEmissionFactorVector(sources, carbonRate) for carbonRate in carbonRates], axis=1)
+
+def getRowSum(sourceData):
+    # Sources are added left to right (same order as pandas sum(axis=1)), so that
+    # the total production of an hour is exactly the same as the per-row calculation.
+    rowSum = np.zeros(sourceData.shape[0], dtype=np.float64)
+    for j in range(sourceData.shape[1]):
+        rowSum += np.where(np.isnan(sourceData[:, j]), 0, sourceData[:, j])
+    return rowSum
+
+def getSourceMixFractions(sourceData, rowSum):
+    # fraction of electricity produced by each source. Hours with no production get 0.
+    fractions = np.zeros(sourceData.shape, dtype=np.float64)
+    np.divide(sourceData, rowSum[:, np.newaxis], out=fractions, where=(rowSum[:, np.newaxis] != 0))
+    return fractions
+
+def applyEmissionFactors(fractions, emissionFactors):
+    # Equivalent to fractions @ emissionFactors, where emissionFactors is either a vector (sources)
+    # or a matrix (sources x K) with one column per emission factor set. The contraction over
+    # sources is accumulated column by column (in source order) instead of calling BLAS, so that
+    # the result is bit-identical to adding up the per-source contributions of each hour one
+    # at a time, and every column of a K-set sweep matches a single-set run exactly.
+    emissionFactors = np.asarray(emissionFactors, dtype=np.float64)
+    carbonIntensity = np.zeros((fractions.shape[0],) + emissionFactors.shape[1:], dtype=np.float64)
+    for j in range(fractions.shape[1]):
+        carbonIntensity += np.multiply.outer(fractions[:, j], emissionFactors[j])
+    return carbonIntensity
+
+def calculateCarbonIntensity(sourceData, emissionFactors, fillMissingRows=True, decimals=2, previousRow=None):
+    '''
+    sourceData: (hours x sources) production values.
+    emissionFactors: emission factor of each source, in the same order as the columns. Can also be
+    a (sources x K) matrix to calculate carbon intensity for K emission factor sets in one pass.
+    previousRow: source values of the hour before the first row (e.g., last row of the previous
+    chunk of a file). If given, zero rows at the start are filled from it instead of the last row.
+    Returns rounded carbon intensity of each hour (hours, or hours x K), source data with zero
+    rows filled and the mask of zero rows.
+    '''
+    sourceData = np.array(sourceData, dtype=np.float64)
+    leadingFillIdx = None
+    if (previousRow is not None):
+        sourceData = np.vstack([np.asarray(previousRow, dtype=np.float64), sourceData])
+        leadingFillIdx = 0
+    rowSum = getRowSum(sourceData)
+    zeroRows = (rowSum == 0)
+    if (fillMissingRows is True and zeroRows.any()):
+        # basic algorithm to fill missing values if all sources are missing
+        # just using the previous hour's value
+        # same as electricityMap
+        sourceData, _, _, fillIdx = dataCleaning.repairZeroRows(sourceData, ZERO_ROW_LEADING_GAP_POLICY,
+                                        leadingFillIdx, zeroRows)
+        rowSum = np.where(zeroRows, rowSum[fillIdx], rowSum)
+    fractions = getSourceMixFractions(sourceData, rowSum)
+    carbonIntensity = applyEmissionFactors(fractions, emissionFactors)
+    if (decimals is not None):
+        carbonIntensity = np.round(carbonIntensity, decimals)
+    if (previousRow is not None):
+        return carbonIntensity[1:], sourceData[1:], zeroRows[1:]
+    return carbonIntensity, sourceData, zeroRows
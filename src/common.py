@@ -1,32 +1,24 @@
 import numpy as np
 import pandas as pd
-import pytz as pytz
-import tensorflow as tf
 import matplotlib.pyplot as plt
 import csv
 import math
+import os
 import seaborn as sns
-from statsmodels.tsa.stattools import adfuller
 import matplotlib.dates as mdates
 
+import analyticsCube
+import carbonIntensityEngine
+import forecastMetrics
+import timeSeriesDiagnostics
 
+# Emission factors used for carbon intensity from source forecasts
+FORECAST_CARBON_RATE = {"coal":908, "nat_gas":440, "nuclear":15, "oil":890, "hydro":13.5, 
+                        "solar":50, "wind":22.5, "other":0}
 
 def inverseDataScaling(data, cmax, cmin):
     cdiff = cmax-cmin
-    unscaledData = np.zeros_like(data)
-    for i in range(data.shape[0]):
-        unscaledData[i] = round(max(data[i]*cdiff + cmin, 0), 5)
-    return unscaledData
-
-def getDatesInLocalTimeZone(dateTime):
-    global LOCAL_TIMEZONE
-    dates = []
-    fromZone = pytz.timezone("UTC")
-    for i in range(0, len(dateTime), 24):
-        day = pd.to_datetime(dateTime[i]).replace(tzinfo=fromZone)
-        day = day.astimezone(LOCAL_TIMEZONE)
-        dates.append(day)    
-    return dates
+    return np.round(np.maximum(np.asarray(data)*cdiff + cmin, 0), 5)
 
 def getAvgContributionBySource(dataset):
     contribution = {}
@@ -40,13 +32,8 @@ def getAvgContributionBySource(dataset):
 
 def getScores(scaledActual, scaledPredicted, unscaledActual, unscaledPredicted):
     print("Actual data shape, Predicted data shape: ", scaledActual.shape, scaledPredicted.shape)
-    mse = tf.keras.losses.MeanSquaredError()
-    rmseScore = round(math.sqrt(mse(scaledActual, scaledPredicted)), 6)
-
-    mape = tf.keras.losses.MeanAbsolutePercentageError()
-    mapeTensor =  mape(unscaledActual, unscaledPredicted)
-    mapeScore = mapeTensor.numpy()
-
+    rmseScore = forecastMetrics.getRMSE(scaledActual, scaledPredicted)
+    mapeScore = forecastMetrics.getMAPE(unscaledActual, unscaledPredicted)
     return rmseScore, mapeScore
 
 def writeOutFile(outFileName, data, fuel, writeMode):
@@ -72,95 +59,62 @@ def dumpRandomDataToFile(fileName, data, writeMode):
 def showPlots():
     plt.show()
 
-def scaleDataset(trainData, valData, testData):
-    # Scaling columns to range (0, 1)
-    row, col = trainData.shape[0], trainData.shape[1]
-    ftMin, ftMax = [], []
-    for i in range(col):
-        fmax= trainData[0, i]
-        fmin = trainData[0, i]
-        for j in range(len(trainData[:, i])):
-            if(fmax < trainData[j, i]):
-                fmax = trainData[j, i]
-            if (fmin > trainData[j, i]):
-                fmin = trainData[j, i]
-        ftMin.append(fmin)
-        ftMax.append(fmax)
-        # print(fmax, fmin)
-
-    for i in range(col):
-        if((ftMax[i] - ftMin[i]) == 0):
-            continue
-        trainData[:, i] = (trainData[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
-        valData[:, i] = (valData[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
-        testData[:, i] = (testData[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
+class Scaler:
+    """Min-max scaling of each column to range (0, 1), with min & max of the training data.
+    Columns with the same min & max are left as they are."""
+
+    def __init__(self, ftMin=None, ftMax=None):
+        self.ftMin = None if ftMin is None else np.asarray(ftMin, dtype=np.float64)
+        self.ftMax = None if ftMax is None else np.asarray(ftMax, dtype=np.float64)
+
+    def fit(self, data):
+        self.ftMin = np.nanmin(data, axis=0).astype(np.float64)
+        self.ftMax = np.nanmax(data, axis=0).astype(np.float64)
+        return self
+
+    def getScaledCols(self):
+        return (self.ftMax - self.ftMin) != 0
+
+    def transform(self, data):
+        # scales all rows at once, in place
+        scaledCols = self.getScaledCols()
+        np.subtract(data, self.ftMin, out=data, where=scaledCols)
+        np.divide(data, self.ftMax - self.ftMin, out=data, where=scaledCols)
+        return data
+
+    def inverseTransform(self, data, col):
+        # unscaled values of column col, e.g., the forecasts of the dependent variable
+        return inverseDataScaling(data, self.ftMax[col], self.ftMin[col])
+
+    def save(self, fileName):
+        np.savez(fileName, ftMin=self.ftMin, ftMax=self.ftMax)
+
+    @classmethod
+    def load(cls, fileName):
+        with np.load(fileName) as scalerFile:
+            return cls(scalerFile["ftMin"], scalerFile["ftMax"])
+
+def getScalerFileNames(modelLocation, region):
+    # second tier scalers are stored next to the model, <region>.h5
+    return (os.path.join(modelLocation, region+"_scaler.npz"),
+            os.path.join(modelLocation, region+"_weather_scaler.npz"))
 
-    return trainData, valData, testData, ftMin, ftMax
+def scaleDataset(trainData, valData, testData, scaler=None):
+    # Scaling columns to range (0, 1). If no scaler is given, it is fitted on trainData.
+    if (scaler is None):
+        scaler = Scaler().fit(trainData)
+    for data in [trainData, valData, testData]:
+        if (data is not None):
+            scaler.transform(data)
+    return trainData, valData, testData, scaler.ftMin, scaler.ftMax
 
 def scaleColumn(data, ftMin, ftMax):
     # Scaling columns to range (0, 1)
-    col = len(data)
-    for i in range(col):
-        # print(data[i], ftMin, ftMax)
-        data[i] = (data[i] - ftMin) / (ftMax - ftMin)
-        # print(data[i])
-
+    data[:] = (data - ftMin) / (ftMax - ftMin)
     return data
 
 def inverseScaleColumn(data, cmin, cmax):
-    cdiff = cmax-cmin
-    unscaledData = np.zeros_like(data)
-    for i in range(data.shape[0]):
-        unscaledData[i] = round(max(data[i]*cdiff + cmin, 0), 5)
-    return unscaledData
-
-
-# Date time feature engineering
-def addDateTimeFeatures(dataset, dateTime, startCol):
-    dates = []
-    hourList = []
-    hourSin, hourCos = [], []
-    monthList = []
-    monthSin, monthCos = [], []
-    weekendList = []
-    columns = dataset.columns
-    secInDay = 24 * 60 * 60 # Seconds in day 
-    secInYear = year = (365.25) * secInDay # Seconds in year 
-
-    day = pd.to_datetime(dateTime[0])
-    isWeekend = 0
-    zero = 0
-    one = 0
-    for i in range(0, len(dateTime)):
-        day = pd.to_datetime(dateTime[i])
-        dates.append(day)
-        hourList.append(day.hour)
-        hourSin.append(np.sin(day.hour * (2 * np.pi / 24)))
-        hourCos.append(np.cos(day.hour * (2 * np.pi / 24)))
-        monthList.append(day.month)
-        monthSin.append(np.sin(day.timestamp() * (2 * np.pi / secInYear)))
-        monthCos.append(np.cos(day.timestamp() * (2 * np.pi / secInYear)))
-        if (day.weekday() < 5):
-            isWeekend = 0
-            zero +=1
-        else:
-            isWeekend = 1
-            one +=1
-        weekendList.append(isWeekend)        
-    loc = startCol+1
-    print(zero, one)
-    # hour of day feature
-    dataset.insert(loc=loc, column="hour_sin", value=hourSin)
-    dataset.insert(loc=loc+1, column="hour_cos", value=hourCos)
-    # month of year feature
-    dataset.insert(loc=loc+2, column="month_sin", value=monthSin)
-    dataset.insert(loc=loc+3, column="month_cos", value=monthCos)
-    # is weekend feature
-    dataset.insert(loc=loc+4, column="weekend", value=weekendList)
-
-    # print(dataset.columns)
-    # print(dataset.head())
-    return dataset
+    return inverseDataScaling(data, cmax, cmin)
 
 def splitDataset(dataset, testDataSize, valDataSize, predictionWindowDiff=0): # testDataSize, valDataSize are in days
     print("No. test days:", testDataSize)
@@ -170,7 +124,7 @@ def splitDataset(dataset, testDataSize, valDataSize, predictionWindowDiff=0): #
     numTestEntries = testDataSize * 24
     numValEntries = valDataSize * 24
     trainData, testData = dataset[:-numTestEntries], dataset[-numTestEntries:]
-    fullTrainData = np.copy(trainData)
+    fullTrainData = trainData # train + val rows (view, not a copy)
     trainData, valData = trainData[:-numValEntries], trainData[-numValEntries:]
     # trainData = trainData[:-predictionWindowDiff]
     print("No. of rows in training set:", len(trainData))
@@ -184,14 +138,107 @@ def splitWeatherDataset(dataset, testDataSize, valDataSize, predictionWindowHour
     numTestEntries = testDataSize * predictionWindowHours
     numValEntries = valDataSize * predictionWindowHours
     trainData, testData = dataset[:-numTestEntries], dataset[-numTestEntries:]
-    fullTrainData = np.copy(trainData)
+    fullTrainData = trainData # train + val rows (view, not a copy)
     trainData, valData = trainData[:-numValEntries], trainData[-numValEntries:]
     print("No. of rows in training set:", len(trainData))
     print("No. of rows in validation set:", len(valData))
     print("No. of rows in test set:", len(testData))
     return trainData, valData, testData, fullTrainData
 
-def showModelSummary(history, model):
+def getWeatherWindowIndex(numWindows, weatherForecastWindowHours):
+    # Weather forecasts are stored as one window of weatherForecastWindowHours per day. Training window
+    # i starts at hour i%24 of the forecast window of day i//24.
+    windows = np.arange(numWindows)
+    return windows + (windows//24) * (weatherForecastWindowHours-24)
+
+def getTrainingWindows(data, trainWindowHours, labelWindowHours, depVarColumn,
+                       weatherData=None, weatherForecastWindowHours=24):
+    '''
+    Inputs (X) & labels (y) for every hour of the history, one time step at a time.
+    X: (windows x trainWindowHours x features), with weather forecast features after the data features.
+    y: (windows x labelWindowHours), the values of depVarColumn after each input window. With a list of
+       columns, (windows x (columns x labelWindowHours)), the labels of each column one after the other.
+    Windows are strided views of data, and X is filled in a single preallocated array.
+    '''
+    numWindows = len(data)-(trainWindowHours+labelWindowHours)+1
+    numFeatures = data.shape[1]
+    numWeatherFeatures = 0 if weatherData is None else weatherData.shape[1]
+    # (windows x features x hours) views
+    dataWindows = np.lib.stride_tricks.sliding_window_view(data, trainWindowHours, axis=0)[:numWindows]
+    labelWindows = np.lib.stride_tricks.sliding_window_view(data[:, np.atleast_1d(depVarColumn)],
+                                                            labelWindowHours, axis=0)
+
+    X = np.empty((numWindows, trainWindowHours, numFeatures+numWeatherFeatures), dtype=np.float64)
+    X[:, :, :numFeatures] = np.swapaxes(dataWindows, 1, 2)
+    if (weatherData is not None):
+        weatherIdx = getWeatherWindowIndex(numWindows, weatherForecastWindowHours)
+        for hour in range(trainWindowHours):
+            X[:, hour, numFeatures:] = weatherData[weatherIdx+hour]
+    labelWindows = labelWindows[trainWindowHours:trainWindowHours+numWindows] # windows x columns x hours
+    y = np.reshape(np.asarray(labelWindows, dtype=np.float64), (numWindows, -1))
+    return X, y
+
+def getWeatherWindows(wValData, wTestData, numDays, maxPredictionWindowHours):
+    # (issue_day x maxPredictionWindowHours x features) forecasts used on each issue day, as in
+    # getDayAheadForecasts of both tiers: the last validation window, then the test windows
+    data = np.concatenate([wValData[-maxPredictionWindowHours:],
+                           wTestData[:(numDays-1)*maxPredictionWindowHours]])
+    return np.reshape(data, (numDays, maxPredictionWindowHours, data.shape[1]))
+
+def getBatchedDayAheadForecasts(predict, history, testData, weatherWindows, trainWindowHours,
+                                predictionWindowHours, slidingWindowLen, depVarColumn=0,
+                                partialForecast=None, numDays=None):
+    '''
+    Walk-forward (day-ahead) forecasts of all issue days at once. Step j of every issue day only
+    depends on step j-1 of the same day, so each 24 hour step is one batched predict() call.
+    predict: function, (samples x trainWindowHours x features) inputs -> (samples x 24) forecasts,
+             or (samples x (columns x 24)) with a list of dependent variable columns
+    history: scaled data before the test period (at least trainWindowHours rows)
+    testData: (hours x features) scaled test data
+    weatherWindows: (batch x issue_day x hours x weather features) scaled forecasts, e.g., of
+                    different noisy inputs. None if the model has no weather features (batch of 1,
+                    numDays issue days).
+    partialForecast: (hours) scaled forecasts of the test period used for the first 24 hours of each
+                     issue day, instead of the model forecasts. (hours x columns) with a list of
+                     columns, NaN for the columns without partial forecasts.
+    Returns (batch x issue_day x predictionWindowHours) scaled forecasts, with a last axis of
+    columns if depVarColumn is a list.
+    '''
+    if (weatherWindows is None):
+        weatherWindows = np.zeros((1, numDays, predictionWindowHours, 0))
+    numBatch, numDays = weatherWindows.shape[:2]
+    depVarColumns = np.atleast_1d(depVarColumn)
+    data = np.concatenate([history[-trainWindowHours:], testData]).astype(np.float32)
+    # row of data where the forecast of each issue day starts
+    forecastStart = trainWindowHours + np.arange(numDays)*slidingWindowLen
+    predictions = np.zeros((numBatch, numDays, predictionWindowHours, len(depVarColumns)), dtype=np.float32)
+    partialDayForecast = None
+    if (partialForecast is not None):
+        partialRows = (forecastStart - trainWindowHours)[:, np.newaxis] + np.arange(24)
+        partialForecast = np.reshape(np.asarray(partialForecast, dtype=np.float32), (len(partialForecast), -1))
+        partialDayForecast = partialForecast[partialRows] # issue_day x 24 x columns
+    for j in range(0, predictionWindowHours, 24):
+        if (j == 0 and partialDayForecast is not None and not np.isnan(partialDayForecast).any()):
+            predictions[:, :, :24] = partialDayForecast
+            continue
+        rows = (forecastStart + j - trainWindowHours)[:, np.newaxis] + np.arange(trainWindowHours)
+        inputX = np.repeat(data[rows][np.newaxis], numBatch, axis=0)
+        # forecasts of the previous steps replace the dependent variable
+        leadHour = rows - forecastStart[:, np.newaxis]
+        dayIdx, hourIdx = np.nonzero(leadHour >= 0)
+        inputX[:, dayIdx[:, np.newaxis], hourIdx[:, np.newaxis], depVarColumns] = \
+                    predictions[:, dayIdx, leadHour[dayIdx, hourIdx]]
+        inputX = np.concatenate([inputX, weatherWindows[:, :, j:j+24].astype(np.float32)], axis=3)
+        yhat = predict(np.reshape(inputX, (numBatch*numDays,)+inputX.shape[2:]))
+        yhat = np.reshape(yhat, (numBatch, numDays, len(depVarColumns), -1))[:, :, :, :24]
+        predictions[:, :, j:j+24] = np.swapaxes(yhat, 2, 3)
+        if (j == 0 and partialDayForecast is not None):
+            predictions[:, :, :24] = np.where(np.isnan(partialDayForecast), predictions[:, :, :24], partialDayForecast)
+    if (np.ndim(depVarColumn) == 0):
+        return predictions[:, :, :, 0]
+    return predictions
+
+def showModelSummary(history, model, outFileName=None):
     print("Showing model summary...")
     model.summary()
     print("***** Model summary shown *****")
@@ -212,16 +259,17 @@ def showModelSummary(history, model):
     # plt.xlabel('epoch')
     # plt.ylabel("RMSE")
     # plt.title('Training loss (RMSE)')
+    if (outFileName is not None):
+        # write the figure instead of keeping it open, e.g., when training in a loop
+        fig.savefig(outFileName, bbox_inches="tight")
+        plt.close(fig)
     return
 
-def analyzeTimeSeries(dataset, trainData, unscaledCarbonIntensity, dateTime):
-    global NUM_FEATURES
-    global LOCAL_TIMEZONE
-    global START_COL
+def analyzeTimeSeries(dataset, trainData, unscaledCarbonIntensity, dateTime, startCol, numFeatures):
     # checkStationarity(dataset)
-    # showTrends(dataset, dateTime, LOCAL_TIMEZONE)
+    # showTrends(dataset, dateTime, localTimeZone)
     print("Plotting each feature distribution...")
-    features = dataset.columns.values[START_COL:START_COL+NUM_FEATURES]
+    features = dataset.columns.values[startCol:startCol+numFeatures]
     trainDataFrame = pd.DataFrame(unscaledCarbonIntensity, columns=features)
     createFeatureViolinGraph(features, trainDataFrame, dateTime)
     print("***** Feature distribution plotting done *****")
@@ -231,21 +279,23 @@ def checkStationarity(dataset):
     print(dataset.columns)
     carbon = dataset["carbon_intensity"].values
     print(len(carbon))
-    result = adfuller(carbon, autolag='AIC')
-    print(f'ADF Statistic: {result[0]}')
-    print(f'n_lags: {result[1]}')
-    print(f'p-value: {result[1]}')
-    for key, value in result[4].items():
-        print('Critial Values:')
-        print(f'   {key}, {value}')
-    return
+    # see timeSeriesDiagnostics.py for all regions & sources
+    result = timeSeriesDiagnostics.getADF(carbon)
+    print(f'ADF Statistic: {result["adf_stat"]}')
+    print(f'n_lags: {result["adf_lags"]}')
+    print(f'p-value: {result["adf_pvalue"]}')
+    print('Critial Values:')
+    for key in ["1%", "5%", "10%"]:
+        print(f'   {key}, {result["adf_critical_"+key]}')
+    return result
 
 def showTrends(dataset, dateTime, localTimeZone):
     global MONTH_INTERVAL
-    carbon = np.array(dataset["carbon_intensity"].values)
-    carbon = np.resize(carbon, (carbon.shape[0]//24, 24))
-    dailyAvgCarbon = np.mean(carbon, axis = 1)
-    dates = getDatesInLocalTimeZone(dateTime)    
+    # daily average over local days
+    cube = analyticsCube.AnalyticsCube.build(pd.DataFrame({"UTC time": dateTime,
+                    "carbon_intensity": dataset["carbon_intensity"].values}), localTimeZone)
+    dailyAvgCarbon = cube.average("carbon_intensity", by="date")
+    dates = dailyAvgCarbon.index
     
     fig, ax = plt.subplots()
     ax.plot(dates, dailyAvgCarbon)
@@ -279,32 +329,27 @@ def createFeatureViolinGraph(features, dataset, dateTime):
 
 def calcCarbonIntensity(sourceVal, energySource):
     # both variables should have sources in the same order
-    carbonRate = {"coal":908, "nat_gas":440, "nuclear":15, "oil":890, "hydro":13.5, 
-                        "solar":50, "wind":22.5, "other":0}
-    carbonIntensity = 0
-    sum = 0
-    for val in sourceVal:
-        sum += val
-    idx=0
-    for idx in range(len(energySource)):
-        source = energySource[idx]
-        sourceContribFrac = sourceVal[idx]/sum
-        carbonIntensity += (sourceContribFrac * carbonRate[source])
-    return carbonIntensity
+    sourceVal = np.array(sourceVal, dtype=np.float64).reshape(1, -1)
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(energySource, FORECAST_CARBON_RATE)
+    carbonIntensity, _, _ = carbonIntensityEngine.calculateCarbonIntensity(sourceVal, emissionFactors, 
+                                    fillMissingRows=False, decimals=None)
+    return carbonIntensity[0]
 
 def calcCarbonIntensityFromForecasts(dataset):
     carbonIntensity = [None]* len(dataset)
-    sourceForecasts = []
     energySource = []
+    forecastCols = []
     for col in dataset.columns:
         if("forecast" in col):
-            sourceForecasts.append(dataset[col].values)
+            forecastCols.append(col)
             energySource.append(col[9:]) # removing "forecast_"
             # sources are stored in the same order
-    sourceForecasts = np.array(sourceForecasts, dtype=np.float)
-    sourceForecasts = sourceForecasts.T
-    for i in range(24):
-        carbonIntensity[i] = dataset.iloc[i][0]
-    for i in range(24, len(dataset)):
-        carbonIntensity[i] = round(calcCarbonIntensity(sourceForecasts[i-24, :], energySource), 6)
-    return carbonIntensity
\ No newline at end of file
+    sourceForecasts = dataset[forecastCols].to_numpy(dtype=np.float64)
+    for i in range(min(24, len(dataset))):
+        carbonIntensity[i] = dataset.iloc[i, 0]
+    # CI of hour i is calculated from the source forecasts of hour i-24
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(energySource, FORECAST_CARBON_RATE)
+    forecastCarbonIntensity, _, _ = carbonIntensityEngine.calculateCarbonIntensity(sourceForecasts[:-24], 
+                                        emissionFactors, fillMissingRows=False, decimals=6)
+    carbonIntensity[24:] = forecastCarbonIntensity.tolist()
+    return carbonIntensity
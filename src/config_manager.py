@@ -4,7 +4,9 @@ import sys
 from typing import Dict, Any, Optional
 
 class Config:
-    """Configuration management for CarbonCast project"""
+    """Configuration management for CarbonCast project.
+    Settings are only loaded from config_file when it is given, e.g., the repo level config.json with
+    carbonIntensityCalculator.py --config config.json. Config() uses the defaults (data/, no overrides)."""
     
     def __init__(self, config_file: Optional[str] = None):
         self.base_path = os.path.dirname(os.path.dirname(__file__))
@@ -62,7 +64,8 @@ class Config:
                 'source_forecasts': f"{region}_96hr_source_prod_forecasts_DA_{test_period}.csv",
                 'direct_emissions': f"{region}_direct_emissions.csv",
                 'lifecycle_emissions': f"{region}_lifecycle_emissions.csv",
-                'weather_forecast': f"{region}_weather_forecast.csv"
+                'weather_forecast': f"{region}_weather_forecast.csv",
+                'exchanges': f"{region}_exchanges.csv"
             }
             
             if file_type not in file_patterns:
@@ -95,6 +98,19 @@ class Config:
         """Get a configuration value with default fallback"""
         return self.config.get(key, default)
     
+    def get_carbon_rates(self, region: str, emission_factor_type: str) -> Dict[str, float]:
+        """Get emission factor overrides for a region from 'carbon_rates', then the region's own section.
+        'carbon_rates' is either {source: rate} (direct) or {"direct": {...}, "lifecycle": {...}}"""
+        carbon_rates = {}
+        for section in [self.config, self.config.get(region, {})]:
+            rates = section.get('carbon_rates', {})
+            if any(isinstance(value, dict) for value in rates.values()):
+                rates = rates.get(emission_factor_type, {})
+            elif emission_factor_type != 'direct':
+                rates = {}
+            carbon_rates.update(rates)
+        return carbon_rates
+
     def validate_region(self, region: str) -> bool:
         """Validate if region exists"""
         try:
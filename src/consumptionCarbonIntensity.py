@@ -0,0 +1,194 @@
+'''
+File to calculate consumption-based (flow-traced) carbon intensity across interconnected regions.
+
+Production-based carbon intensity only looks at the sources inside a region. Consumption-based
+carbon intensity also accounts for the carbon intensity of the electricity imported from
+neighboring regions. For every hour, the consumption carbon intensity x_i of region i satisfies:
+
+    x_i * (P_i + sum_j F_ji) - sum_j F_ji * x_j = P_i * c_i
+
+where P_i is the total production of region i, c_i its production carbon intensity and F_ji the
+flow from region j to region i. The systems of all hours are independent, so they are stacked into
+one block-diagonal sparse matrix and solved with a single sparse solve.
+
+Exchange data is read from data/<REGION>/<REGION>_exchanges.csv, with a "UTC time" column and one
+column per neighboring region holding the net import (MW) into <REGION> from that neighbor
+(negative values are exports). If both regions of a pair report an exchange for an hour, the average is
+used. Otherwise, the flow reported by one of the regions is used (0 if neither reports it).
+Neighbors which are not among the regions being traced are ignored.
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from scipy.sparse.linalg import spsolve
+
+import carbonIntensityCalculator
+import carbonIntensityEngine
+from config_manager import Config
+
+
+def getUTCIndex(dateTime):
+    # some regions store UTC time with an offset (e.g., +00:00), others without
+    return pd.DatetimeIndex(pd.to_datetime(dateTime, utc=True)).tz_localize(None)
+
+def getProductionData(region, isLifecycle, config, config_file=None):
+    """Get hourly total production and production carbon intensity of a region"""
+    inFileName = config.get_file_path(region, 'direct_emissions')
+    dataset = carbonIntensityCalculator.initialize(inFileName)
+    emissionFactorType = "direct"
+    if (isLifecycle is True):
+        emissionFactorType = "lifecycle"
+    carbonRate = carbonIntensityCalculator.getEmissionFactorSets(region, config_file=config_file)[emissionFactorType]
+    sources = carbonIntensityCalculator.getSourceColumns(dataset.columns.values, carbonRate)
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(sources, carbonRate)
+    productionCarbonIntensity, sourceData, _ = carbonIntensityEngine.calculateCarbonIntensity(
+                    dataset[sources].to_numpy(dtype=np.float64), emissionFactors, decimals=None)
+    production = carbonIntensityEngine.getRowSum(sourceData)
+    return pd.DataFrame({"production": production, "carbon_intensity": productionCarbonIntensity},
+                        index=getUTCIndex(dataset["UTC time"]))
+
+def readExchangeData(region, regions, config):
+    """Get net imports of a region from each of its neighbors in the list of regions"""
+    try:
+        inFileName = config.get_file_path(region, 'exchanges')
+    except FileNotFoundError:
+        print("No exchange data for region: ", region)
+        return None
+    exchangeDataset = pd.read_csv(inFileName, header=0)
+    exchangeDataset.index = getUTCIndex(exchangeDataset["UTC time"])
+    neighbors = [col for col in exchangeDataset.columns if col in regions and col != region]
+    # missing hours stay NaN, so the other region's report of the exchange is used
+    return exchangeDataset[neighbors].astype(np.float64)
+
+def getExchangeEdges(regions, exchangeDatasets, dateTime):
+    '''
+    Combine the exchanges reported by all regions into a list of region pairs (a, b) and
+    an (hours x pairs) matrix of net flows from a to b: the mean of the flows reported for each
+    hour, ignoring missing (NaN) reports, and 0 if no region reports the hour.
+    '''
+    regionIdx = {region: i for i, region in enumerate(regions)}
+    edgeIdx = {}
+    edgeFlows, edgeReports = [], []
+    for region, exchangeDataset in exchangeDatasets.items():
+        if (exchangeDataset is None):
+            continue
+        exchangeDataset = exchangeDataset.reindex(dateTime)
+        for neighbor in exchangeDataset.columns:
+            # net import of region from neighbor == flow from neighbor to region
+            a, b = regionIdx[neighbor], regionIdx[region]
+            flow = exchangeDataset[neighbor].values
+            if (a > b):
+                a, b = b, a
+                flow = -flow
+            if ((a, b) not in edgeIdx):
+                edgeIdx[(a, b)] = len(edgeFlows)
+                edgeFlows.append(np.zeros(len(dateTime)))
+                edgeReports.append(np.zeros(len(dateTime)))
+            reported = ~np.isnan(flow)
+            edgeFlows[edgeIdx[(a, b)]] += np.where(reported, flow, 0)
+            edgeReports[edgeIdx[(a, b)]] += reported
+    edges = np.array(list(edgeIdx.keys()), dtype=np.int64).reshape(-1, 2)
+    if (len(edgeFlows) == 0):
+        return edges, np.zeros((len(dateTime), 0))
+    edgeReports = np.stack(edgeReports, axis=1)
+    edgeFlows = np.stack(edgeFlows, axis=1) / np.maximum(edgeReports, 1)
+    return edges, edgeFlows
+
+def buildFlowTracingSystem(production, productionCarbonIntensity, edges, edgeFlows):
+    '''
+    production, productionCarbonIntensity: (hours x regions)
+    edges: (pairs x 2) region indices (a, b), edgeFlows: (hours x pairs) net flow from a to b.
+    Returns the block-diagonal sparse matrix A and vector b of A x = b, where x holds the
+    consumption carbon intensity of every (hour, region), hour-major.
+    '''
+    numHours, numRegions = production.shape
+    hourOffset = (np.arange(numHours) * numRegions)[:, np.newaxis]
+    flowFrom = np.where(edgeFlows >= 0, edges[:, 0], edges[:, 1])
+    flowTo = np.where(edgeFlows >= 0, edges[:, 1], edges[:, 0])
+    flow = np.abs(edgeFlows)
+
+    imports = np.zeros((numHours, numRegions))
+    hours = np.arange(numHours)
+    for e in range(edges.shape[0]):
+        imports[hours, flowTo[:, e]] += flow[:, e]
+
+    diagonal = production + imports
+    b = production * productionCarbonIntensity
+    # regions with no production and no imports keep their production carbon intensity
+    isolated = (diagonal == 0)
+    diagonal[isolated] = 1
+    b[isolated] = productionCarbonIntensity[isolated]
+
+    hasFlow = (flow > 0)
+    rows = np.concatenate([(hourOffset + np.arange(numRegions)).ravel(), (hourOffset + flowTo)[hasFlow]])
+    cols = np.concatenate([(hourOffset + np.arange(numRegions)).ravel(), (hourOffset + flowFrom)[hasFlow]])
+    data = np.concatenate([diagonal.ravel(), -flow[hasFlow]])
+    size = numHours * numRegions
+    A = sparse.csc_matrix((data, (rows, cols)), shape=(size, size))
+    return A, b.ravel()
+
+def calculateConsumptionCarbonIntensity(production, productionCarbonIntensity, edges, edgeFlows):
+    # solve all hours at once, returns (hours x regions) consumption carbon intensity
+    A, b = buildFlowTracingSystem(production, productionCarbonIntensity, edges, edgeFlows)
+    consumptionCarbonIntensity = spsolve(A, b)
+    return consumptionCarbonIntensity.reshape(production.shape)
+
+def runFlowTracing(regions, isLifecycle, config_file=None):
+    """Calculate consumption-based carbon intensity of interconnected regions"""
+    config = Config(config_file)
+    productionDatasets = {region: getProductionData(region, isLifecycle, config, config_file) for region in regions}
+    dateTime = productionDatasets[regions[0]].index
+    for region in regions[1:]:
+        dateTime = dateTime.intersection(productionDatasets[region].index)
+    print("No. of hours common to all regions: ", len(dateTime))
+
+    production = np.stack([productionDatasets[region]["production"].reindex(dateTime).values
+                            for region in regions], axis=1)
+    productionCarbonIntensity = np.stack([productionDatasets[region]["carbon_intensity"].reindex(dateTime).values
+                            for region in regions], axis=1)
+    exchangeDatasets = {region: readExchangeData(region, regions, config) for region in regions}
+    edges, edgeFlows = getExchangeEdges(regions, exchangeDatasets, dateTime)
+    print("No. of interconnections: ", len(edges))
+
+    consumptionCarbonIntensity = calculateConsumptionCarbonIntensity(production, productionCarbonIntensity,
+                                    edges, edgeFlows)
+    consumptionDataset = pd.DataFrame(np.round(consumptionCarbonIntensity, 2), index=dateTime,
+                                    columns=regions)
+    consumptionDataset.index.name = "UTC time"
+    return consumptionDataset, pd.DataFrame(productionCarbonIntensity, index=dateTime, columns=regions)
+
+if __name__ == "__main__":
+    # the repo level config.json (emission factor overrides, data path) is only used with --config
+    config_file = None
+    if ("--config" in sys.argv):
+        idx = sys.argv.index("--config")
+        config_file = sys.argv[idx+1]
+        sys.argv = sys.argv[:idx] + sys.argv[idx+2:]
+        print("Using configuration file: ", config_file)
+    if (len(sys.argv) < 2):
+        print("Usage: python3 consumptionCarbonIntensity.py <-l/-d> [region ...] [-o out_file.csv]")
+        print("l - lifecycle, d - direct")
+        print("If no region is given, all regions under data/ are used.")
+        print("Exchange data is read from data/<region>/<region>_exchanges.csv")
+        print("--config <config.json> - optional. Emission factor overrides (carbon_rates) & data path.")
+        print("                         Without it, config.json is not used.")
+        exit(0)
+    isLifecycle = (sys.argv[1].lower() == "-l")
+    regions = sys.argv[2:]
+    outFileName = None
+    if ("-o" in regions):
+        outFileName = regions[regions.index("-o")+1]
+        regions = regions[:regions.index("-o")]
+    if (len(regions) == 0):
+        regions = Config(config_file).get_regions()
+    print("CarbonCast: Calculating consumption-based carbon intensity for regions: ", regions)
+    consumptionDataset, productionDataset = runFlowTracing(regions, isLifecycle, config_file)
+    print("Mean production carbon intensity:")
+    print(productionDataset.mean().round(2))
+    print("Mean consumption carbon intensity:")
+    print(consumptionDataset.mean().round(2))
+    if (outFileName is not None):
+        consumptionDataset.to_csv(outFileName)
@@ -0,0 +1,125 @@
+'''
+Data cleaning kernel shared by both forecasting tiers and the carbon intensity calculator.
+
+All operations work on whole (rows x columns) arrays, column-vectorized:
+    - missing values (NaN) are filled with the previous available value of the column (ffill),
+      or with 0 (zero)
+    - negative values are clipped to 0
+    - rows where all sources are 0 (or missing) are repaired with the previous row where some
+      source was producing (same as electricityMap)
+Gaps at the start of the data have no previous value. They are handled as per leadingGapPolicy:
+    backfill - first available value after the gap
+    wrap     - last row of the data (same as reading row i-1 for i = 0)
+    keep     - left as they are
+The cleaning functions return the cleaned data with a boolean mask of the cells that were changed.
+
+Only numpy is required, so this module can be used without loading TensorFlow.
+'''
+
+import numpy as np
+
+FILL_POLICIES = ["ffill", "zero"]
+LEADING_GAP_POLICIES = ["backfill", "wrap", "keep"]
+
+
+def checkPolicy(policy, policies):
+    if (policy not in policies):
+        raise ValueError(f"Unknown policy: {policy}. Available policies: {policies}")
+
+def getFillIndex(present, leadingGapPolicy="backfill", leadingFillIdx=None):
+    '''
+    present: (rows) or (rows x columns) mask of available values.
+    For each row, index of the last row at or before it where the value is available.
+    Leading gaps are handled as per leadingGapPolicy, or use leadingFillIdx if it is given.
+    '''
+    checkPolicy(leadingGapPolicy, LEADING_GAP_POLICIES)
+    # rows are scanned along the last axis of a contiguous (columns x rows) array
+    present = np.ascontiguousarray(np.transpose(present))
+    numRows = present.shape[-1]
+    rows = np.arange(numRows)
+    fillIdx = np.maximum.accumulate(np.where(present, rows, -1), axis=-1)
+    leadingGap = (fillIdx < 0)
+    if (leadingFillIdx is not None):
+        fillIdx[leadingGap] = leadingFillIdx
+    elif (leadingGapPolicy == "wrap"):
+        fillIdx[leadingGap] = numRows-1
+    elif (leadingGapPolicy == "backfill"):
+        # first available row (columns with no available value keep their own row)
+        firstIdx = np.where(present.any(axis=-1), np.argmax(present, axis=-1), -1)
+        fillIdx = np.where(leadingGap, np.expand_dims(firstIdx, -1), fillIdx)
+        fillIdx = np.where(fillIdx < 0, rows, fillIdx)
+    else:
+        fillIdx = np.where(leadingGap, rows, fillIdx)
+    return np.transpose(fillIdx)
+
+def forwardFill(data, leadingGapPolicy="backfill"):
+    # NaN -> previous available value of the column
+    data = np.array(data, dtype=np.float64)
+    missing = np.isnan(data)
+    touched = np.zeros(data.shape, dtype=bool)
+    cols = np.flatnonzero(missing.any(axis=0))
+    if (len(cols) == 0):
+        return data, touched
+    fillIdx = getFillIndex(~missing[:, cols], leadingGapPolicy)
+    # only the missing cells are filled. With the wrap policy, leading gaps use the last row
+    # as it is in the input.
+    rows, colIdx = np.nonzero(missing[:, cols])
+    data[rows, cols[colIdx]] = data[fillIdx[rows, colIdx], cols[colIdx]]
+    touched[rows, cols[colIdx]] = ~np.isnan(data[rows, cols[colIdx]])
+    return data, touched
+
+def clipNegatives(data):
+    data = np.array(data, dtype=np.float64)
+    touched = (data < 0)
+    data[touched] = 0
+    return data, touched
+
+def getZeroRows(data):
+    # rows where no source is producing (missing values count as 0)
+    return ~np.any(np.nan_to_num(data) != 0, axis=1)
+
+def repairZeroRows(data, leadingGapPolicy="backfill", leadingFillIdx=None, zeroRows=None):
+    '''
+    Fill rows where all sources are 0 (or the given zeroRows) with the previous row where some
+    source was producing. Returns the repaired data, the mask of changed cells, the mask of zero
+    rows and, for each row, the index of the row it was filled from.
+    '''
+    data = np.array(data, dtype=np.float64)
+    if (zeroRows is None):
+        zeroRows = getZeroRows(data)
+    fillIdx = getFillIndex(~zeroRows, leadingGapPolicy, leadingFillIdx)
+    touched = np.zeros(data.shape, dtype=bool)
+    rows = np.flatnonzero(zeroRows)
+    if (len(rows) > 0):
+        # only zero values are replaced; missing values stay missing
+        touched[rows] = (data[rows] == 0) & (data[fillIdx[rows]] != 0)
+        data[rows] = np.where(data[rows] == 0, data[fillIdx[rows]], data[rows])
+    return data, touched, zeroRows, fillIdx
+
+def cleanData(data, fillPolicy="ffill", leadingGapPolicy="backfill", clipNegativeValues=True,
+              repairZeroSourceRows=False):
+    '''
+    Fill missing values, clip negative values and (optionally) repair rows where all sources are 0,
+    in this order. Returns the cleaned data (float64) and the mask of changed cells.
+    '''
+    checkPolicy(fillPolicy, FILL_POLICIES)
+    if (fillPolicy == "ffill"):
+        data, touched = forwardFill(data, leadingGapPolicy)
+    else:
+        data = np.array(data, dtype=np.float64)
+        touched = np.isnan(data)
+        data[touched] = 0
+    if (clipNegativeValues is True):
+        data, clipped = clipNegatives(data)
+        touched |= clipped
+    if (repairZeroSourceRows is True):
+        data, repaired, _, _ = repairZeroRows(data, leadingGapPolicy)
+        touched |= repaired
+    return data, touched
+
+def fillMissingData(data, leadingGapPolicy="backfill"):
+    # If some data is missing (NaN), use the same value as that of the previous row. Data is filled in place.
+    filledData, touched = forwardFill(data, leadingGapPolicy)
+    if (touched.any()):
+        data[touched] = filledData[touched]
+    return data
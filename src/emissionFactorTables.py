@@ -0,0 +1,109 @@
+'''
+Immutable per-region emission factor tables.
+
+A table holds the default direct or lifecycle emission factors, with region specific overrides
+(e.g., SE) and overrides from the config file applied on top. Tables are read-only mappings,
+and the emission factor vector aligned to a list of source columns is computed once per schema
+(list of columns) and returned as a read-only array. Tables can therefore be shared between
+regions, threads and repeated runs without being modified or copied.
+
+Both schemas of source columns are supported: source names (e.g., "coal") in real-time data and
+avg_<source>_production_forecast in source production forecasts.
+'''
+
+import functools
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import numpy as np
+
+from config_manager import Config
+
+FORECAST_COL_PREFIX = "avg_"
+FORECAST_COL_SUFFIX = "_production_forecast"
+
+# Operational carbon emission factors
+# Carbon rate used by electricityMap. Checkout this link:
+# https://github.com/electricitymap/electricitymap-contrib/blob/master/config/co2eq_parameters_direct.json
+DEFAULT_CARBON_RATES = MappingProxyType({
+    # Median direct emission factors
+    "direct": MappingProxyType({"coal": 760, "biomass": 0, "nat_gas": 370, "geothermal": 0, "hydro": 0,
+                "nuclear": 0, "oil": 406, "solar": 0, "unknown": 575,
+                "other": 575, "wind": 0}), # g/kWh # check for biomass. it is > 0
+    # Median lifecycle emission factors
+    "lifecycle": MappingProxyType({"coal": 820, "biomass": 230, "nat_gas": 490, "geothermal": 38, "hydro": 24,
+                "nuclear": 12, "oil": 650, "solar": 45, "unknown": 700,
+                "other": 700, "wind": 11}) # g/kWh
+})
+
+# Special case: SE unknown/other lifecycle CEF was 292.9 as per ElectricityMap
+# TODO: In later versions, make this same as CEFs of other regions for consistency.
+REGION_CARBON_RATES = MappingProxyType({
+    "SE": MappingProxyType({"lifecycle": MappingProxyType({"unknown": 292.9, "other": 292.9})})
+})
+
+
+def getSourceName(col):
+    # avg_<source>_production_forecast -> <source>
+    if (col.startswith(FORECAST_COL_PREFIX) and col.endswith(FORECAST_COL_SUFFIX)):
+        return col[len(FORECAST_COL_PREFIX):-len(FORECAST_COL_SUFFIX)]
+    return col
+
+def getForecastColName(source):
+    return FORECAST_COL_PREFIX+source+FORECAST_COL_SUFFIX
+
+
+class EmissionFactorTable(Mapping):
+    """Read-only table of {source: emission factor} for one region & emission factor type"""
+
+    def __init__(self, region, emissionFactorType, carbonRate):
+        self._region = region
+        self._emissionFactorType = emissionFactorType
+        self._carbonRate = MappingProxyType(dict(carbonRate))
+        self._vectors = {}
+
+    @property
+    def region(self):
+        return self._region
+
+    @property
+    def emissionFactorType(self):
+        return self._emissionFactorType
+
+    def __getitem__(self, col):
+        return self._carbonRate[getSourceName(col)]
+
+    def __contains__(self, col):
+        return getSourceName(col) in self._carbonRate
+
+    def __iter__(self):
+        return iter(self._carbonRate)
+
+    def __len__(self):
+        return len(self._carbonRate)
+
+    def __repr__(self):
+        return f"EmissionFactorTable({self._region}, {self._emissionFactorType}, {dict(self._carbonRate)})"
+
+    def getVector(self, cols):
+        """Emission factors aligned to the source columns, computed once per list of columns"""
+        cols = tuple(cols)
+        vector = self._vectors.get(cols)
+        if (vector is None):
+            vector = np.array([self[col] for col in cols], dtype=np.float64)
+            vector.setflags(write=False)
+            self._vectors[cols] = vector
+        return vector
+
+
+@functools.lru_cache(maxsize=None)
+def getEmissionFactorTable(region, emissionFactorType, config_file=None):
+    """Emission factor table of a region: defaults, region specific overrides and config overrides"""
+    if (emissionFactorType not in DEFAULT_CARBON_RATES):
+        raise ValueError(f"Unknown emission factor type: {emissionFactorType}. "
+                         f"Available types: {list(DEFAULT_CARBON_RATES.keys())}")
+    carbonRate = dict(DEFAULT_CARBON_RATES[emissionFactorType])
+    carbonRate.update(REGION_CARBON_RATES.get(region, {}).get(emissionFactorType, {}))
+    if (config_file is not None):
+        carbonRate.update(Config(config_file).get_carbon_rates(region, emissionFactorType))
+    return EmissionFactorTable(region, emissionFactorType, carbonRate)
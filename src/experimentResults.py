@@ -0,0 +1,210 @@
+'''
+Aggregate the results of repeated experiments (runs) of both tiers.
+
+Each run writes its own forecast file:
+    first tier:  <OUT_FILE_NAME_PREFIX>_<source>_iter<N>.csv (test periods appended one after the other),
+                 with the RMSE/MAPE of each period in ../data/<region>/fuel_forecast/
+                 <region>_<RMSE/MAPE>_iter<N><source>.txt
+    second tier: <(LIFECYCLE/DIRECT)_CEF_OUT_FILE_NAME_PREFIX>_<exptNum>.csv
+All runs of a region & source (or emission factor type) are discovered from the config files and
+stacked into (run x issue_day x hours) arrays, aligned on the issue time of each forecast window.
+The ensemble forecast (mean of all runs) is evaluated with the runs, and the daily MAPE statistics
+of every run, period & lead day are written to one results table.
+'''
+
+import glob
+import os
+import re
+import sys
+import time
+
+import json5 as json
+import numpy as np
+import pandas as pd
+
+import forecastEvaluation
+import forecastMetrics
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+FIRST_TIER_CONFIG_FILE_NAME = os.path.join(SRC_DIR, "firstTierConfig.json")
+SECOND_TIER_CONFIG_FILE_NAME = os.path.join(SRC_DIR, "secondTierConfig.json")
+PREDICTION_WINDOW_HOURS = 96
+ENSEMBLE_RUN = "ensemble"
+SCORE_REGEX = r"[-+]?(?:nan|inf|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+TYPE_REGEX = r"[A-Za-z_][\w.]*\(" # e.g., np.float64(
+
+
+def readConfig(configFileName):
+    with open(configFileName, "r") as configFile:
+        return json.load(configFile)
+
+def getRunFiles(pattern, runRegex):
+    # {run number: file name}, sorted by run number
+    runFiles = {}
+    for fileName in glob.glob(pattern):
+        match = re.fullmatch(runRegex, os.path.basename(fileName))
+        if (match is not None):
+            runFiles[int(match.group(1))] = fileName
+    return dict(sorted(runFiles.items()))
+
+def getFirstTierRunFiles(outFileNamePrefix, source):
+    prefix = os.path.basename(outFileNamePrefix)+"_"+source.lower()
+    return getRunFiles(outFileNamePrefix+"_"+source.lower()+"_iter*.csv", re.escape(prefix)+r"_iter(\d+)\.csv")
+
+def getSecondTierRunFiles(outFileNamePrefix):
+    return getRunFiles(outFileNamePrefix+"_*.csv", re.escape(os.path.basename(outFileNamePrefix))+r"_(\d+)\.csv")
+
+def readRunFile(fileName):
+    # datetime, <actual>, <forecast> columns of a first or second tier output file
+    dataset = pd.read_csv(fileName, header=0)
+    outputDataset = pd.DataFrame()
+    outputDataset["UTC time"] = pd.to_datetime(dataset.iloc[:, 0].values)
+    outputDataset["actual"] = dataset.iloc[:, 1].to_numpy(dtype=np.float64)
+    outputDataset["forecast"] = dataset.iloc[:, 2].to_numpy(dtype=np.float64)
+    return outputDataset
+
+def readScoreFile(fileName):
+    '''
+    RMSE/MAPE file written by the first tier: str() of a list of per period lists, e.g.,
+    [[75.8], [80.1]], or [[np.float64(75.8)], [np.float64(80.1)]] with older runs on numpy >= 2.
+    '''
+    if (not os.path.exists(fileName)):
+        return None
+    with open(fileName, "r") as scoreFile:
+        text = scoreFile.read()
+    # numbers of each inner (period) list
+    periods = re.findall(r"\[([^\[\]]*)\]", re.sub(TYPE_REGEX, "", text))
+    return np.array([np.mean([float(score) for score in re.findall(SCORE_REGEX, period)]) for period in periods],
+                    dtype=np.float64)
+
+def stackRuns(runFiles, predictionWindowHours=PREDICTION_WINDOW_HOURS):
+    '''
+    Stack all runs, and add the ensemble forecast (mean forecast of the runs available for each hour).
+    Returns (run+1 x issue_day x hours) actual & forecast arrays and the issue times.
+    '''
+    actual, forecast, issueTimes = forecastEvaluation.stackForecastWindows(
+                    [readRunFile(fileName) for fileName in runFiles.values()], predictionWindowHours)
+    # runs have the same actual values (NaN for days a run does not have)
+    ensembleActual = np.fmax.reduce(actual, axis=0)
+    numRuns = np.sum(~np.isnan(forecast), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ensembleForecast = np.nansum(forecast, axis=0) / numRuns
+    actual = np.concatenate([actual, ensembleActual[np.newaxis]])
+    forecast = np.concatenate([forecast, ensembleForecast[np.newaxis]])
+    return actual, forecast, issueTimes
+
+def getPeriods(numDays, periodConfig=None):
+    '''
+    [(period name, issue days)]. First tier files have the test periods of TRAIN_TEST_PERIOD one
+    after the other, NUM_TEST_DAYS issue days each. Otherwise, all days are one period.
+    '''
+    if (periodConfig is not None):
+        numTestDays = [period["NUM_TEST_DAYS"] for period in periodConfig.values()]
+        if (sum(numTestDays) == numDays):
+            boundaries = np.cumsum([0] + numTestDays)
+            return [(period.get("OUT_FILE_SUFFIX", name), slice(boundaries[i], boundaries[i+1]))
+                        for i, (name, period) in enumerate(periodConfig.items())]
+    return [("all", slice(0, numDays))]
+
+def aggregateRuns(runInfo, runFiles, periodConfig=None, scoreFiles=None):
+    '''
+    Results table of all runs of one region & source: one row per run (and the ensemble),
+    period and lead day, with daily MAPE statistics over the issue days of the period.
+    runInfo: {column: value} describing the runs, e.g., region, tier, source.
+    scoreFiles: optional {run number: (RMSE file, MAPE file)} of the first tier.
+    '''
+    actual, forecast, issueTimes = stackRuns(runFiles)
+    dailyMape, _ = forecastEvaluation.evaluateForecasts(actual, forecast)
+    runs = [str(run) for run in runFiles.keys()] + [ENSEMBLE_RUN]
+    numLeadDays = dailyMape.shape[2]
+    periods = getPeriods(len(issueTimes), periodConfig)
+    if (scoreFiles is not None):
+        # (run x period x [RMSE, MAPE]) reported by each run
+        reported = np.full((len(runs), len(periods), 2), np.nan)
+        for i, run in enumerate(runFiles.keys()):
+            for j, fileName in enumerate(scoreFiles.get(run, ())):
+                scores = readScoreFile(fileName)
+                if (scores is not None):
+                    numPeriods = min(len(scores), len(periods))
+                    reported[i, :numPeriods, j] = scores[:numPeriods]
+    tables = []
+    for periodIdx, (period, days) in enumerate(periods):
+        statistics = forecastMetrics.getDaywiseStatistics(dailyMape[:, days])
+        seriesInfo = pd.DataFrame(dict(runInfo, period=period, run=runs))
+        seriesInfo["first_issue_day"] = issueTimes[days][0].date()
+        table = forecastEvaluation.getComparisonTable(seriesInfo, dailyMape[:, days], statistics)
+        if (scoreFiles is not None):
+            table["reported_rmse"] = np.repeat(reported[:, periodIdx, 0], numLeadDays)
+            table["reported_mape"] = np.repeat(reported[:, periodIdx, 1], numLeadDays)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+def getFirstTierRunGroups(regions, firstTierConfig, firstTierConfigDir):
+    # [(run info, run files, period config, score files)] of every region & source with runs
+    groups = []
+    for region in regions:
+        if (region not in firstTierConfig):
+            continue
+        outFileNamePrefix = os.path.join(firstTierConfigDir, firstTierConfig[region]["OUT_FILE_NAME_PREFIX"])
+        scoreDir = os.path.join(firstTierConfigDir, "..", "data", region, "fuel_forecast")
+        for source in firstTierConfig[region]["SOURCES"]:
+            runFiles = getFirstTierRunFiles(outFileNamePrefix, source)
+            if (len(runFiles) == 0):
+                continue
+            scoreFiles = {run: tuple(os.path.join(scoreDir, region+"_"+score+"_iter"+str(run)+source.lower()+".txt")
+                                     for score in ["RMSE", "MAPE"]) for run in runFiles}
+            groups.append(({"region": region, "tier": "first", "series": source.lower()}, runFiles,
+                           firstTierConfig["TRAIN_TEST_PERIOD"], scoreFiles))
+    return groups
+
+def getSecondTierRunGroups(regions, secondTierConfig, secondTierConfigDir):
+    groups = []
+    for region in regions:
+        if (region not in secondTierConfig):
+            continue
+        for emissionFactorType in ["direct", "lifecycle"]:
+            prefixKey = emissionFactorType.upper()+"_CEF_OUT_FILE_NAME_PREFIX"
+            if (prefixKey not in secondTierConfig[region]):
+                continue
+            runFiles = getSecondTierRunFiles(os.path.join(secondTierConfigDir, secondTierConfig[region][prefixKey]))
+            if (len(runFiles) > 0):
+                groups.append(({"region": region, "tier": "second", "series": emissionFactorType}, runFiles,
+                               None, None))
+    return groups
+
+def runAggregation(regions, outFileName=None, firstTierConfigFileName=FIRST_TIER_CONFIG_FILE_NAME,
+                   secondTierConfigFileName=SECOND_TIER_CONFIG_FILE_NAME):
+    """Aggregate all runs of both tiers for the given regions into one results table"""
+    startTime = time.time()
+    groups = []
+    if (firstTierConfigFileName is not None):
+        groups.extend(getFirstTierRunGroups(regions, readConfig(firstTierConfigFileName),
+                        os.path.dirname(os.path.abspath(firstTierConfigFileName))))
+    if (secondTierConfigFileName is not None):
+        groups.extend(getSecondTierRunGroups(regions, readConfig(secondTierConfigFileName),
+                        os.path.dirname(os.path.abspath(secondTierConfigFileName))))
+    print("Aggregating ", sum(len(group[1]) for group in groups), " runs of ", len(groups), " region/source groups...")
+    if (len(groups) == 0):
+        return None
+    table = pd.concat([aggregateRuns(*group) for group in groups], ignore_index=True)
+    if (outFileName is not None):
+        table.to_csv(outFileName, index=False)
+        print("Results table written to ", outFileName)
+    print("Done in ", round(time.time() - startTime, 3), "s")
+    return table
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 2):
+        print("Usage: python3 experimentResults.py <out_file.csv> [region ...]")
+        print("If no region is given, all regions in firstTierConfig.json & secondTierConfig.json are used.")
+        exit(0)
+    regions = sys.argv[2:]
+    if (len(regions) == 0):
+        regions = sorted(set(region for configFileName in [FIRST_TIER_CONFIG_FILE_NAME, SECOND_TIER_CONFIG_FILE_NAME]
+                                for region, value in readConfig(configFileName).items()
+                                    if isinstance(value, dict) and "LOCAL_TIMEZONE" in value))
+    table = runAggregation(regions, sys.argv[1])
+    if (table is not None):
+        summary = table[table["run"] == ENSEMBLE_RUN]
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(summary.to_string(index=False))
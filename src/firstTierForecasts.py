@@ -3,6 +3,10 @@ File to generate source production forecasts for different sources across region
 '''
 
 import csv
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as dt
 from datetime import timezone as tz
 
@@ -22,7 +26,10 @@ from keras.callbacks import ModelCheckpoint
 from keras.models import load_model
 from keras.layers import RepeatVector
 
+import annInference
+import calendarFeatures
 import common
+import dataCleaning
 import sys
 import json5 as json
 
@@ -37,216 +44,412 @@ TRAINING_WINDOW_HOURS = None
 PREDICTION_WINDOW_HOURS = None
 MODEL_SLIDING_WINDOW_LEN = None
 BUFFER_HOURS = None
+CHECKPOINT_FILE_NAME = "best_model_ann.h5"
+WORKER_CONFIG = None
+WORKER_DATASET_CACHE = None
+RENEWABLE_SOURCES = ["SOLAR", "WIND", "HYDRO"]
 ############################# MACRO END #########################################
 
-def runFirstTier(configFileName):
+def setGlobals(firstTierConfig):
     global TRAINING_WINDOW_HOURS
     global PREDICTION_WINDOW_HOURS
     global MODEL_SLIDING_WINDOW_LEN
     global BUFFER_HOURS
-
-    firstTierConfig = {}
-
-    with open(configFileName, "r") as configFile:
-        firstTierConfig = json.load(configFile)
-        # print(configurationData)
-
-    NUMBER_OF_EXPERIMENTS = firstTierConfig["NUMBER_OF_EXPERIMENTS_PER_REGION"]
     TRAINING_WINDOW_HOURS = firstTierConfig["TRAINING_WINDOW_HOURS"]
     PREDICTION_WINDOW_HOURS = firstTierConfig["PREDICTION_WINDOW_HOURS"]
     MODEL_SLIDING_WINDOW_LEN = firstTierConfig["MODEL_SLIDING_WINDOW_LEN"]
     BUFFER_HOURS = PREDICTION_WINDOW_HOURS - 24
 
-    regionList = firstTierConfig["REGION"]
-    for region in regionList:
-        print("CarbonCast: ANN model for region:", region)
+def getFirstTierJobs(firstTierConfig, multiOutput=False):
+    '''
+    One job per region, source, experiment & train/test period, in the order of the sequential run.
+    Jobs are independent. Only the output files are shared by the periods of an experiment.
+    multiOutput: one job per region, experiment & period, with the jobs of its sources in "sourceJobs".
+    '''
+    jobs = []
+    for region in firstTierConfig["REGION"]:
         regionConfig = firstTierConfig[region]
-        sourceList = regionConfig["SOURCES"]
-        sourceColList = regionConfig["SOURCE_COL"]
-        trainTestPeriodConfig = firstTierConfig["TRAIN_TEST_PERIOD"]
-        weatherForecastInFileName = regionConfig["WEATHER_FORECAST_IN_FILE_NAME"]
-
-
-        sourceIdx = 0
-        for source in sourceList:
-            inFileName = regionConfig["IN_FILE_NAME_PREFIX"] + source.lower() + firstTierConfig["IN_FILE_NAME_SUFFIX"]
-            outFileNamePrefix = regionConfig["OUT_FILE_NAME_PREFIX"]
-            sourceCol = sourceColList[sourceIdx]
-            partialSourceProductionForecastAvailable = regionConfig["PARTIAL_FORECAST_AVAILABILITY_LIST"][sourceIdx]
-            partialForecastHours =  regionConfig["PARTIAL_FORECAST_HOURS"]
-            print(inFileName)
-            print(weatherForecastInFileName)
-            isRenewableSource = False
-            numFeatures = regionConfig["NUM_FEATURES"]
-            numWeatherFeatures = 0
-            if (source == "SOLAR" or source == "WIND" or source == "HYDRO"):
-                isRenewableSource = True
-            if (isRenewableSource == True):
-                numWeatherFeatures = regionConfig["NUM_WEATHER_FEATURES"]
-
-            for exptNum in range(NUMBER_OF_EXPERIMENTS):
-                outFileName = outFileNamePrefix + "_" + source.lower() + "_iter" + str(exptNum) + ".csv"
-                periodRMSE, periodMAPE = [], []
-                
-                periodIdx = 0
-                for period in trainTestPeriodConfig:
-                    print(trainTestPeriodConfig[period])
-                    datasetLimiter = trainTestPeriodConfig[period]["DATASET_LIMITER"]
-                    numTestDays = trainTestPeriodConfig[period]["NUM_TEST_DAYS"]
-                    numValDays = firstTierConfig["NUM_VAL_DAYS"]
-                    weatherDatasetLimiter = datasetLimiter//24*PREDICTION_WINDOW_HOURS
-                    print(numTestDays)
-
-                    print("Initializing...")
-                    dataset, dateTime, bufferPeriod, bufferDates, weatherDataset = initialize(
-                                inFileName, weatherForecastInFileName, sourceCol,
-                                datasetLimiter, weatherDatasetLimiter)
-                    # bufferPeriod is for the last test date, if prediction period is beyond 24 hours
-                    print("***** Initialization done *****")
-
-                    # split into train and test
-                    print("Spliting dataset into train/test...")
-                    trainData, valData, testData, fullTrainData = common.splitDataset(dataset.values, numTestDays, 
-                                                            numValDays)
-                    trainDates = dateTime[: -(numTestDays*24)]
-                    fullTrainDates = np.copy(trainDates)
-                    trainDates, validationDates = trainDates[: -(numValDays*24)], trainDates[-(numValDays*24):]
-                    testDates = dateTime[-(numTestDays*24):]
-                    bufferPeriod = bufferPeriod.values
-                    trainData = trainData[:, sourceCol: sourceCol+numFeatures]
-                    valData = valData[:, sourceCol: sourceCol+numFeatures]
-                    testData = testData[:, sourceCol: sourceCol+numFeatures]
-                    partialSourceProductionForecast = None
-                        
-                    bufferPeriod = bufferPeriod[:, sourceCol: sourceCol+numFeatures]
-                    if(len(bufferDates)>0):
-                        testDates = np.append(testDates, bufferDates)
-                        testData = np.vstack((testData, bufferPeriod))
-
-                    print("TrainData shape: ", trainData.shape) # (days x hour) x features
-                    print("ValData shape: ", valData.shape) # (days x hour) x features
-                    print("TestData shape: ", testData.shape) # (days x hour) x features
-
-                    wTrainData, wValData, wTestData, wFullTrainData = None, None, None, None
-                    if (isRenewableSource):
-                        wTrainData, wValData, wTestData, wFullTrainData = common.splitWeatherDataset(
-                                weatherDataset.values, numTestDays, numValDays, PREDICTION_WINDOW_HOURS)
-                        print("WeatherTrainData shape: ", wTrainData.shape) # (days x hour) x features
-                        print("WeatherValData shape: ", wValData.shape) # (days x hour) x features
-                        print("WeatherTestData shape: ", wTestData.shape) # (days x hour) x features
-
-                    print("***** Dataset split done *****")
-
-                    trainData = fillMissingData(trainData)
-                    valData = fillMissingData(valData)
-                    testData = fillMissingData(testData)
-                    featureList = dataset.columns.values
-                    featureList = featureList[sourceCol:sourceCol+numFeatures].tolist()
-
-                    print("Scaling data...")
-                    trainData, valData, testData, ftMin, ftMax = common.scaleDataset(trainData, valData, testData)
-                    print(trainData.shape, valData.shape, testData.shape)
-
-                    if(isRenewableSource):
-                        wTrainData = fillMissingData(wTrainData)
-                        wValData = fillMissingData(wValData)
-                        wTestData = fillMissingData(wTestData)
-                        featureList.extend(weatherDataset.columns.values)
-                        wTrainData, wValData, wTestData, wFtMin, wFtMax = common.scaleDataset(wTrainData, wValData, wTestData)
-                        print(wTrainData.shape, wValData.shape, wTestData.shape)
-
-                    print("Features: ", featureList)
-                        
-                    if (partialSourceProductionForecastAvailable):
-                        partialSourceProductionForecast = dataset["avg_"+source.lower()+"_production_forecast"].iloc[-numTestDays*24:].values
-                        partialSourceProductionForecast = common.scaleColumn(partialSourceProductionForecast, 
-                                ftMin[DEPENDENT_VARIABLE_COL], ftMax[DEPENDENT_VARIABLE_COL])
-                        # print(partialSourceProductionForecast, ftMax[DEPENDENT_VARIABLE_COL], ftMin[DEPENDENT_VARIABLE_COL])
-                    print("***** Data scaling done *****")
-
-                    ######################## START #####################                    
-                    print("Iteration: ", exptNum)
-                    bestModel = trainingandValidationPhase(trainData, wTrainData, 
-                                                    valData, wValData, firstTierConfig)
-
-                    history = valData[-TRAINING_WINDOW_HOURS:, :]
-                    weatherData = None
-                    if (isRenewableSource):
-                        weatherData = wValData[-PREDICTION_WINDOW_HOURS:, :]
-                        print("weatherData shape:", weatherData.shape)
-                    history = history.tolist()
-
-                    bestRMSE, bestMAPE = [], []
-                    predictedData = getDayAheadForecasts(bestModel, history, testData, 
-                                        numFeatures+numWeatherFeatures, wTestData, weatherData, partialSourceProductionForecast)
-                    print("***** Forecast done *****")
-                    
-                    unscaledTestData, unscaledPredictedData, formattedTestDates, rmseScore, mapeScore = getUnscaledForecastsAndForecastAccuracy(
-                                                                        testData, testDates, predictedData, 
-                                                                        ftMin, ftMax)
-                    
-                    print("[BESTMODEL] Overall RMSE score: ", rmseScore)
-                    print("[BESTMODEL] Overall MAPE score: ", mapeScore)
-                    # print(scores)
-                    bestRMSE.append(rmseScore)
-                    bestMAPE.append(mapeScore)
-
-                    
-                    print("[BEST] Average RMSE after ", NUMBER_OF_EXPERIMENTS, " expts: ", np.mean(bestRMSE))
-                    print("[BEST] Average MAPE after ", NUMBER_OF_EXPERIMENTS, " expts: ", np.mean(bestMAPE))
-                    print(bestRMSE)
-                    print(bestMAPE)
-                    periodRMSE.append(bestRMSE)
-                    periodMAPE.append(bestMAPE)
-
-                    writeSourceProductionForecastsToFile(formattedTestDates, unscaledTestData, unscaledPredictedData,
-                                                        periodIdx, source, outFileName)
-                    periodIdx +=1
-                    ######################## END #####################
-
-                ###
-                common.dumpRandomDataToFile("../data/"+region+"/fuel_forecast/"+region+
-                        "_RMSE_iter"+str(exptNum)+source.lower()+".txt", str(periodRMSE), "w")
-                common.dumpRandomDataToFile("../data/"+region+"/fuel_forecast/"+region+
-                        "_MAPE_iter"+str(exptNum)+source.lower()+".txt", str(periodMAPE), "w")
-                ###
-
-                print("RMSE: ", periodRMSE)
-                print("MAPE: ", periodMAPE)
-            sourceIdx += 1
-
-            print("####################", region, source, " done ####################\n\n")
-        print("Source production forecast for region: ", region, " done.")
+        for sourceIdx, source in enumerate(regionConfig["SOURCES"]):
+            for exptNum in range(firstTierConfig["NUMBER_OF_EXPERIMENTS_PER_REGION"]):
+                scoreFilePrefix = "../data/"+region+"/fuel_forecast/"+region
+                for periodIdx, period in enumerate(firstTierConfig["TRAIN_TEST_PERIOD"]):
+                    jobs.append({"region": region, "source": source, "sourceIdx": sourceIdx, "exptNum": exptNum,
+                                 "period": period, "periodIdx": periodIdx,
+                                 "outFileName": regionConfig["OUT_FILE_NAME_PREFIX"] + "_" + source.lower() + 
+                                                    "_iter" + str(exptNum) + ".csv",
+                                 "rmseFileName": scoreFilePrefix+"_RMSE_iter"+str(exptNum)+source.lower()+".txt",
+                                 "mapeFileName": scoreFilePrefix+"_MAPE_iter"+str(exptNum)+source.lower()+".txt"})
+    if (multiOutput):
+        regionJobs = {}
+        for job in jobs:
+            key = (job["region"], job["exptNum"], job["periodIdx"])
+            if (key not in regionJobs):
+                regionJobs[key] = {"region": job["region"], "exptNum": job["exptNum"], "period": job["period"],
+                                   "periodIdx": job["periodIdx"], "sourceJobs": []}
+            regionJobs[key]["sourceJobs"].append(job)
+        jobs = sorted(regionJobs.values(), key=lambda job: (firstTierConfig["REGION"].index(job["region"]),
+                                                             job["exptNum"], job["periodIdx"]))
+    return jobs
+
+def setNumThreads(numThreads):
+    # must be called before TF runs any operation
+    tf.config.threading.set_intra_op_parallelism_threads(numThreads)
+    tf.config.threading.set_inter_op_parallelism_threads(numThreads)
+
+def initializeWorker(firstTierConfig, numThreads):
+    # runs once in each worker process, before TF is used
+    global WORKER_CONFIG
+    global WORKER_DATASET_CACHE
+    setNumThreads(numThreads)
+    setGlobals(firstTierConfig)
+    WORKER_CONFIG = firstTierConfig
+    WORKER_DATASET_CACHE = {}
+
+def runJob(firstTierConfig, job, datasetCache=None):
+    # [(source job, result)] of a job
+    if ("RANDOM_SEED" in firstTierConfig):
+        # same weights & training whichever process runs the job
+        keras.utils.set_random_seed(firstTierConfig["RANDOM_SEED"] + job["exptNum"])
+    if ("sourceJobs" in job):
+        return list(zip(job["sourceJobs"], runMultiOutputJob(firstTierConfig, job, datasetCache)))
+    return [(job, runFirstTierJob(firstTierConfig, job, datasetCache))]
+
+def runWorkerJob(job):
+    # workers train at the same time, so each job has its own checkpoint files, deleted after the job
+    global CHECKPOINT_FILE_NAME
+    with tempfile.TemporaryDirectory() as checkpointDir:
+        CHECKPOINT_FILE_NAME = os.path.join(checkpointDir, "best_model_ann.h5")
+        return runJob(WORKER_CONFIG, job, WORKER_DATASET_CACHE)
+
+def writeExperimentResults(experimentResults):
+    '''
+    experimentResults: [(job, (formattedTestDates, unscaledTestData, unscaledPredictedData, rmse, mape))]
+    of all periods of one region, source & experiment. Periods are written in order, so the output
+    files are the same whichever order the jobs finished in.
+    '''
+    experimentResults = sorted(experimentResults, key=lambda jobResult: jobResult[0]["periodIdx"])
+    periodRMSE, periodMAPE = [], []
+    for job, (formattedTestDates, unscaledTestData, unscaledPredictedData, rmseScore, mapeScore) in experimentResults:
+        periodRMSE.append([rmseScore])
+        periodMAPE.append([mapeScore])
+        writeSourceProductionForecastsToFile(formattedTestDates, unscaledTestData, unscaledPredictedData,
+                                            job["periodIdx"], job["source"], job["outFileName"])
+    job = experimentResults[0][0]
+    common.dumpRandomDataToFile(job["rmseFileName"], str(periodRMSE), "w")
+    common.dumpRandomDataToFile(job["mapeFileName"], str(periodMAPE), "w")
+    print("RMSE: ", periodRMSE)
+    print("MAPE: ", periodMAPE)
+    print("####################", job["region"], job["source"], " iteration ", job["exptNum"], " done ####################\n\n")
     return
 
-def initialize(inFileName, weatherForecastInFileName, startCol, datasetLimiter,
-                weatherDatasetLimiter):
+def writeJobResults(jobResults, numPeriods):
+    # results come in job order. An experiment is written once all its periods are done.
+    experimentResults = {}
+    for sourceJobResults in jobResults:
+        for sourceJob, result in sourceJobResults:
+            key = (sourceJob["region"], sourceJob["source"], sourceJob["exptNum"])
+            experimentResults.setdefault(key, []).append((sourceJob, result))
+            if (len(experimentResults[key]) == numPeriods):
+                writeExperimentResults(experimentResults.pop(key))
+
+def runFirstTier(configFileName, numWorkers=1, numThreadsPerWorker=None, multiOutput=None):
+    '''
+    Runs all jobs (region x source x experiment x period). With numWorkers > 1, jobs run in a pool of
+    processes, each with TF limited to numThreadsPerWorker threads (default 1). With 1 worker, jobs
+    run in this process, with TF limited to numThreadsPerWorker threads if given.
+    multiOutput: one model per region for all its sources (default: MULTI_OUTPUT_MODEL in the config).
+    '''
+    firstTierConfig = {}
 
-    global BUFFER_HOURS
-    # load the new file
-    dataset = pd.read_csv(inFileName, header=0, infer_datetime_format=True, 
+    with open(configFileName, "r") as configFile:
+        firstTierConfig = json.load(configFile)
+        # print(configurationData)
+
+    setGlobals(firstTierConfig)
+    if (multiOutput is None):
+        multiOutput = firstTierConfig.get("MULTI_OUTPUT_MODEL", False)
+    jobs = getFirstTierJobs(firstTierConfig, multiOutput)
+    numPeriods = len(firstTierConfig["TRAIN_TEST_PERIOD"])
+    print("CarbonCast: ANN models for regions:", firstTierConfig["REGION"], ", ", len(jobs), " jobs, ", 
+          numWorkers, " worker(s)")
+
+    if (numWorkers > 1):
+        # spawn, as TF does not support fork after it is imported
+        with ProcessPoolExecutor(max_workers=numWorkers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=initializeWorker, 
+                                 initargs=(firstTierConfig, numThreadsPerWorker or 1)) as executor:
+            writeJobResults(executor.map(runWorkerJob, jobs), numPeriods)
+    else:
+        if (numThreadsPerWorker is not None):
+            setNumThreads(numThreadsPerWorker)
+        # each file is read & feature engineered once, for all experiments & periods
+        datasetCache = {}
+        writeJobResults((runJob(firstTierConfig, job, datasetCache) for job in jobs), numPeriods)
+    print("Source production forecasts for regions: ", firstTierConfig["REGION"], " done.")
+    return
+
+def runFirstTierJob(firstTierConfig, job, datasetCache=None):
+    '''
+    Trains & tests the model of one job. Returns (formattedTestDates, unscaledTestData,
+    unscaledPredictedData, rmseScore, mapeScore).
+    '''
+    region, source, sourceIdx, exptNum = job["region"], job["source"], job["sourceIdx"], job["exptNum"]
+    print("CarbonCast: ANN model for region:", region, ", source: ", source, ", iteration: ", exptNum, 
+          ", period: ", job["period"])
+    regionConfig = firstTierConfig[region]
+    trainTestPeriodConfig = firstTierConfig["TRAIN_TEST_PERIOD"]
+    weatherForecastInFileName = regionConfig["WEATHER_FORECAST_IN_FILE_NAME"]
+    inFileName = regionConfig["IN_FILE_NAME_PREFIX"] + source.lower() + firstTierConfig["IN_FILE_NAME_SUFFIX"]
+    sourceCol = regionConfig["SOURCE_COL"][sourceIdx]
+    partialSourceProductionForecastAvailable = regionConfig["PARTIAL_FORECAST_AVAILABILITY_LIST"][sourceIdx]
+    print(inFileName)
+    print(weatherForecastInFileName)
+    isRenewableSource = False
+    numFeatures = regionConfig["NUM_FEATURES"]
+    numWeatherFeatures = 0
+    if (source in RENEWABLE_SOURCES):
+        isRenewableSource = True
+    if (isRenewableSource == True):
+        numWeatherFeatures = regionConfig["NUM_WEATHER_FEATURES"]
+
+    print(trainTestPeriodConfig[job["period"]])
+    datasetLimiter = trainTestPeriodConfig[job["period"]]["DATASET_LIMITER"]
+    numTestDays = trainTestPeriodConfig[job["period"]]["NUM_TEST_DAYS"]
+    numValDays = firstTierConfig["NUM_VAL_DAYS"]
+    weatherDatasetLimiter = datasetLimiter//24*PREDICTION_WINDOW_HOURS
+    print(numTestDays)
+
+    print("Initializing...")
+    dataset, dateTime, bufferPeriod, bufferDates, weatherDataset = initialize(
+                inFileName, weatherForecastInFileName, sourceCol,
+                datasetLimiter, weatherDatasetLimiter, datasetCache)
+    # bufferPeriod is for the last test date, if prediction period is beyond 24 hours
+    print("***** Initialization done *****")
+
+    # split into train and test
+    print("Spliting dataset into train/test...")
+    # copies, as the cached datasets are not modified
+    trainData, valData, testData, fullTrainData = common.splitDataset(dataset.to_numpy(copy=True), numTestDays, 
+                                            numValDays)
+    trainDates = dateTime[: -(numTestDays*24)]
+    fullTrainDates = np.copy(trainDates)
+    trainDates, validationDates = trainDates[: -(numValDays*24)], trainDates[-(numValDays*24):]
+    testDates = dateTime[-(numTestDays*24):]
+    bufferPeriod = bufferPeriod.to_numpy(copy=True)
+    trainData = trainData[:, sourceCol: sourceCol+numFeatures]
+    valData = valData[:, sourceCol: sourceCol+numFeatures]
+    testData = testData[:, sourceCol: sourceCol+numFeatures]
+    partialSourceProductionForecast = None
+        
+    bufferPeriod = bufferPeriod[:, sourceCol: sourceCol+numFeatures]
+    if(len(bufferDates)>0):
+        testDates = np.append(testDates, bufferDates)
+        testData = np.vstack((testData, bufferPeriod))
+
+    print("TrainData shape: ", trainData.shape) # (days x hour) x features
+    print("ValData shape: ", valData.shape) # (days x hour) x features
+    print("TestData shape: ", testData.shape) # (days x hour) x features
+
+    wTrainData, wValData, wTestData, wFullTrainData = None, None, None, None
+    if (isRenewableSource):
+        wTrainData, wValData, wTestData, wFullTrainData = common.splitWeatherDataset(
+                weatherDataset.to_numpy(copy=True), numTestDays, numValDays, PREDICTION_WINDOW_HOURS)
+        print("WeatherTrainData shape: ", wTrainData.shape) # (days x hour) x features
+        print("WeatherValData shape: ", wValData.shape) # (days x hour) x features
+        print("WeatherTestData shape: ", wTestData.shape) # (days x hour) x features
+
+    print("***** Dataset split done *****")
+
+    trainData = dataCleaning.fillMissingData(trainData)
+    valData = dataCleaning.fillMissingData(valData)
+    testData = dataCleaning.fillMissingData(testData)
+    featureList = dataset.columns.values
+    featureList = featureList[sourceCol:sourceCol+numFeatures].tolist()
+
+    print("Scaling data...")
+    trainData, valData, testData, ftMin, ftMax = common.scaleDataset(trainData, valData, testData)
+    print(trainData.shape, valData.shape, testData.shape)
+
+    if(isRenewableSource):
+        wTrainData = dataCleaning.fillMissingData(wTrainData)
+        wValData = dataCleaning.fillMissingData(wValData)
+        wTestData = dataCleaning.fillMissingData(wTestData)
+        featureList.extend(weatherDataset.columns.values)
+        wTrainData, wValData, wTestData, wFtMin, wFtMax = common.scaleDataset(wTrainData, wValData, wTestData)
+        print(wTrainData.shape, wValData.shape, wTestData.shape)
+
+    print("Features: ", featureList)
+        
+    if (partialSourceProductionForecastAvailable):
+        partialSourceProductionForecast = dataset["avg_"+source.lower()+"_production_forecast"].iloc[-numTestDays*24:].to_numpy(copy=True)
+        partialSourceProductionForecast = common.scaleColumn(partialSourceProductionForecast, 
+                ftMin[DEPENDENT_VARIABLE_COL], ftMax[DEPENDENT_VARIABLE_COL])
+        # print(partialSourceProductionForecast, ftMax[DEPENDENT_VARIABLE_COL], ftMin[DEPENDENT_VARIABLE_COL])
+    print("***** Data scaling done *****")
+
+    ######################## START #####################                    
+    print("Iteration: ", exptNum)
+    bestModel = trainingandValidationPhase(trainData, wTrainData, 
+                                    valData, wValData, firstTierConfig)
+    # forecasts are made with the NumPy forward pass of the best model (weights also saved for later use)
+    bestModel = annInference.NumpyANN.fromModel(bestModel)
+    bestModel.save(os.path.splitext(CHECKPOINT_FILE_NAME)[0]+".npz")
+
+    history = valData[-TRAINING_WINDOW_HOURS:, :]
+    weatherData = None
+    if (isRenewableSource):
+        weatherData = wValData[-PREDICTION_WINDOW_HOURS:, :]
+        print("weatherData shape:", weatherData.shape)
+    history = history.tolist()
+
+    predictedData = getDayAheadForecasts(bestModel, history, testData, 
+                        numFeatures+numWeatherFeatures, wTestData, weatherData, partialSourceProductionForecast)
+    print("***** Forecast done *****")
+    
+    unscaledTestData, unscaledPredictedData, formattedTestDates, rmseScore, mapeScore = getUnscaledForecastsAndForecastAccuracy(
+                                                        testData, testDates, predictedData, 
+                                                        ftMin, ftMax)
+    
+    print("[BESTMODEL] Overall RMSE score: ", rmseScore)
+    print("[BESTMODEL] Overall MAPE score: ", mapeScore)
+    ######################## END #####################
+    return formattedTestDates, unscaledTestData, unscaledPredictedData, rmseScore, mapeScore
+
+def runMultiOutputJob(firstTierConfig, job, datasetCache=None):
+    '''
+    Trains & tests one model for all sources of a region (one job per region, experiment & period).
+    Inputs are the history of every source, the date & time features, and the weather forecasts if any
+    source is renewable. The model forecasts the next 24 hours of all sources at once.
+    Returns the results of each source in the order of job["sourceJobs"], as runFirstTierJob.
+    '''
+    region, exptNum = job["region"], job["exptNum"]
+    print("CarbonCast: multi-output ANN model for region:", region, ", iteration: ", exptNum, 
+          ", period: ", job["period"])
+    regionConfig = firstTierConfig[region]
+    weatherForecastInFileName = regionConfig["WEATHER_FORECAST_IN_FILE_NAME"]
+    periodConfig = firstTierConfig["TRAIN_TEST_PERIOD"][job["period"]]
+    datasetLimiter = periodConfig["DATASET_LIMITER"]
+    numTestDays = periodConfig["NUM_TEST_DAYS"]
+    numValDays = firstTierConfig["NUM_VAL_DAYS"]
+    weatherDatasetLimiter = datasetLimiter//24*PREDICTION_WINDOW_HOURS
+    numFeatures = regionConfig["NUM_FEATURES"]
+    sources = [sourceJob["source"] for sourceJob in job["sourceJobs"]]
+    numSources = len(sources)
+    isRenewableSource = any(source in RENEWABLE_SOURCES for source in sources)
+
+    # columns: production of each source, then the other features (date & time), which are the
+    # same in the files of all sources
+    print("Initializing...")
+    sourceColumns, bufferColumns, partialForecasts = [], [], []
+    for sourceJob in job["sourceJobs"]:
+        source, sourceIdx = sourceJob["source"], sourceJob["sourceIdx"]
+        inFileName = regionConfig["IN_FILE_NAME_PREFIX"] + source.lower() + firstTierConfig["IN_FILE_NAME_SUFFIX"]
+        sourceCol = regionConfig["SOURCE_COL"][sourceIdx]
+        dataset, dateTime, bufferPeriod, bufferDates, weatherDataset = initialize(
+                    inFileName, weatherForecastInFileName, sourceCol,
+                    datasetLimiter, weatherDatasetLimiter, datasetCache)
+        if (len(sourceColumns) == 0):
+            firstDateTime = dateTime
+            featureList = dataset.columns.values[sourceCol+1:sourceCol+numFeatures].tolist()
+            otherFeatures = dataset.iloc[:, sourceCol+1:sourceCol+numFeatures].to_numpy(dtype=np.float64, copy=True)
+            otherBufferFeatures = bufferPeriod.iloc[:, sourceCol+1:sourceCol+numFeatures].to_numpy(dtype=np.float64, copy=True)
+        elif (not np.array_equal(dateTime, firstDateTime)):
+            raise ValueError(f"Dates of {inFileName} do not match the dates of {sources[0]}")
+        # copies, as the cached datasets are not modified
+        sourceColumns.append(dataset.iloc[:, sourceCol].to_numpy(dtype=np.float64, copy=True))
+        bufferColumns.append(bufferPeriod.iloc[:, sourceCol].to_numpy(dtype=np.float64, copy=True))
+        if (regionConfig["PARTIAL_FORECAST_AVAILABILITY_LIST"][sourceIdx]):
+            partialForecasts.append(dataset["avg_"+source.lower()+"_production_forecast"].iloc[-numTestDays*24:].to_numpy(
+                                    dtype=np.float64, copy=True))
+        else:
+            partialForecasts.append(np.full(numTestDays*24, np.nan))
+    featureList = sources + featureList
+    print("***** Initialization done *****")
+
+    print("Spliting dataset into train/test...")
+    trainData, valData, testData, fullTrainData = common.splitDataset(np.column_stack(sourceColumns+[otherFeatures]),
+                                                            numTestDays, numValDays)
+    testDates = dateTime[-(numTestDays*24):]
+    if(len(bufferDates)>0):
+        testDates = np.append(testDates, bufferDates)
+        testData = np.vstack((testData, np.column_stack(bufferColumns+[otherBufferFeatures])))
+    print("TrainData shape: ", trainData.shape) # (days x hour) x features
+    print("ValData shape: ", valData.shape) # (days x hour) x features
+    print("TestData shape: ", testData.shape) # (days x hour) x features
+
+    wTrainData, wValData, wTestData, wFullTrainData = None, None, None, None
+    numWeatherFeatures = 0
+    if (isRenewableSource):
+        numWeatherFeatures = regionConfig["NUM_WEATHER_FEATURES"]
+        wTrainData, wValData, wTestData, wFullTrainData = common.splitWeatherDataset(
+                weatherDataset.to_numpy(copy=True), numTestDays, numValDays, PREDICTION_WINDOW_HOURS)
+    print("***** Dataset split done *****")
+
+    trainData = dataCleaning.fillMissingData(trainData)
+    valData = dataCleaning.fillMissingData(valData)
+    testData = dataCleaning.fillMissingData(testData)
+    print("Scaling data...")
+    trainData, valData, testData, ftMin, ftMax = common.scaleDataset(trainData, valData, testData)
+    if(isRenewableSource):
+        wTrainData = dataCleaning.fillMissingData(wTrainData)
+        wValData = dataCleaning.fillMissingData(wValData)
+        wTestData = dataCleaning.fillMissingData(wTestData)
+        featureList.extend(weatherDataset.columns.values)
+        wTrainData, wValData, wTestData, wFtMin, wFtMax = common.scaleDataset(wTrainData, wValData, wTestData)
+    print("Features: ", featureList)
+
+    # NaN for the sources without partial forecasts
+    partialSourceProductionForecast = None
+    if (not np.isnan(partialForecasts).all()):
+        partialSourceProductionForecast = np.column_stack([common.scaleColumn(partialForecasts[i], ftMin[i], ftMax[i])
+                                                           for i in range(numSources)])
+    print("***** Data scaling done *****")
+
+    ######################## START #####################                    
+    print("Iteration: ", exptNum)
+    depVarColumns = list(range(numSources))
+    bestModel = trainingandValidationPhase(trainData, wTrainData, 
+                                    valData, wValData, firstTierConfig, depVarColumns)
+    bestModel = annInference.NumpyANN.fromModel(bestModel)
+    bestModel.save(os.path.splitext(CHECKPOINT_FILE_NAME)[0]+".npz")
+
+    history = valData[-TRAINING_WINDOW_HOURS:, :]
+    weatherData = None
+    if (isRenewableSource):
+        weatherData = wValData[-PREDICTION_WINDOW_HOURS:, :]
+    predictedData = getDayAheadForecasts(bestModel, history.tolist(), testData, 
+                        testData.shape[1]+numWeatherFeatures, wTestData, weatherData, partialSourceProductionForecast,
+                        depVarColumns)
+    print("***** Forecast done *****")
+
+    results = []
+    for i in range(numSources):
+        unscaledTestData, unscaledPredictedData, formattedTestDates, rmseScore, mapeScore = getUnscaledForecastsAndForecastAccuracy(
+                                                            testData[:, [i]], testDates, predictedData[:, :, i], 
+                                                            ftMin[[i]], ftMax[[i]])
+        print("[BESTMODEL] ", sources[i], " RMSE score: ", rmseScore, ", MAPE score: ", mapeScore)
+        results.append((formattedTestDates, unscaledTestData, unscaledPredictedData, rmseScore, mapeScore))
+    ######################## END #####################
+    return results
+
+def loadDataset(inFileName, startCol, datasetCache=None):
+    # source dataset with date & time features. With a cache, each file is read once per run.
+    key = ("dataset", inFileName, startCol)
+    if (datasetCache is not None and key in datasetCache):
+        return datasetCache[key]
+    print("Reading ", inFileName)
+    dataset = pd.read_csv(inFileName, header=0,
                             parse_dates=['UTC time'], index_col=['UTC time'])
 
     # print(dataset.head())
     # print(dataset.columns)
     dateTime = dataset.index.values
-
-    weatherDataset = pd.read_csv(weatherForecastInFileName, header=0, infer_datetime_format=True, 
-                            parse_dates=['UTC time'], index_col=['UTC time'])
-    # print(weatherDataset.head())
     
     print("\nAdding features related to date & time...")
-    modifiedDataset = common.addDateTimeFeatures(dataset, dateTime, startCol)
+    modifiedDataset = calendarFeatures.addDateTimeFeatures(dataset, dateTime, startCol)
     dataset = modifiedDataset
     print("Features related to date & time added")
 
-    bufferPeriod = dataset[datasetLimiter:datasetLimiter+BUFFER_HOURS]
-    dataset = dataset[:datasetLimiter]
-    bufferDates = dateTime[datasetLimiter:datasetLimiter+BUFFER_HOURS]
-    dateTime = dateTime[:datasetLimiter]
-
-    weatherDataset = weatherDataset[:weatherDatasetLimiter]
-    
     for i in range(startCol, len(dataset.columns.values)):
         col = dataset.columns.values[i]
         dataset[col] = dataset[col].astype(np.float64)
@@ -255,23 +458,46 @@ def initialize(inFileName, weatherForecastInFileName, startCol, datasetLimiter,
     # print("Getting contribution of each energy source...")
     # contribution = getAvgContributionBySource(dataset)
     # print(contribution)
+    if (datasetCache is not None):
+        datasetCache[key] = (dataset, dateTime)
+    return dataset, dateTime
+
+def loadWeatherDataset(weatherForecastInFileName, datasetCache=None):
+    key = ("weather", weatherForecastInFileName)
+    if (datasetCache is not None and key in datasetCache):
+        return datasetCache[key]
+    print("Reading ", weatherForecastInFileName)
+    weatherDataset = pd.read_csv(weatherForecastInFileName, header=0,
+                            parse_dates=['UTC time'], index_col=['UTC time'])
+    # print(weatherDataset.head())
+    if (datasetCache is not None):
+        datasetCache[key] = weatherDataset
+    return weatherDataset
 
-    return dataset, dateTime, bufferPeriod, bufferDates, weatherDataset
+def initialize(inFileName, weatherForecastInFileName, startCol, datasetLimiter,
+                weatherDatasetLimiter, datasetCache=None):
+    # Rows of each period are views of the (cached) datasets. They must not be modified in place.
+    global BUFFER_HOURS
+    dataset, dateTime = loadDataset(inFileName, startCol, datasetCache)
+    weatherDataset = loadWeatherDataset(weatherForecastInFileName, datasetCache)
 
-def fillMissingData(data): # If some data is missing (NaN), use the same value as that of the previous row
-    for i in range(data.shape[0]):
-        for j in range(data.shape[1]):
-            if(np.isnan(data[i, j])):
-                data[i, j] = data[i-1, j]
-    return data
+    bufferPeriod = dataset.iloc[datasetLimiter:datasetLimiter+BUFFER_HOURS]
+    dataset = dataset.iloc[:datasetLimiter]
+    bufferDates = dateTime[datasetLimiter:datasetLimiter+BUFFER_HOURS]
+    dateTime = dateTime[:datasetLimiter]
+
+    weatherDataset = weatherDataset.iloc[:weatherDatasetLimiter]
 
-def trainingandValidationPhase(trainData, wTrainData, valData, wValData, firstTierConfig):
+    return dataset, dateTime, bufferPeriod, bufferDates, weatherDataset
+
+def trainingandValidationPhase(trainData, wTrainData, valData, wValData, firstTierConfig,
+                                depVarColumn=DEPENDENT_VARIABLE_COL):
     global TRAINING_WINDOW_HOURS
     print("\nManipulating training data...")
-    X, y = manipulateTrainingDataShape(trainData, TRAINING_WINDOW_HOURS, wTrainData)
+    X, y = manipulateTrainingDataShape(trainData, TRAINING_WINDOW_HOURS, wTrainData, depVarColumn)
     print("\nManipulating validation data...")
     # Next line actually labels validation data
-    valX, valY = manipulateTrainingDataShape(valData, TRAINING_WINDOW_HOURS, wValData)
+    valX, valY = manipulateTrainingDataShape(valData, TRAINING_WINDOW_HOURS, wValData, depVarColumn)
                     
     print("***** Training and validation data manipulation done *****")
     print("X.shape, y.shape: ", X.shape, y.shape)
@@ -282,37 +508,13 @@ def trainingandValidationPhase(trainData, wTrainData, valData, wValData, firstTi
     return bestTrainedModel
 
 # convert training data into inputs and outputs (labels)
-def manipulateTrainingDataShape(data, labelWindowHours, weatherData = None):
+def manipulateTrainingDataShape(data, labelWindowHours, weatherData = None, depVarColumn = DEPENDENT_VARIABLE_COL):
     global TRAINING_WINDOW_HOURS
     global PREDICTION_WINDOW_HOURS
 
     print("Data shape: ", data.shape)
-    global PREDICTION_WINDOW_HOURS
-    X, y, weatherX = list(), list(), list()
-    weatherIdx = 0
-    hourIdx = 0
-    # step over the entire history one time step at a time
-    for i in range(len(data)-(TRAINING_WINDOW_HOURS+labelWindowHours)+1):
-        # define the end of the input sequence
-        trainWindow = i + TRAINING_WINDOW_HOURS
-        labelWindow = trainWindow + labelWindowHours
-        xInput = data[i:trainWindow, :]
-        # xInput = xInput.reshape((len(xInput), 1))
-        X.append(xInput)
-        if(weatherData is not None):
-            weatherX.append(weatherData[weatherIdx:weatherIdx+TRAINING_WINDOW_HOURS])
-            weatherIdx +=1
-            hourIdx +=1
-            if(hourIdx ==24):
-                hourIdx = 0
-                weatherIdx += (PREDICTION_WINDOW_HOURS-24)
-        y.append(data[trainWindow:labelWindow, DEPENDENT_VARIABLE_COL])
-    X = np.array(X, dtype=np.float64)
-    y = np.array(y, dtype=np.float64)
-    if(weatherData is not None):
-        weatherX = np.array(weatherX, dtype=np.float64)
-        X = np.append(X, weatherX, axis=2)
-    return X, y
+    return common.getTrainingWindows(data, TRAINING_WINDOW_HOURS, labelWindowHours, depVarColumn,
+                                     weatherData, PREDICTION_WINDOW_HOURS)
 
 def manipulateTestDataShape(data, isDates=False):
     global MODEL_SLIDING_WINDOW_LEN
@@ -348,114 +550,44 @@ def trainANN(trainX, trainY, valX, valY, hyperParams):
     model.compile(loss=lossFunc, optimizer=opt,
                     metrics=['mean_absolute_error'])
     es = EarlyStopping(monitor='val_loss', mode='min', verbose=1, patience=10)
-    mc = ModelCheckpoint('best_model_ann.h5', monitor='val_loss', mode='min', verbose=1, save_best_only=True)
+    mc = ModelCheckpoint(CHECKPOINT_FILE_NAME, monitor='val_loss', mode='min', verbose=1, save_best_only=True)
     # fit network
     # hist = model.fit(trainX, trainY, epochs=epochs, batch_size=bSize, verbose=verbose)
     hist = model.fit(trainX, trainY, epochs=epochs, batch_size=batchSize[0], verbose=2,
                         validation_data=(valX, valY), callbacks=[es, mc])
-    model = load_model("best_model_ann.h5")
-    common.showModelSummary(hist, model)
+    # only used for forecasts, so the loss & metrics are not restored
+    model = load_model(CHECKPOINT_FILE_NAME, compile=False)
+    # the training history is written next to the checkpoint, so no figure is left open between jobs
+    common.showModelSummary(hist, model, os.path.splitext(CHECKPOINT_FILE_NAME)[0]+".png")
     print("Number of features used in training: ", n_features)
     return model
 
 
 
-# walk-forward validation
-def getOneShotForecasts(trainX, trainY, model, history, testData, trainWindowHours, 
-            numFeatures, wTestData = None, weatherData = None, partialSourceProductionForecast = None):
-    global MODEL_SLIDING_WINDOW_LEN
-    global BUFFER_HOURS
-    # walk-forward validation over each day
-    print("Testing (one shot forecasts)...")
-    predictions = list()
-    weatherIdx = 0
-    for i in range(0, ((len(testData)//24)-(BUFFER_HOURS//24))):
-        # predict n days in one shot
-        yhat_sequence, newTrainingData = getForecasts(model, history, trainWindowHours, numFeatures, weatherData)
-        predictions.append(yhat_sequence)
-        # get real observation and add to history for predicting the next day
-        currentDayHours = i* MODEL_SLIDING_WINDOW_LEN
-        if (wTestData is not None):
-            weatherData = wTestData[weatherIdx:weatherIdx+trainWindowHours, :]
-            weatherIdx +=trainWindowHours
-        history.extend(testData[currentDayHours:currentDayHours+MODEL_SLIDING_WINDOW_LEN, :].tolist())
-        newLabel = testData[currentDayHours:currentDayHours+MODEL_SLIDING_WINDOW_LEN,0].reshape(1, MODEL_SLIDING_WINDOW_LEN)
-        np.append(trainX, newTrainingData)
-        np.append(trainY, newLabel)
-
-        # valX = trainX[-(NUM_VAL_DAYS*TRAINING_WINDOW_HOURS):]
-        # trainX = trainX[:-(NUM_VAL_DAYS*TRAINING_WINDOW_HOURS)]
-        # valY = trainY[-(NUM_VAL_DAYS*TRAINING_WINDOW_HOURS):]
-        # trainY = trainY[:-(NUM_VAL_DAYS*TRAINING_WINDOW_HOURS)]
-
-    # evaluate predictions days for each day
-    predictedData = np.array(predictions, dtype=np.float64)
-    return predictedData
-
 def getDayAheadForecasts(model, history, testData, 
                             numFeatures,
                             wTestData = None, weatherData = None, 
-                            partialSourceProductionForecast = None):
+                            partialSourceProductionForecast = None,
+                            depVarColumn = DEPENDENT_VARIABLE_COL):
     global TRAINING_WINDOW_HOURS
     global MODEL_SLIDING_WINDOW_LEN
     global PREDICTION_WINDOW_HOURS
     global BUFFER_HOURS
-    # walk-forward validation over each day
+    # walk-forward validation over each day. All test days are forecast together, with one
+    # model.predict() per 24 hour step of the prediction window.
+    # With a list of dependent variable columns (multi-output model), forecasts are days x hours x columns.
     print("Testing (day ahead forecasts)...")
-    predictions = list()
-    weatherIdx = 0
-    for i in range(0, ((len(testData)//24)-(BUFFER_HOURS//24))):
-        dayAheadPredictions = list()
-        # predict n days, 1 day at a time
-        tempHistory = history.copy()
-        currentDayHours = i* MODEL_SLIDING_WINDOW_LEN
-        for j in range(0, PREDICTION_WINDOW_HOURS, 24):
-            if (weatherData is not None):
-                yhat_sequence, newTrainingData = getForecasts(model, tempHistory, 
-                            numFeatures, weatherData[j:j+24])
-            else:
-                yhat_sequence, newTrainingData = getForecasts(model, tempHistory, 
-                            numFeatures, None)
-            # add current prediction to history for predicting the next day
-            if (j==0 and partialSourceProductionForecast is not None):
-                for k in range(24):
-                    yhat_sequence[k] = partialSourceProductionForecast[currentDayHours+k]
-            dayAheadPredictions.extend(yhat_sequence)
-            latestHistory = testData[currentDayHours+j:currentDayHours+j+24, :].tolist()
-            for k in range(24):
-                latestHistory[k][DEPENDENT_VARIABLE_COL] = yhat_sequence[k]
-            tempHistory.extend(latestHistory)
-
-        # get real observation and add to history for predicting the next day
-        
-        history.extend(testData[currentDayHours:currentDayHours+MODEL_SLIDING_WINDOW_LEN, :].tolist())
-        predictions.append(dayAheadPredictions)
-        if (wTestData is not None):
-            weatherData = wTestData[weatherIdx:weatherIdx+PREDICTION_WINDOW_HOURS, :]
-            weatherIdx +=PREDICTION_WINDOW_HOURS
-
-    # evaluate predictions days for each day
-    predictedData = np.array(predictions, dtype=np.float64)
-    return predictedData
-
-
-def getForecasts(model, history, numFeatures, weatherData):
-    global TRAINING_WINDOW_HOURS
-    # flatten data
-    data = np.array(history, dtype=np.float64)
-    # retrieve last observations for input data
-    input_x = data[-TRAINING_WINDOW_HOURS:]
+    numDays = (len(testData)//24)-(BUFFER_HOURS//24)
+    weatherWindows = None
     if (weatherData is not None):
-        # print(input_x.shape, weatherData.shape)
-        input_x = np.append(input_x, weatherData, axis=1)
-        # print("inputX shape, numFeatures: ", input_x.shape, numFeatures)
-    # reshape into [1, n_input, num_features]
-    input_x = input_x.reshape((1, len(input_x), numFeatures))
-    # print("ip_x shape: ", input_x.shape)
-    yhat = model.predict(input_x, verbose=0)
-    # we only want the vector forecast
-    yhat = yhat[0]
-    return yhat, input_x
+        # day 0 uses weatherData, day i the (i-1)th window of wTestData
+        weatherWindows = common.getWeatherWindows(weatherData, wTestData, numDays, PREDICTION_WINDOW_HOURS)[np.newaxis]
+    predict = lambda inputX: model.predict(inputX, batch_size=len(inputX), verbose=0)
+    predictedData = common.getBatchedDayAheadForecasts(predict, np.array(history, dtype=np.float64), testData,
+                            weatherWindows, TRAINING_WINDOW_HOURS, PREDICTION_WINDOW_HOURS, MODEL_SLIDING_WINDOW_LEN,
+                            depVarColumn, partialSourceProductionForecast, numDays)[0]
+    return predictedData.astype(np.float64)
+
 
 def getANNHyperParams(firstTierConfig):
     hyperParams = {}
@@ -509,10 +641,19 @@ def writeSourceProductionForecastsToFile(formattedTestDates, unscaledTestData, u
 
 if __name__ == "__main__":
     print("CarbonCast first tier. Refer github repo for regions & sources.")
-    if (len(sys.argv) !=2):
-        print("Usage: python3 firstTierForecasts.py <configFileName>")
-        print("")
+    if (len(sys.argv) < 2):
+        print("Usage: python3 firstTierForecasts.py <configFileName> [--workers n] [--threads n] [--multi-output]")
+        print("--workers: number of processes running jobs in parallel (default 1)")
+        print("--threads: TF threads in each worker process (default 1 with workers, all cores otherwise)")
+        print("--multi-output: one model per region for all sources (default: MULTI_OUTPUT_MODEL in the config)")
         exit(0)
     configFileName = sys.argv[1]
-    runFirstTier(configFileName)
-    print("End")
\ No newline at end of file
+    args = sys.argv[2:]
+    numWorkers, numThreadsPerWorker = 1, None
+    if ("--workers" in args):
+        numWorkers = int(args[args.index("--workers")+1])
+    if ("--threads" in args):
+        numThreadsPerWorker = int(args[args.index("--threads")+1])
+    multiOutput = True if "--multi-output" in args else None
+    runFirstTier(configFileName, numWorkers, numThreadsPerWorker, multiOutput)
+    print("End")
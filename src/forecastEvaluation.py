@@ -0,0 +1,163 @@
+'''
+Evaluation report comparing carbon intensity forecasts from source production forecasts (DACF)
+with CarbonCast (second tier) forecasts, across regions.
+
+DACF forecasts are calculated with carbonIntensityCalculator. CarbonCast forecasts are read from the
+files written by secondTierForecasts.py (WRITE_CI_FORECASTS_TO_FILE), i.e.,
+<(LIFECYCLE/DIRECT)_CEF_OUT_FILE_NAME_PREFIX>_<exptNum>.csv in secondTierConfig.json.
+Each experiment is evaluated as a separate series.
+
+All series are aligned on the issue time of their forecast windows into (series x issue_day x hours)
+arrays, with NaN for days a series does not have. Daily MAPE and daywise mean/percentiles of all
+series are calculated in one pass, and written as one comparison table.
+'''
+
+import contextlib
+import glob
+import io
+import os
+import sys
+
+import json5 as json
+import numpy as np
+import pandas as pd
+
+import carbonIntensityCalculator
+import emissionFactorTables
+import forecastMetrics
+from config_manager import Config
+
+PREDICTION_WINDOW_HOURS = 96
+EVALUATION_PERCENTILES = [50, 90, 95, 99]
+SECOND_TIER_CONFIG_FILE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "secondTierConfig.json")
+
+
+def getDACFForecasts(region, isLifecycle, config_file=None):
+    """Actual & DACF carbon intensity of a region, as (UTC time, actual, forecast) columns"""
+    emissionFactorType = "lifecycle" if isLifecycle is True else "direct"
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, forecast_file = carbonIntensityCalculator.getInputFileNames(region, isLifecycle, True, config_file)
+        carbonRate = emissionFactorTables.getEmissionFactorTable(region, emissionFactorType, config_file)
+        numSources = carbonIntensityCalculator.inferNumSources(forecast_file, carbonRate,
+                        carbonIntensityCalculator.SRC_START_COL)
+        outputDataset = carbonIntensityCalculator.getSourceForecastCarbonIntensity(region, isLifecycle,
+                        numSources, config_file)
+    outputDataset.columns = ["UTC time", "actual", "forecast"]
+    return outputDataset
+
+def getCarbonCastForecastFiles(region, isLifecycle, secondTierConfig, secondTierConfigDir):
+    # one file per experiment, <prefix>_<exptNum>.csv
+    if (region not in secondTierConfig):
+        return []
+    prefixKey = "LIFECYCLE_CEF_OUT_FILE_NAME_PREFIX" if isLifecycle is True else "DIRECT_CEF_OUT_FILE_NAME_PREFIX"
+    prefix = os.path.join(secondTierConfigDir, secondTierConfig[region][prefixKey])
+    return sorted(glob.glob(prefix+"_*.csv"))
+
+def readCarbonCastForecasts(inFileName):
+    """Actual & CarbonCast carbon intensity from a second tier output file"""
+    dataset = pd.read_csv(inFileName, header=0)
+    outputDataset = pd.DataFrame()
+    outputDataset["UTC time"] = dataset["datetime"].values
+    outputDataset["actual"] = dataset["carbon_intensity_actual"].values
+    outputDataset["forecast"] = dataset["avg_carbon_intensity_forecast"].values
+    return outputDataset
+
+def stackForecastWindows(seriesList, predictionWindowHours=PREDICTION_WINDOW_HOURS):
+    '''
+    Align series of consecutive forecast windows on the issue time of each window.
+    Returns (series x issue_day x predictionWindowHours) actual & forecast arrays, with NaN where a
+    series has no forecast for that issue time, and the issue times.
+    '''
+    issueTimes = []
+    for series in seriesList:
+        numWindows = len(series)//predictionWindowHours
+        times = pd.to_datetime(series["UTC time"].values[:numWindows*predictionWindowHours:predictionWindowHours])
+        # windows issued at the same time (duplicates in the source files) are kept as separate days
+        occurrence = pd.Series(times).groupby(times).cumcount().values
+        issueTimes.append(pd.MultiIndex.from_arrays([times, occurrence]))
+    allIssueTimes = issueTimes[0]
+    for times in issueTimes[1:]:
+        allIssueTimes = allIssueTimes.union(times)
+    allIssueTimes = allIssueTimes.sort_values()
+    actual = np.full((len(seriesList), len(allIssueTimes), predictionWindowHours), np.nan)
+    forecast = np.full_like(actual, np.nan)
+    for i, series in enumerate(seriesList):
+        numWindows = len(issueTimes[i])
+        days = allIssueTimes.get_indexer(issueTimes[i])
+        actual[i, days] = np.reshape(series["actual"].values[:numWindows*predictionWindowHours],
+                                     (numWindows, predictionWindowHours))
+        forecast[i, days] = np.reshape(series["forecast"].values[:numWindows*predictionWindowHours],
+                                       (numWindows, predictionWindowHours))
+    return actual, forecast, allIssueTimes.get_level_values(0)
+
+def evaluateForecasts(actual, forecast, percentiles=EVALUATION_PERCENTILES):
+    '''
+    actual, forecast: (series x issue_day x hours)
+    Returns the (series x issue_day x lead_day) daily MAPE and its daywise statistics over issue days.
+    '''
+    numSeries, numDays, numHours = actual.shape
+    ape = forecastMetrics.getAbsolutePercentageError(actual, forecast)
+    dailyMape = np.mean(np.reshape(ape, (numSeries, numDays, numHours//24, 24)), axis=3)
+    return dailyMape, forecastMetrics.getDaywiseStatistics(dailyMape, percentiles)
+
+def getComparisonTable(seriesInfo, dailyMape, statistics):
+    # one row per series & lead day
+    numSeries, _, numLeadDays = dailyMape.shape
+    table = pd.DataFrame(np.repeat(seriesInfo.values, numLeadDays, axis=0), columns=seriesInfo.columns)
+    table["lead_day"] = np.tile(np.arange(1, numLeadDays+1), numSeries)
+    table["num_days"] = np.sum(~np.isnan(dailyMape), axis=1).ravel()
+    for name, values in statistics.items():
+        table[name+"_mape"] = np.round(np.ravel(values), 3)
+    return table
+
+def runEvaluation(regions, emissionFactorTypes, outFileName=None,
+                  secondTierConfigFileName=SECOND_TIER_CONFIG_FILE_NAME, config_file=None):
+    """Compare DACF & CarbonCast forecasts for all regions and emission factor types"""
+    with open(secondTierConfigFileName, "r") as configFile:
+        secondTierConfig = json.load(configFile)
+    secondTierConfigDir = os.path.dirname(os.path.abspath(secondTierConfigFileName))
+
+    seriesInfo, seriesList = [], []
+    for region in regions:
+        for emissionFactorType in emissionFactorTypes:
+            isLifecycle = (emissionFactorType == "lifecycle")
+            try:
+                seriesList.append(getDACFForecasts(region, isLifecycle, config_file))
+                seriesInfo.append((region, emissionFactorType, "DACF", ""))
+            except (Exception, SystemExit) as e:
+                print("No DACF forecasts for ", region, emissionFactorType, ": ", e)
+            for fileName in getCarbonCastForecastFiles(region, isLifecycle, secondTierConfig, secondTierConfigDir):
+                seriesList.append(readCarbonCastForecasts(fileName))
+                seriesInfo.append((region, emissionFactorType, "CarbonCast", os.path.basename(fileName)))
+    print("Evaluating ", len(seriesList), " forecast series...")
+    if (len(seriesList) == 0):
+        return None
+
+    actual, forecast, issueTimes = stackForecastWindows(seriesList)
+    dailyMape, statistics = evaluateForecasts(actual, forecast)
+    seriesInfo = pd.DataFrame(seriesInfo, columns=["region", "emission_factors", "model", "file"])
+    # test period of each series
+    hasDay = ~np.isnan(dailyMape[:, :, 0])
+    seriesInfo["first_issue_day"] = issueTimes[np.argmax(hasDay, axis=1)].date
+    seriesInfo["last_issue_day"] = issueTimes[hasDay.shape[1]-1-np.argmax(hasDay[:, ::-1], axis=1)].date
+    table = getComparisonTable(seriesInfo, dailyMape, statistics)
+    if (outFileName is not None):
+        table.to_csv(outFileName, index=False)
+        print("Comparison table written to ", outFileName)
+    return table
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 3):
+        print("Usage: python3 forecastEvaluation.py <-l/-d/-b> <out_file.csv> [region ...]")
+        print("l - lifecycle, d - direct, b - both")
+        print("If no region is given, all regions under data/ are used.")
+        print("CarbonCast forecasts are read from the second tier output files in secondTierConfig.json.")
+        exit(0)
+    emissionFactorTypes = {"-l": ["lifecycle"], "-d": ["direct"], "-b": ["direct", "lifecycle"]}[sys.argv[1].lower()]
+    regions = sys.argv[3:]
+    if (len(regions) == 0):
+        regions = Config().get_regions()
+    table = runEvaluation(regions, emissionFactorTypes, sys.argv[2])
+    if (table is not None):
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(table.to_string(index=False))
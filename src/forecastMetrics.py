@@ -0,0 +1,84 @@
+'''
+Forecast accuracy metrics (RMSE, MAPE, daily MAPE/RMSE, per lead hour error & percentiles).
+
+Forecasts are made every day for the next PREDICTION_WINDOW_HOURS hours, so a flat series of
+forecasts is reshaped to (issue_day, lead_day, 24) and all daily scores are calculated at once.
+MAPE and MSE follow tf.keras.losses.MeanAbsolutePercentageError and MeanSquaredError: the
+percentage error of an hour is 100 * |actual - forecast| / max(|actual|, 1e-7), averaged over
+all hours.
+
+Only numpy is required, so this module can be used without loading TensorFlow.
+'''
+
+import math
+
+import numpy as np
+
+EPSILON = 1e-7 # same as keras backend epsilon, avoids division by 0 in MAPE
+PERCENTILES = [50, 90, 95, 99]
+
+
+def getErrors(actual, predicted):
+    # flatten both series (e.g., (days x hours) or (hours x 1)) to the same shape
+    actual = np.reshape(np.asarray(actual, dtype=np.float64), -1)
+    predicted = np.reshape(np.asarray(predicted, dtype=np.float64), -1)
+    return actual, predicted - actual
+
+def getAbsolutePercentageError(actual, predicted):
+    actual, error = getErrors(actual, predicted)
+    return 100 * np.abs(error) / np.maximum(np.abs(actual), EPSILON)
+
+def getMSE(actual, predicted):
+    _, error = getErrors(actual, predicted)
+    return np.mean(np.square(error))
+
+def getRMSE(actual, predicted, decimals=6):
+    return round(math.sqrt(getMSE(actual, predicted)), decimals)
+
+def getMAPE(actual, predicted):
+    # plain float, so scores written with str() (e.g., first tier MAPE files) are plain numbers
+    return float(np.mean(getAbsolutePercentageError(actual, predicted)))
+
+def reshapeToDays(data, predictionWindowHours):
+    # (hours) -> (issue_day, lead_day, 24). Hours after the last complete window are dropped.
+    data = np.reshape(data, -1)
+    numWindows = len(data)//predictionWindowHours
+    return np.reshape(data[:numWindows*predictionWindowHours], (numWindows, predictionWindowHours//24, 24))
+
+def getDailyMAPE(actual, predicted, predictionWindowHours):
+    # (issue_day x lead_day) MAPE of every 24 hour block
+    ape = reshapeToDays(getAbsolutePercentageError(actual, predicted), predictionWindowHours)
+    return np.mean(ape, axis=2)
+
+def getDailyRMSE(actual, predicted, predictionWindowHours, decimals=6):
+    # (issue_day x lead_day) RMSE of every 24 hour block
+    _, error = getErrors(actual, predicted)
+    squaredError = reshapeToDays(np.square(error), predictionWindowHours)
+    return np.round(np.sqrt(np.mean(squaredError, axis=2)), decimals)
+
+def getLeadHourError(actual, predicted, predictionWindowHours):
+    # MAPE & mean error (forecast - actual) for each of the predictionWindowHours lead hours
+    _, error = getErrors(actual, predicted)
+    ape = getAbsolutePercentageError(actual, predicted)
+    numWindows = len(error)//predictionWindowHours
+    ape = np.reshape(ape[:numWindows*predictionWindowHours], (numWindows, predictionWindowHours))
+    error = np.reshape(error[:numWindows*predictionWindowHours], (numWindows, predictionWindowHours))
+    return np.mean(ape, axis=0), np.mean(error, axis=0)
+
+def getPercentiles(dailyScore, percentiles=PERCENTILES):
+    # {percentile: score of each lead day}, from (issue_day x lead_day) scores
+    scores = np.percentile(dailyScore, percentiles, axis=0)
+    return {percentile: scores[i] for i, percentile in enumerate(percentiles)}
+
+def getDaywiseStatistics(dailyMape, percentiles=PERCENTILES):
+    '''
+    Mean and percentiles of daily MAPE over issue days, for each lead day.
+    dailyMape: (..., issue_day, lead_day), e.g., (series x issue_day x lead_day) for several
+    regions/models at once. Missing days (NaN) are ignored.
+    Returns {"mean": ..., "p<percentile>": ...}, each of shape (..., lead_day).
+    '''
+    statistics = {"mean": np.nanmean(dailyMape, axis=-2)}
+    scores = np.nanpercentile(dailyMape, percentiles, axis=-2)
+    for i, percentile in enumerate(percentiles):
+        statistics["p"+str(percentile)] = scores[i]
+    return statistics
@@ -0,0 +1,224 @@
+'''
+Headless report of carbon intensity forecast accuracy for each region.
+
+For each region & emission factor type, DACF forecasts (from source production forecasts) and
+CarbonCast forecasts (second tier output files, see forecastEvaluation.py) are evaluated at once,
+and the following are written to the output directory, without opening any window:
+    <region>_<type>_cdf.<fmt>       - CDF of daily MAPE of each series, one panel per lead day
+    <region>_<type>_boxplot.<fmt>   - daily MAPE box plots of each series & lead day
+    <region>_<type>_forecasts.<fmt> - actual vs day-ahead forecasts over the first days of the test period
+    mape_boxplots.<fmt>             - day-ahead MAPE box plots of all regions
+    report_stats.json               - daywise mean & percentiles of daily MAPE of each series
+Regions are rendered in parallel in a process pool, with the Agg backend. Figures are closed as
+soon as they are written.
+'''
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import json5
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import forecastEvaluation
+from config_manager import Config
+
+REPORT_FORMATS = ["png"]
+NUM_FORECAST_PLOT_DAYS = 14
+
+
+def getCDF(data):
+    '''
+    Empirical CDF of each column of data (e.g., issue_day x lead_day daily MAPE), ignoring NaN.
+    Returns the sorted values and the CDF at each value, of the same shape as data.
+    '''
+    values = np.sort(data, axis=0) # NaN are sorted to the end
+    counts = np.sum(~np.isnan(data), axis=0)
+    cdf = np.arange(1, data.shape[0]+1)[:, np.newaxis] / np.maximum(counts, 1)
+    cdf = np.where(np.isnan(values), np.nan, cdf)
+    return values, cdf
+
+def saveFigure(fig, fileNamePrefix, formats):
+    fileNames = []
+    for fmt in formats:
+        fileNames.append(fileNamePrefix+"."+fmt)
+        fig.savefig(fileNames[-1], bbox_inches="tight")
+    plt.close(fig)
+    return fileNames
+
+def plotCDFs(dailyMape, labels, title):
+    numLeadDays = dailyMape.shape[2]
+    fig, axes = plt.subplots(1, numLeadDays, figsize=(4*numLeadDays, 3.5), sharey=True, squeeze=False)
+    for i in range(len(labels)):
+        values, cdf = getCDF(dailyMape[i])
+        for day in range(numLeadDays):
+            axes[0, day].plot(values[:, day], cdf[:, day], label=labels[i])
+    for day in range(numLeadDays):
+        axes[0, day].set_title("Day "+str(day+1))
+        axes[0, day].set_xlabel("MAPE (%)")
+        axes[0, day].grid(axis="both")
+    axes[0, 0].set_ylabel("CDF")
+    axes[0, 0].legend(fontsize=8)
+    fig.suptitle(title)
+    return fig
+
+def plotDailyMapeBoxplots(dailyMape, labels, title):
+    numLeadDays = dailyMape.shape[2]
+    fig, ax = plt.subplots(figsize=(max(6, len(labels)*numLeadDays*0.6), 4))
+    data, positions, tickLabels = [], [], []
+    for day in range(numLeadDays):
+        for i in range(len(labels)):
+            values = dailyMape[i, :, day]
+            data.append(values[~np.isnan(values)])
+            positions.append(day*(len(labels)+1)+i)
+            tickLabels.append(labels[i]+"\nday "+str(day+1))
+    bp_dict = ax.boxplot(data, positions=positions)
+    for line in bp_dict['medians']:
+        x, y = line.get_xydata()[1] # top of median line
+        ax.text(x, y, '%.1f' % y, horizontalalignment='center', fontsize=7)
+    ax.set_xticks(positions)
+    ax.set_xticklabels(tickLabels, rotation=90, fontsize=7)
+    ax.set_ylabel("MAPE (%)")
+    ax.set_title(title)
+    return fig
+
+def plotForecasts(actual, forecast, issueTimes, labels, title, numDays=NUM_FORECAST_PLOT_DAYS):
+    # day-ahead (first 24 hours) forecasts of the first numDays issue days, as one series
+    numDays = min(numDays, actual.shape[1])
+    times = (pd.DatetimeIndex(issueTimes[:numDays]).values[:, np.newaxis] +
+             np.arange(24).astype("timedelta64[h]")).ravel()
+    fig, ax = plt.subplots(figsize=(10, 4))
+    # all series have the same actual values (NaN where a series has no forecast)
+    ax.plot(times, np.fmax.reduce(actual[:, :numDays, :24], axis=0).ravel(),
+            label="Actual carbon intensity", color="k")
+    for i in range(len(labels)):
+        ax.plot(times, forecast[i, :numDays, :24].ravel(), label=labels[i], linestyle="dashed")
+    ax.set_xlabel("UTC time")
+    ax.set_ylabel("Carbon Intensity (g/KWh)")
+    ax.grid(axis="x")
+    ax.tick_params(axis="x", rotation=45)
+    ax.legend(fontsize=8)
+    ax.set_title(title)
+    return fig
+
+def getSeriesStatistics(dailyMape, statistics, labels):
+    # {label: {"num_days": n, "mean": [lead days], "p50": [...], ...}}
+    seriesStatistics = {}
+    for i, label in enumerate(labels):
+        seriesStatistics[label] = {"num_days": int(np.sum(~np.isnan(dailyMape[i, :, 0])))}
+        for name, values in statistics.items():
+            seriesStatistics[label][name] = np.round(values[i], 3).tolist()
+    return seriesStatistics
+
+def getRegionSeries(region, isLifecycle, secondTierConfigFileName, config_file=None):
+    # DACF & CarbonCast forecast series of a region, with their labels
+    with open(secondTierConfigFileName, "r") as configFile:
+        secondTierConfig = json5.load(configFile)
+    secondTierConfigDir = os.path.dirname(os.path.abspath(secondTierConfigFileName))
+    labels, seriesList = [], []
+    try:
+        seriesList.append(forecastEvaluation.getDACFForecasts(region, isLifecycle, config_file))
+        labels.append("DACF")
+    except (Exception, SystemExit) as e:
+        print("No DACF forecasts for ", region, ": ", e)
+    for fileName in forecastEvaluation.getCarbonCastForecastFiles(region, isLifecycle,
+                        secondTierConfig, secondTierConfigDir):
+        seriesList.append(forecastEvaluation.readCarbonCastForecasts(fileName))
+        labels.append("CarbonCast "+os.path.splitext(os.path.basename(fileName))[0].rsplit("_", 1)[-1])
+    return labels, seriesList
+
+def renderRegionReport(job):
+    """Evaluate & plot the forecasts of one region, and return its statistics"""
+    region, emissionFactorType, outDir, formats, secondTierConfigFileName, config_file = job
+    startTime = time.time()
+    report = {"region": region, "emission_factors": emissionFactorType, "files": [], "series": {}}
+    labels, seriesList = getRegionSeries(region, emissionFactorType == "lifecycle",
+                                         secondTierConfigFileName, config_file)
+    if (len(seriesList) == 0):
+        report["status"] = "no forecasts"
+        return report, None
+    actual, forecast, issueTimes = forecastEvaluation.stackForecastWindows(seriesList)
+    dailyMape, statistics = forecastEvaluation.evaluateForecasts(actual, forecast)
+    report["series"] = getSeriesStatistics(dailyMape, statistics, labels)
+
+    title = region+" ("+emissionFactorType+")"
+    fileNamePrefix = os.path.join(outDir, region+"_"+emissionFactorType)
+    report["files"].extend(saveFigure(plotCDFs(dailyMape, labels, title), fileNamePrefix+"_cdf", formats))
+    report["files"].extend(saveFigure(plotDailyMapeBoxplots(dailyMape, labels, title),
+                                      fileNamePrefix+"_boxplot", formats))
+    report["files"].extend(saveFigure(plotForecasts(actual, forecast, issueTimes, labels, title),
+                                      fileNamePrefix+"_forecasts", formats))
+    report["status"] = "ok"
+    report["time_s"] = round(time.time() - startTime, 3)
+    # day-ahead daily MAPE of each series, for the summary box plots of all regions
+    dayAheadMape = {label: dailyMape[i, :, 0][~np.isnan(dailyMape[i, :, 0])] for i, label in enumerate(labels)}
+    return report, dayAheadMape
+
+def plotRegionBoxplots(dayAheadMape, title="Day-ahead MAPE boxplots"):
+    # dayAheadMape: {(region, label): daily MAPE}
+    fig, ax = plt.subplots(figsize=(max(6, len(dayAheadMape)*0.6), 4))
+    bp_dict = ax.boxplot(list(dayAheadMape.values()))
+    for line in bp_dict['medians']:
+        x, y = line.get_xydata()[1] # top of median line
+        ax.text(x, y, '%.1f' % y, horizontalalignment='center', fontsize=7)
+    ax.set_xticklabels([region+"\n"+label for region, label in dayAheadMape.keys()], rotation=90, fontsize=7)
+    ax.set_xlabel("Zones/ISOs")
+    ax.set_ylabel("MAPE (%)")
+    ax.set_title(title)
+    return fig
+
+def runReport(regions, emissionFactorTypes, outDir, formats=REPORT_FORMATS, numWorkers=None,
+              secondTierConfigFileName=forecastEvaluation.SECOND_TIER_CONFIG_FILE_NAME, config_file=None):
+    """Render the report of all regions & emission factor types in parallel"""
+    os.makedirs(outDir, exist_ok=True)
+    jobs = [(region, emissionFactorType, outDir, formats, secondTierConfigFileName, config_file)
+                for region in regions for emissionFactorType in emissionFactorTypes]
+    print("Rendering ", len(jobs), " region reports...")
+    startTime = time.time()
+    with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+        results = list(executor.map(renderRegionReport, jobs))
+
+    reports, dayAheadMape = [], {}
+    for report, regionDayAheadMape in results:
+        reports.append(report)
+        if (regionDayAheadMape is not None):
+            for label, values in regionDayAheadMape.items():
+                dayAheadMape[(report["region"]+" "+report["emission_factors"], label)] = values
+    summaryFiles = []
+    if (len(dayAheadMape) > 0):
+        summaryFiles = saveFigure(plotRegionBoxplots(dayAheadMape), os.path.join(outDir, "mape_boxplots"), formats)
+    statsFileName = os.path.join(outDir, "report_stats.json")
+    with open(statsFileName, "w") as statsFile:
+        json.dump({"regions": reports, "summary_files": summaryFiles}, statsFile, indent=2)
+    print("Report written to ", outDir, " in ", round(time.time() - startTime, 3), "s")
+    return reports
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 3):
+        print("Usage: python3 forecastReport.py <-l/-d/-b> <out_dir> [region ...] [--formats png,svg] [--workers n]")
+        print("l - lifecycle, d - direct, b - both")
+        print("If no region is given, all regions under data/ are used.")
+        exit(0)
+    emissionFactorTypes = {"-l": ["lifecycle"], "-d": ["direct"], "-b": ["direct", "lifecycle"]}[sys.argv[1].lower()]
+    args = sys.argv[3:]
+    formats, numWorkers = REPORT_FORMATS, None
+    if ("--formats" in args):
+        idx = args.index("--formats")
+        formats = args[idx+1].split(",")
+        args = args[:idx] + args[idx+2:]
+    if ("--workers" in args):
+        idx = args.index("--workers")
+        numWorkers = int(args[idx+1])
+        args = args[:idx] + args[idx+2:]
+    regions = args
+    if (len(regions) == 0):
+        regions = Config().get_regions()
+    reports = runReport(regions, emissionFactorTypes, sys.argv[2], formats, numWorkers)
+    for report in reports:
+        print(report["region"], report["emission_factors"], report["status"], report.get("time_s", ""))
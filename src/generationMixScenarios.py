@@ -0,0 +1,165 @@
+'''
+File to calculate carbon intensity for what-if generation mix scenarios
+(e.g., "CISO with +2000 MW solar and -30% natural gas").
+
+Each scenario scales and/or adds a constant amount of production (in MW, i.e., MWh per hour)
+to the source columns loaded by carbonIntensityCalculator.initialize. Carbon intensity of all
+scenarios is calculated at once with broadcasting, in chunks of scenarios so that memory stays
+bounded. Results are returned as one (scenarios x hours) array plus summary statistics.
+'''
+
+import itertools
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+import carbonIntensityCalculator
+import carbonIntensityEngine
+
+MAX_CHUNK_BYTES = 256 * 1024 * 1024 # memory for the perturbed source mix of one chunk of scenarios
+SUMMARY_PERCENTILES = [10, 50, 90]
+
+
+def getScenarioMatrices(sources, scenarios):
+    '''
+    scenarios: list of {"name": ..., "scale": {source: factor}, "add": {source: MW}}
+    Returns scenario names, and (scenarios x sources) scale & offset matrices.
+    '''
+    sourceIdx = {source: j for j, source in enumerate(sources)}
+    scale = np.ones((len(scenarios), len(sources)), dtype=np.float64)
+    offset = np.zeros((len(scenarios), len(sources)), dtype=np.float64)
+    names = []
+    for i, scenario in enumerate(scenarios):
+        for source, factor in scenario.get("scale", {}).items():
+            scale[i, sourceIdx[source]] = factor
+        for source, value in scenario.get("add", {}).items():
+            offset[i, sourceIdx[source]] = value
+        names.append(scenario.get("name", "scenario_"+str(i)))
+    return names, scale, offset
+
+def getScenarioGrid(scaleValues=None, addValues=None):
+    # All combinations of per-source scale factors and additions,
+    # e.g., scaleValues = {"nat_gas": [0.5, 0.7, 1]}, addValues = {"solar": [0, 1000, 2000]}
+    if (scaleValues is None):
+        scaleValues = {}
+    if (addValues is None):
+        addValues = {}
+    perturbations = [("scale", source, values) for source, values in scaleValues.items()]
+    perturbations.extend([("add", source, values) for source, values in addValues.items()])
+    scenarios = []
+    for combination in itertools.product(*[values for _, _, values in perturbations]):
+        scenario = {"scale": {}, "add": {}}
+        nameParts = []
+        for (kind, source, _), value in zip(perturbations, combination):
+            scenario[kind][source] = value
+            nameParts.append(kind+"_"+source+"_"+str(value))
+        scenario["name"] = ",".join(nameParts)
+        scenarios.append(scenario)
+    return scenarios
+
+def readScenarioFile(scenarioFileName):
+    # JSON file with a list of "scenarios" and/or a "grid" of {"scale": {...}, "add": {...}} values
+    with open(scenarioFileName, "r") as scenarioFile:
+        scenarioConfig = json.load(scenarioFile)
+    scenarios = list(scenarioConfig.get("scenarios", []))
+    if ("grid" in scenarioConfig):
+        grid = scenarioConfig["grid"]
+        scenarios.extend(getScenarioGrid(grid.get("scale", {}), grid.get("add", {})))
+    return scenarios
+
+def calculateScenarioCarbonIntensity(sourceData, emissionFactors, scale, offset,
+                                    maxChunkBytes=MAX_CHUNK_BYTES, dtype=np.float32):
+    '''
+    sourceData: (hours x sources), emissionFactors: (sources), scale & offset: (scenarios x sources)
+    Returns (scenarios x hours) carbon intensity.
+    '''
+    # hours where all sources are missing are filled once, before applying the scenarios
+    _, sourceData, _ = carbonIntensityEngine.calculateCarbonIntensity(sourceData, emissionFactors)
+    emissionFactors = np.asarray(emissionFactors, dtype=np.float64)
+    numScenarios = scale.shape[0]
+    numHours, numSources = sourceData.shape
+    scenarioCarbonIntensity = np.empty((numScenarios, numHours), dtype=dtype)
+    chunkSize = max(1, maxChunkBytes // (numHours * numSources * 8))
+    for start in range(0, numScenarios, chunkSize):
+        end = min(start+chunkSize, numScenarios)
+        # (chunk x hours x sources) production for every scenario in this chunk
+        mix = sourceData[np.newaxis, :, :] * scale[start:end, np.newaxis, :]
+        mix += offset[start:end, np.newaxis, :]
+        np.maximum(mix, 0, out=mix)
+        totalProduction = mix.sum(axis=2)
+        emissions = mix @ emissionFactors
+        carbonIntensity = np.zeros_like(totalProduction)
+        np.divide(emissions, totalProduction, out=carbonIntensity, where=(totalProduction != 0))
+        scenarioCarbonIntensity[start:end] = carbonIntensity
+    return scenarioCarbonIntensity
+
+def summarizeScenarios(names, scenarioCarbonIntensity, baselineCarbonIntensity):
+    # one row of statistics per scenario
+    baselineMean = np.mean(baselineCarbonIntensity)
+    scenarioMean = np.mean(scenarioCarbonIntensity, axis=1, dtype=np.float64)
+    percentiles = np.percentile(scenarioCarbonIntensity, SUMMARY_PERCENTILES, axis=1)
+    summary = pd.DataFrame({"scenario": names,
+                            "mean": scenarioMean,
+                            "std": np.std(scenarioCarbonIntensity, axis=1, dtype=np.float64),
+                            "min": np.min(scenarioCarbonIntensity, axis=1)})
+    for i, percentile in enumerate(SUMMARY_PERCENTILES):
+        summary["p"+str(percentile)] = percentiles[i]
+    summary["max"] = np.max(scenarioCarbonIntensity, axis=1)
+    # no relative change for an all-zero baseline (e.g., direct emissions of a hydro & nuclear only region)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        summary["mean_change_percent"] = np.where(baselineMean != 0,
+                                            (scenarioMean - baselineMean) / baselineMean * 100, np.nan)
+    return summary
+
+def runScenarios(region, isLifecycle, numSources, scenarios, config_file=None):
+    """Calculate carbon intensity of all scenarios for a region from its real-time source data"""
+    real_time_file, _ = carbonIntensityCalculator.getInputFileNames(region, isLifecycle, False, config_file)
+    dataset = carbonIntensityCalculator.initialize(real_time_file)
+    srcStartCol = carbonIntensityCalculator.REAL_TIME_SRC_START_COL
+    sources = dataset.columns.values[srcStartCol:srcStartCol+numSources]
+    sourceData = dataset.iloc[:, srcStartCol:srcStartCol+numSources].to_numpy(dtype=np.float64)
+
+    emissionFactorType = "direct"
+    if (isLifecycle is True):
+        emissionFactorType = "lifecycle"
+    carbonRate = carbonIntensityCalculator.getEmissionFactorSets(region, config_file=config_file)[emissionFactorType]
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(sources, carbonRate)
+
+    names, scale, offset = getScenarioMatrices(sources, scenarios)
+    print("Calculating carbon intensity for ", len(names), " scenarios with sources ", list(sources))
+    baselineCarbonIntensity, _, _ = carbonIntensityEngine.calculateCarbonIntensity(sourceData, emissionFactors)
+    scenarioCarbonIntensity = calculateScenarioCarbonIntensity(sourceData, emissionFactors, scale, offset)
+    summary = summarizeScenarios(names, scenarioCarbonIntensity, baselineCarbonIntensity)
+    return scenarioCarbonIntensity, summary, dataset["UTC time"].values
+
+if __name__ == "__main__":
+    # the repo level config.json (emission factor overrides, data path) is only used with --config
+    config_file = None
+    if ("--config" in sys.argv):
+        idx = sys.argv.index("--config")
+        config_file = sys.argv[idx+1]
+        sys.argv = sys.argv[:idx] + sys.argv[idx+2:]
+        print("Using configuration file: ", config_file)
+    if (len(sys.argv) < 5):
+        print("Usage: python3 generationMixScenarios.py <region> <-l/-d> <num_sources> <scenario_file.json> [out_file_prefix]")
+        print("l - lifecycle, d - direct")
+        print("scenario_file.json - list of \"scenarios\" and/or a \"grid\" of per-source \"scale\" & \"add\" (MW) values")
+        print("out_file_prefix - if provided, writes <prefix>.npz (carbon intensity) and <prefix>_summary.csv")
+        print("--config <config.json> - optional. Emission factor overrides (carbon_rates) & data path.")
+        print("                         Without it, config.json is not used.")
+        exit(0)
+    region = sys.argv[1]
+    isLifecycle = (sys.argv[2].lower() == "-l")
+    numSources = int(sys.argv[3])
+    scenarios = readScenarioFile(sys.argv[4])
+    scenarioCarbonIntensity, summary, dateTime = runScenarios(region, isLifecycle, numSources, scenarios, config_file)
+    print(summary)
+    if (len(sys.argv) > 5):
+        outFilePrefix = sys.argv[5]
+        np.savez_compressed(outFilePrefix+".npz", carbon_intensity=scenarioCarbonIntensity,
+                            scenario=np.array(summary["scenario"].values, dtype=str),
+                            datetime=dateTime.astype("datetime64[s]").astype(str))
+        summary.to_csv(outFilePrefix+"_summary.csv", index=False)
+    print("Scenario analysis for region: ", region, " done.")
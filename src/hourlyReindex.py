@@ -0,0 +1,106 @@
+'''
+Align hourly data to a complete UTC hourly grid.
+
+Timestamps are converted to integer hours since the epoch, so that every row can be placed on the
+grid with a single scatter (no sorting or per-hour loop). Hours missing in the source file are
+inserted, flagged and filled with one of the following policies:
+    ffill  - value of the previous available hour (leading gaps use the first available hour)
+    linear - linear interpolation between the surrounding available hours (ends use the nearest hour)
+    zero   - 0
+    nan    - left as NaN
+Duplicate hours keep the last row of the source file. Timestamps which are not on the hour are
+floored to the hour.
+'''
+
+import numpy as np
+import pandas as pd
+
+FILL_POLICIES = ["ffill", "linear", "zero", "nan"]
+
+
+def getHourPositions(dateTime):
+    # hours since epoch; timezone-aware timestamps are converted to UTC
+    dateTime = pd.DatetimeIndex(pd.to_datetime(dateTime, utc=True)).tz_localize(None)
+    return dateTime.values.astype("datetime64[h]").astype(np.int64)
+
+def createHourlyGrid(startDate, numHours):
+    return np.datetime64(pd.Timestamp(startDate).tz_localize(None), "h") + np.arange(numHours)
+
+def getFillIndex(present):
+    '''
+    For each hour on the grid, the index of the previous (prev) and next (next) available hour.
+    Leading/trailing gaps point to the first/last available hour.
+    '''
+    numHours = len(present)
+    positions = np.arange(numHours)
+    prevIdx = np.maximum.accumulate(np.where(present, positions, -1))
+    nextIdx = np.minimum.accumulate(np.where(present, positions, numHours)[::-1])[::-1]
+    firstIdx, lastIdx = nextIdx[0], prevIdx[-1]
+    prevIdx = np.where(prevIdx < 0, firstIdx, prevIdx)
+    nextIdx = np.where(nextIdx >= numHours, lastIdx, nextIdx)
+    return prevIdx, nextIdx
+
+def fillValues(values, present, fillPolicy):
+    # values: (hours x columns) on the grid, with NaN for the inserted hours
+    if (fillPolicy == "nan" or present.all()):
+        return values
+    if (fillPolicy == "zero"):
+        values[~present] = 0
+        return values
+    prevIdx, nextIdx = getFillIndex(present)
+    inserted = np.flatnonzero(~present)
+    if (fillPolicy == "ffill"):
+        values[inserted] = values[prevIdx[inserted]]
+    else:
+        span = (nextIdx - prevIdx)[inserted]
+        weight = np.zeros(len(inserted))
+        np.divide(inserted - prevIdx[inserted], span, out=weight, where=(span != 0))
+        prevValues, nextValues = values[prevIdx[inserted]], values[nextIdx[inserted]]
+        values[inserted] = prevValues + weight[:, np.newaxis] * (nextValues - prevValues)
+    return values
+
+def reindexHourly(dataset, timeCol="UTC time", fillPolicy="ffill", startDate=None, endDate=None):
+    '''
+    Reindex dataset to every hour between startDate and endDate (inclusive; default: first and
+    last hour in the dataset). Returns the reindexed dataset and a boolean mask of inserted hours.
+    Numeric columns are filled as per fillPolicy, other columns with the previous available hour.
+    '''
+    if (fillPolicy not in FILL_POLICIES):
+        raise ValueError(f"Unknown fill policy: {fillPolicy}. Available policies: {FILL_POLICIES}")
+    hours = getHourPositions(dataset[timeCol])
+    startHour = hours.min() if startDate is None else getHourPositions([startDate])[0]
+    endHour = hours.max() if endDate is None else getHourPositions([endDate])[0]
+    numHours = int(endHour - startHour + 1)
+
+    rows = hours - startHour
+    inRange = (rows >= 0) & (rows < numHours)
+    rows = rows[inRange]
+    present = np.zeros(numHours, dtype=bool)
+    present[rows] = True
+    srcIdx = np.full(numHours, -1, dtype=np.int64)
+    srcIdx[rows] = np.flatnonzero(inRange) # with duplicate hours, the last row is kept
+    if (not present.any()):
+        raise ValueError("No rows of the dataset fall within the requested hourly grid")
+
+    reindexedDataset = pd.DataFrame(index=np.arange(numHours))
+    prevIdx, _ = getFillIndex(present)
+    numericCols = dataset.select_dtypes(include=np.number).columns
+    numericValues = np.full((numHours, len(numericCols)), np.nan)
+    numericValues[present] = dataset[numericCols].to_numpy(dtype=np.float64)[srcIdx[present]]
+    numericValues = fillValues(numericValues, present, fillPolicy)
+    for col in dataset.columns:
+        if (col == timeCol):
+            hourlyDateTime = pd.DatetimeIndex(createHourlyGrid(pd.Timestamp(startHour, unit="h"), numHours))
+            if (isinstance(dataset[col].dtype, pd.DatetimeTZDtype)):
+                hourlyDateTime = hourlyDateTime.tz_localize("UTC").tz_convert(dataset[col].dt.tz)
+            if (hourlyDateTime.dtype != dataset[col].dtype):
+                hourlyDateTime = hourlyDateTime.astype(dataset[col].dtype)
+            reindexedDataset[col] = hourlyDateTime
+        elif (col in numericCols):
+            values = numericValues[:, numericCols.get_loc(col)]
+            if (np.issubdtype(dataset[col].dtype, np.integer) and np.array_equal(values, np.round(values))):
+                values = values.astype(dataset[col].dtype)
+            reindexedDataset[col] = values
+        else:
+            reindexedDataset[col] = dataset[col].values[srcIdx[prevIdx]]
+    return reindexedDataset, ~present
@@ -0,0 +1,229 @@
+'''
+Noise robustness sweep of the saved second tier models.
+
+Gaussian noise is added to the source production forecasts used by the second tier, as in
+utility.addNoiseToForecast: the standard deviation of the noise in each 24 hour block is
+(noise level x mean forecast of the block), and noisy forecasts are clipped at 0.
+Instead of writing one noisy file per source & noise level and running the second tier on each,
+the saved model of a region is loaded once, and the noisy forecasts of all noise levels & seeds
+of a source are generated as one tensor. The same standard normal samples are used for all
+noise levels of a seed, so the MAPE degradation surface is smooth over noise levels.
+
+Day-ahead (walk-forward) forecasts of all issue days & noisy inputs are made together: each
+24 hour step of the prediction window is one batched model.predict() call.
+The MAPE of each source, noise level & lead day, and its degradation from the forecasts
+without noise, are written to one table.
+'''
+
+import os
+import sys
+import time
+
+import json5 as json
+import numpy as np
+import pandas as pd
+from keras.models import load_model
+
+import calendarFeatures
+import common
+import dataCleaning
+import forecastMetrics
+
+DEPENDENT_VARIABLE_COL = 0
+MAX_NOISE_LEVEL = 0.5
+NUM_NOISE_LEVELS = 50
+NUM_SEEDS = 3
+MAX_BATCH_SAMPLES = 65536 # model inputs (noisy input x issue day) forecast at once
+PREDICT_BATCH_SIZE = 4096
+
+
+def getNoiseLevels(numLevels=NUM_NOISE_LEVELS, maxLevel=MAX_NOISE_LEVEL):
+    return np.linspace(maxLevel/numLevels, maxLevel, numLevels)
+
+def getForecastSources(forecastColumns):
+    # {source: column index} of the source production forecasts, avg_<source>_production_forecast
+    sources = {}
+    for i, col in enumerate(forecastColumns):
+        if (col.startswith("avg_") and col.endswith("_production_forecast")):
+            sources[col[len("avg_"):-len("_production_forecast")]] = i
+    return sources
+
+def getNoisyForecasts(forecast, noiseLevels, numSeeds, rng):
+    '''
+    forecast: (issue_day x hours) unscaled forecasts of one source.
+    Returns (noise level x seed x issue_day x hours) noisy forecasts.
+    '''
+    numDays, numHours = forecast.shape
+    # mean of each 24 hour block
+    blockMean = np.repeat(np.mean(np.reshape(forecast, (numDays, numHours//24, 24)), axis=2), 24, axis=1)
+    noise = rng.standard_normal((numSeeds, numDays, numHours))
+    noise = noise * blockMean
+    noisyForecast = forecast + np.reshape(noiseLevels, (-1, 1, 1, 1)) * noise
+    return np.maximum(0, noisyForecast)
+
+def getDailyMape(actual, predictions, predictionWindowHours):
+    # (batch x issue_day x lead_day) MAPE, actual: (issue_day x hours)
+    numBatch, numDays = predictions.shape[:2]
+    actual = np.broadcast_to(actual, predictions.shape)
+    dailyMape = forecastMetrics.getDailyMAPE(actual, predictions, predictionWindowHours)
+    return np.reshape(dailyMape, (numBatch, numDays, -1))
+
+def sweepSources(predict, inputs, sources, noiseLevels, numSeeds, seed=0, maxBatchSamples=MAX_BATCH_SAMPLES):
+    '''
+    MAPE degradation surface of one region.
+    inputs: see getSweepInputs. sources: {source: column index in the weather windows}.
+    Returns one row per source, noise level & lead day (noise level 0 is the forecast without noise).
+    '''
+    weatherWindows, weatherScaler = inputs["weatherWindows"], inputs["weatherScaler"]
+    ciMin, ciMax = inputs["ciMin"], inputs["ciMax"]
+    numDays = weatherWindows.shape[0]
+    predictionWindowHours = inputs["predictionWindowHours"]
+    forecastArgs = (inputs["history"], inputs["testData"])
+    windowArgs = (inputs["trainWindowHours"], predictionWindowHours, inputs["slidingWindowLen"])
+    rows = np.arange(numDays)[:, np.newaxis]*inputs["slidingWindowLen"] + np.arange(predictionWindowHours)
+    actual = common.inverseDataScaling(inputs["testData"][rows, DEPENDENT_VARIABLE_COL], ciMax, ciMin)
+
+    scaledWindows = weatherScaler.transform(np.array(weatherWindows[np.newaxis], dtype=np.float64))
+    predictions = common.getBatchedDayAheadForecasts(predict, *forecastArgs, scaledWindows, *windowArgs)
+    cleanMape = getDailyMape(actual, common.inverseDataScaling(predictions, ciMax, ciMin),
+                             predictionWindowHours)[0]
+    cleanStatistics = forecastMetrics.getDaywiseStatistics(cleanMape)
+
+    rng = np.random.default_rng(seed)
+    tables = []
+    for source, col in sources.items():
+        startTime = time.time()
+        noisyForecasts = getNoisyForecasts(weatherWindows[:, :predictionWindowHours, col], noiseLevels,
+                                           numSeeds, rng)
+        noisyForecasts = np.reshape(noisyForecasts, (-1,)+noisyForecasts.shape[2:])
+        dailyMape = np.zeros((len(noisyForecasts), numDays, predictionWindowHours//24))
+        batchSize = max(1, maxBatchSamples//numDays)
+        for start in range(0, len(noisyForecasts), batchSize):
+            batch = noisyForecasts[start:start+batchSize]
+            windows = np.repeat(weatherWindows[np.newaxis], len(batch), axis=0)
+            windows[:, :, :predictionWindowHours, col] = batch
+            windows = weatherScaler.transform(windows)
+            predictions = common.getBatchedDayAheadForecasts(predict, *forecastArgs, windows, *windowArgs)
+            dailyMape[start:start+len(batch)] = getDailyMape(actual,
+                        common.inverseDataScaling(predictions, ciMax, ciMin), predictionWindowHours)
+        # (noise level x seed x lead_day) statistics over issue days
+        statistics = forecastMetrics.getDaywiseStatistics(dailyMape)
+        statistics = {name: np.reshape(values, (len(noiseLevels), numSeeds, -1))
+                        for name, values in statistics.items()}
+        tables.append(getSweepTable(source, noiseLevels, statistics, cleanStatistics))
+        print(source, ": ", len(noisyForecasts), " noisy inputs forecast in ", round(time.time()-startTime, 3), "s")
+    return pd.concat(tables, ignore_index=True)
+
+def getSweepTable(source, noiseLevels, statistics, cleanStatistics):
+    # one row per noise level & lead day, statistics averaged over seeds
+    numLevels, _, numLeadDays = statistics["mean"].shape
+    table = pd.DataFrame()
+    table["source"] = [source] * ((numLevels+1)*numLeadDays)
+    table["noise_level"] = np.repeat(np.concatenate([[0], noiseLevels]), numLeadDays)
+    table["lead_day"] = np.tile(np.arange(1, numLeadDays+1), numLevels+1)
+    for name, values in statistics.items():
+        table[name+"_mape"] = np.round(np.concatenate([cleanStatistics[name], np.mean(values, axis=1).ravel()]), 3)
+    table["mean_mape_std"] = np.round(np.concatenate([np.zeros(numLeadDays), np.std(statistics["mean"], axis=1).ravel()]), 3)
+    table["mape_degradation"] = np.round(table["mean_mape"] - np.tile(cleanStatistics["mean"], numLevels+1), 3)
+    return table
+
+def getScalers(modelLocation, region, trainData, wTrainData):
+    scalerFileName, weatherScalerFileName = common.getScalerFileNames(modelLocation, region)
+    if (os.path.exists(scalerFileName) and os.path.exists(weatherScalerFileName)):
+        return common.Scaler.load(scalerFileName), common.Scaler.load(weatherScalerFileName)
+    print("No saved scalers for ", region, ". Scalers will be fitted on the training data.")
+    return (common.Scaler().fit(dataCleaning.fillMissingData(trainData.copy())),
+            common.Scaler().fit(dataCleaning.fillMissingData(wTrainData.copy())))
+
+def getSweepInputs(secondTierConfig, region, cefType, modelLocation):
+    '''
+    Test period inputs of a region, prepared as in secondTierForecasts.runSecondTier.
+    Weather windows are not scaled, so that noise can be added to the forecasts first.
+    '''
+    regionConfig = secondTierConfig[region]
+    inFileName = regionConfig["LIFECYCLE_CEF_IN_FILE_NAME" if cefType == "-l" else "DIRECT_CEF_IN_FILE_NAME"]
+    numTestDays, numValDays = secondTierConfig["NUM_TEST_DAYS"], secondTierConfig["NUM_VAL_DAYS"]
+    trainWindowHours = secondTierConfig["TRAINING_WINDOW_HOURS"]
+    predictionWindowHours = secondTierConfig["PREDICTION_WINDOW_HOURS"]
+    maxPredictionWindowHours = secondTierConfig["MAX_PREDICTION_WINDOW_HOURS"]
+    slidingWindowLen = secondTierConfig["MODEL_SLIDING_WINDOW_LEN"]
+    bufferHours = predictionWindowHours - 24
+    numFeatures, startCol = regionConfig["NUM_FEATURES"], regionConfig["START_COL"]
+    numForecastFeatures = regionConfig["NUM_FORECAST_FEATURES"]
+
+    dataset = pd.read_csv(inFileName, header=0, parse_dates=["UTC time"], index_col=["UTC time"])
+    forecastDataset = pd.read_csv(regionConfig["FORECAST_IN_FILE_NAME"], header=0,
+                                  parse_dates=["UTC time"], index_col=["UTC time"])
+    for col in dataset.columns.values[startCol:]:
+        dataset[col] = dataset[col].astype(np.float64)
+    dataset = calendarFeatures.addDateTimeFeatures(dataset, dataset.index.values, startCol)
+
+    trainData, valData, testData, _ = common.splitDataset(dataset.values, numTestDays+bufferHours//24,
+                                            numValDays, maxPredictionWindowHours-predictionWindowHours)
+    trainData = trainData[:, startCol:startCol+numFeatures].astype(np.float64)
+    valData = dataCleaning.fillMissingData(valData[:, startCol:startCol+numFeatures].astype(np.float64))
+    testData = dataCleaning.fillMissingData(testData[:, startCol:startCol+numFeatures].astype(np.float64))
+    wTrainData, wValData, wTestData, _ = common.splitWeatherDataset(forecastDataset.values, numTestDays,
+                                            numValDays, maxPredictionWindowHours)
+    wTrainData = wTrainData[:, :numForecastFeatures].astype(np.float64)
+    wValData = dataCleaning.fillMissingData(wValData[:, :numForecastFeatures].astype(np.float64))
+    wTestData = dataCleaning.fillMissingData(wTestData[:, :numForecastFeatures].astype(np.float64))
+
+    dataScaler, weatherScaler = getScalers(modelLocation, region, trainData, wTrainData)
+    dataScaler.transform(valData)
+    dataScaler.transform(testData)
+    numDays = len(testData)//24 - bufferHours//24
+    return {"history": valData[-trainWindowHours:], "testData": testData,
+            "weatherWindows": common.getWeatherWindows(wValData, wTestData, numDays, maxPredictionWindowHours),
+            "weatherScaler": weatherScaler, "forecastColumns": forecastDataset.columns.values[:numForecastFeatures],
+            "ciMin": dataScaler.ftMin[DEPENDENT_VARIABLE_COL], "ciMax": dataScaler.ftMax[DEPENDENT_VARIABLE_COL],
+            "trainWindowHours": trainWindowHours, "predictionWindowHours": predictionWindowHours,
+            "slidingWindowLen": slidingWindowLen}
+
+def runNoiseSweep(configFileName, cefType, outFileName, noiseLevels, numSeeds, sources=None, seed=0):
+    """Noise robustness sweep of the saved model of each region in the config file"""
+    with open(configFileName, "r") as configFile:
+        secondTierConfig = json.load(configFile)
+    if (cefType == "-l"):
+        modelLocation = secondTierConfig["LIFECYCLE_SAVED_MODEL_LOCATION"]
+    else:
+        modelLocation = secondTierConfig["DIRECT_SAVED_MODEL_LOCATION"]
+    tables = []
+    for region in secondTierConfig["REGION"]:
+        print("Noise sweep for region: ", region)
+        startTime = time.time()
+        inputs = getSweepInputs(secondTierConfig, region, cefType, modelLocation)
+        model = load_model(os.path.join(modelLocation, region+".h5"))
+        regionSources = getForecastSources(inputs["forecastColumns"])
+        if (sources is not None):
+            regionSources = {source: col for source, col in regionSources.items() if source in sources}
+        print(len(regionSources), " sources x ", len(noiseLevels), " noise levels x ", numSeeds, " seeds")
+        predict = lambda x: model.predict(x, batch_size=PREDICT_BATCH_SIZE, verbose=0)
+        table = sweepSources(predict, inputs, regionSources, noiseLevels, numSeeds, seed)
+        table.insert(0, "region", region)
+        tables.append(table)
+        print("####################", region, " done in ", round(time.time()-startTime, 3), "s ####################")
+    table = pd.concat(tables, ignore_index=True)
+    table.to_csv(outFileName, index=False)
+    print("Sweep results written to ", outFileName)
+    return table
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 4):
+        print("Usage: python3 noiseSweep.py <configFileName> <-l/-d> <out_file.csv> [--levels n] [--max-level x] "
+              "[--seeds n] [--sources coal,nat_gas]")
+        print("The saved second tier model of each region in the config file is used.")
+        print("Noise levels are n levels up to x (default: ", NUM_NOISE_LEVELS, " levels up to ", MAX_NOISE_LEVEL, ").")
+        exit(0)
+    args = sys.argv[4:]
+    options = {"--levels": NUM_NOISE_LEVELS, "--max-level": MAX_NOISE_LEVEL, "--seeds": NUM_SEEDS, "--sources": None}
+    for option in options:
+        if (option in args):
+            idx = args.index(option)
+            options[option] = args[idx+1]
+            args = args[:idx] + args[idx+2:]
+    noiseLevels = getNoiseLevels(int(options["--levels"]), float(options["--max-level"]))
+    sources = None if options["--sources"] is None else options["--sources"].split(",")
+    table = runNoiseSweep(sys.argv[1], sys.argv[2], sys.argv[3], noiseLevels, int(options["--seeds"]), sources)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(table[table["lead_day"] == 1].to_string(index=False))
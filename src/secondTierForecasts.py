@@ -5,6 +5,7 @@ Multivariate multi-step time series forecasting
 
 import csv
 import math
+import os
 import sys
 from datetime import datetime as dt
 from datetime import timezone as tz
@@ -26,7 +27,10 @@ from keras.layers import RepeatVector
 
 import json5 as json
 
+import calendarFeatures
 import common
+import dataCleaning
+import forecastMetrics
 import utility
 
 
@@ -121,13 +125,11 @@ def runSecondTier(configFileName, cefType, loadFromSavedModel):
         print("WeatherValData shape: ", wValData.shape) # (days x hour) x features
         print("WeatherTestData shape: ", wTestData.shape) # (days x hour) x features
 
-        trainData = fillMissingData(trainData)
-        valData = fillMissingData(valData)
-        testData = fillMissingData(testData)
-
-        wTrainData = fillMissingData(wTrainData)
-        wValData = fillMissingData(wValData)
-        wTestData = fillMissingData(wTestData)
+        # training data is filled only if the scalers are fitted
+        valData = dataCleaning.fillMissingData(valData)
+        testData = dataCleaning.fillMissingData(testData)
+        wValData = dataCleaning.fillMissingData(wValData)
+        wTestData = dataCleaning.fillMissingData(wTestData)
 
         print("***** Dataset split done *****")
 
@@ -137,16 +139,23 @@ def runSecondTier(configFileName, cefType, loadFromSavedModel):
         print("Features: ", featureList)
 
         print("Scaling data...")
-        # unscaledTestData = np.zeros(testData.shape[0])
-        unscaledTrainCarbonIntensity = np.zeros(trainData.shape[0])
-        # for i in range(testData.shape[0]):
-        #     unscaledTestData[i] = testData[i, DEPENDENT_VARIABLE_COL]
-        for i in range(trainData.shape[0]):
-            unscaledTrainCarbonIntensity[i] = trainData[i, DEPENDENT_VARIABLE_COL]
-        trainData, valData, testData, ftMin, ftMax = common.scaleDataset(trainData, valData, testData)
-        print(trainData.shape, valData.shape, testData.shape)
-        wTrainData, wValData, wTestData, wFtMin, wFtMax = common.scaleDataset(wTrainData, wValData, wTestData)
-        print(wTrainData.shape, wValData.shape, wTestData.shape)
+        dataScaler, weatherScaler = None, None
+        if (loadFromSavedModel is True):
+            dataScaler, weatherScaler = loadScalers(SAVED_MODEL_LOCATION, region)
+        if (dataScaler is None):
+            trainData = dataCleaning.fillMissingData(trainData)
+            wTrainData = dataCleaning.fillMissingData(wTrainData)
+            dataScaler = common.Scaler().fit(trainData)
+            weatherScaler = common.Scaler().fit(wTrainData)
+            dataScaler.transform(trainData)
+            weatherScaler.transform(wTrainData)
+            saveScalers(SAVED_MODEL_LOCATION if loadFromSavedModel is True else "", region,
+                        dataScaler, weatherScaler)
+
+        _, valData, testData, ftMin, ftMax = common.scaleDataset(None, valData, testData, dataScaler)
+        print(valData.shape, testData.shape)
+        _, wValData, wTestData, wFtMin, wFtMax = common.scaleDataset(None, wValData, wTestData, weatherScaler)
+        print(wValData.shape, wTestData.shape)
         print("***** Data scaling done *****")
 
         ######################## START #####################
@@ -155,8 +164,11 @@ def runSecondTier(configFileName, cefType, loadFromSavedModel):
         for exptNum in range(NUMBER_OF_EXPERIMENTS):
             print("Iteration: ", exptNum)
             regionDailyMape = {}
-            bestModel, numFeaturesInTraining = trainingandValidationPhase(region, trainData, wTrainData, 
-                                            valData, wValData, secondTierConfig, exptNum, loadFromSavedModel)            
+            if (loadFromSavedModel is True):
+                bestModel, numFeaturesInTraining = loadSavedModel(region)
+            else:
+                bestModel, numFeaturesInTraining = trainingandValidationPhase(region, trainData, wTrainData, 
+                                            valData, wValData, secondTierConfig, exptNum)
             history = valData[-TRAINING_WINDOW_HOURS:, :]
             weatherData = None
             weatherData = wValData[-MAX_PREDICTION_WINDOW_HOURS:, :]
@@ -245,88 +257,18 @@ def initialize(inFileName, forecastInFileName, startCol):
         print(col, dataset[col].dtype)
 
     print("\nAdding features related to date & time...")
-    modifiedDataset = addDateTimeFeatures(dataset, dateTime, startCol)
+    modifiedDataset = calendarFeatures.addDateTimeFeatures(dataset, dateTime, startCol)
     dataset = modifiedDataset
     print("Features related to date & time added")
 
     return dataset, forecastDataset, dateTime
 
-# Date time feature engineering
-def addDateTimeFeatures(dataset, dateTime, startCol):
-    global DEPENDENT_VARIABLE_COL
-    dates = []
-    hourList = []
-    hourSin, hourCos = [], []
-    monthList = []
-    monthSin, monthCos = [], []
-    weekendList = []
-    columns = dataset.columns
-    secInDay = 24 * 60 * 60 # Seconds in day 
-    secInYear = year = (365.25) * secInDay # Seconds in year 
-
-    day = pd.to_datetime(dateTime[0])
-    isWeekend = 0
-    zero = 0
-    one = 0
-    for i in range(0, len(dateTime)):
-        day = pd.to_datetime(dateTime[i])
-        dates.append(day)
-        hourList.append(day.hour)
-        hourSin.append(np.sin(day.hour * (2 * np.pi / 24)))
-        hourCos.append(np.cos(day.hour * (2 * np.pi / 24)))
-        monthList.append(day.month)
-        monthSin.append(np.sin(day.timestamp() * (2 * np.pi / secInYear)))
-        monthCos.append(np.cos(day.timestamp() * (2 * np.pi / secInYear)))
-        if (day.weekday() < 5):
-            isWeekend = 0
-            zero +=1
-        else:
-            isWeekend = 1
-            one +=1
-        weekendList.append(isWeekend)        
-    loc = startCol+1
-    print(zero, one)
-    # hour of day feature
-    dataset.insert(loc=loc, column="hour_sin", value=hourSin)
-    dataset.insert(loc=loc+1, column="hour_cos", value=hourCos)
-    # month of year feature
-    dataset.insert(loc=loc+2, column="month_sin", value=monthSin)
-    dataset.insert(loc=loc+3, column="month_cos", value=monthCos)
-    # is weekend feature
-    dataset.insert(loc=loc+4, column="weekend", value=weekendList)
-
-    # print(dataset.columns)
-    print(dataset.head())
-    return dataset
-
 # convert history into inputs and outputs
 def manipulateTrainingDataShape(data, trainWindowHours, labelWindowHours, weatherData = None): 
     print("Data shape: ", data.shape)
     global MAX_PREDICTION_WINDOW_HOURS
-    global PREDICTION_WINDOW_HOURS
-    X, y, weatherX = list(), list(), list()
-    weatherIdx = 0
-    hourIdx = 0
-    # step over the entire history one time step at a time
-    for i in range(len(data)-(trainWindowHours+labelWindowHours)+1):
-        # define the end of the input sequence
-        trainWindow = i + trainWindowHours
-        labelWindow = trainWindow + labelWindowHours
-        xInput = data[i:trainWindow, :]
-        # xInput = xInput.reshape((len(xInput), 1))
-        X.append(xInput)
-        weatherX.append(weatherData[weatherIdx:weatherIdx+trainWindowHours])
-        weatherIdx +=1
-        hourIdx +=1
-        if(hourIdx ==24):
-            hourIdx = 0
-            weatherIdx += (MAX_PREDICTION_WINDOW_HOURS-24)
-        y.append(data[trainWindow:labelWindow, DEPENDENT_VARIABLE_COL])
-    X = np.array(X, dtype=np.float64)
-    y = np.array(y, dtype=np.float64)
-    weatherX = np.array(weatherX, dtype=np.float64)
-    X = np.append(X, weatherX, axis=2)
-    return X, y
+    return common.getTrainingWindows(data, trainWindowHours, labelWindowHours, DEPENDENT_VARIABLE_COL,
+                                     weatherData, MAX_PREDICTION_WINDOW_HOURS)
 
 def manipulateTestDataShape(data, slidingWindowLen, predictionWindowHours, isDates=False): 
     X = list()
@@ -342,9 +284,7 @@ def manipulateTestDataShape(data, slidingWindowLen, predictionWindowHours, isDat
     return X
 
 # train the model
-def trainModel(trainX, trainY, valX, valY, hyperParams, iteration, region, loadFromSavedModel):
-    global SAVED_MODEL_LOCATION
-
+def trainModel(trainX, trainY, valX, valY, hyperParams, iteration, region):
     # define parameters
     print("Training...")
     verbose = 0
@@ -353,11 +293,6 @@ def trainModel(trainX, trainY, valX, valY, hyperParams, iteration, region, loadF
     n_timesteps, n_features, n_outputs = trainX.shape[1], trainX.shape[2], trainY.shape[1]
     print("Timesteps: ", n_timesteps, "No. of features: ", n_features, "No. of outputs: ", n_outputs)
 
-    if (loadFromSavedModel is True):
-        print("-s parameter specified. Loading model from ", SAVED_MODEL_LOCATION+region+".h5")
-        bestModel = load_model(SAVED_MODEL_LOCATION+"/"+region+".h5")
-        return bestModel, n_features
-
     epochs = hyperParams["epoch"]    
     batchSize = hyperParams["batchsize"]
     activationFunc = hyperParams["actv"]
@@ -569,39 +504,13 @@ def getScores(scaledActual, scaledPredicted, unscaledActual, unscaledPredicted,
     global PREDICTION_WINDOW_HOURS
     print("Actual data shape, Predicted data shape: ", scaledActual.shape, scaledPredicted.shape)
 
-    mse = tf.keras.losses.MeanSquaredError()
-    rmseScore = round(math.sqrt(mse(scaledActual, scaledPredicted).numpy()), 6)
-
-    unscaledRMSEScore = round(math.sqrt(mse(unscaledActual, unscaledPredicted).numpy()), 6)
+    rmseScore = forecastMetrics.getRMSE(scaledActual, scaledPredicted)
+    unscaledRMSEScore = forecastMetrics.getRMSE(unscaledActual, unscaledPredicted)
     print("***** Unscaled RMSE: ", unscaledRMSEScore)
 
-    mape = tf.keras.losses.MeanAbsolutePercentageError()
-
-    rows, cols = len(unscaledActual)//PREDICTION_WINDOW_HOURS, PREDICTION_WINDOW_HOURS//24
-    dailyMapeScore = np.zeros((rows, cols))
-
-    # for i in range(len(unscaledActual)):
-    #     print(unscaledActual[i], unscaledPredicted[i])
-
-    outlierDays = {}
-    for i in range(0, len(unscaledActual), PREDICTION_WINDOW_HOURS):
-        for j in range(0, PREDICTION_WINDOW_HOURS, 24):
-            mapeTensor =  mape(unscaledActual[i+j:i+j+24], unscaledPredicted[i+j:i+j+24])
-            mapeScore = mapeTensor.numpy()
-            # print("Day: ", dates[i], "MAPE: ", mapeScore)
-            # if(mapeScore>15):
-            #     # for j in range(24):
-            #     #     print(unscaledActual[i+j], unscaledPredicted[i+j])
-            #     outlierDays[dates[i]] = mapeScore
-            dailyMapeScore[i//PREDICTION_WINDOW_HOURS][j//24] = mapeScore
-    
-    # outlierDays = sorted(outlierDays.items(), key=lambda x: x[1], reverse=True)
-    # for k,v in outlierDays: # Printing outlier days
-    #     print(k,": ", v)
-
-
-    mapeTensor =  mape(unscaledActual, unscaledPredicted)
-    mapeScore = mapeTensor.numpy()
+    # (issue day x lead day) MAPE of each 24 hour block
+    dailyMapeScore = forecastMetrics.getDailyMAPE(unscaledActual, unscaledPredicted, PREDICTION_WINDOW_HOURS)
+    mapeScore = forecastMetrics.getMAPE(unscaledActual, unscaledPredicted)
 
     return rmseScore, mapeScore, dailyMapeScore
 
@@ -625,15 +534,8 @@ def getHyperParams(secondTierConfig):
 
     return hyperParams
 
-def fillMissingData(data): # If some data is missing (NaN), use the same value as that of the previous row
-    for i in range(data.shape[0]):
-        for j in range(data.shape[1]):
-            if(np.isnan(data[i, j])):
-                data[i, j] = data[i-1, j]
-    return data
-
 def trainingandValidationPhase(region, trainData, wTrainData, valData, wValData, secondTierConfig, 
-                               exptNum, loadFromSavedModel):
+                               exptNum):
     global TRAINING_WINDOW_HOURS
 
     print("\nManipulating training data...")
@@ -645,10 +547,30 @@ def trainingandValidationPhase(region, trainData, wTrainData, valData, wValData,
 
     hyperParams = getHyperParams(secondTierConfig)
     print("\n[BESTMODEL] Starting training...")
-    bestTrainedModel, numFeatures = trainModel(X, y, valX, valY, hyperParams, exptNum, region, loadFromSavedModel)
+    bestTrainedModel, numFeatures = trainModel(X, y, valX, valY, hyperParams, exptNum, region)
     print("***** Training done *****")
     return bestTrainedModel, numFeatures
 
+def loadSavedModel(region):
+    global SAVED_MODEL_LOCATION
+    print("-s parameter specified. Loading model from ", SAVED_MODEL_LOCATION+region+".h5")
+    bestModel = load_model(SAVED_MODEL_LOCATION+"/"+region+".h5")
+    return bestModel, bestModel.input_shape[-1]
+
+def loadScalers(modelLocation, region):
+    scalerFileName, weatherScalerFileName = common.getScalerFileNames(modelLocation, region)
+    if (not os.path.exists(scalerFileName) or not os.path.exists(weatherScalerFileName)):
+        print("No saved scalers for ", region, ". Scalers will be fitted on the training data.")
+        return None, None
+    print("Loading scalers from ", scalerFileName, weatherScalerFileName)
+    return common.Scaler.load(scalerFileName), common.Scaler.load(weatherScalerFileName)
+
+def saveScalers(modelLocation, region, dataScaler, weatherScaler):
+    scalerFileName, weatherScalerFileName = common.getScalerFileNames(modelLocation, region)
+    dataScaler.save(scalerFileName)
+    weatherScaler.save(weatherScalerFileName)
+    print("Scalers saved to ", scalerFileName, weatherScalerFileName)
+
 def getUnscaledForecastsAndForecastAccuracy(testData, testDates, predictedData, ftMin, ftMax):
     global MODEL_SLIDING_WINDOW_LEN
     global PREDICTION_WINDOW_HOURS
@@ -0,0 +1,176 @@
+'''
+Statistical diagnostics of the hourly series of all regions: carbon intensity & the production of
+each source, from data/<region>/<region>_<direct/lifecycle>_emissions.csv.
+
+For every region x series x period (each calendar year, and all hours), the following are calculated:
+    ADF test         - statistic, p-value, lags used & critical values (statsmodels.adfuller, AIC lags)
+    ACF/PACF         - at REPORT_LAGS hours (1 hour, 1 day, 1 week)
+    seasonality      - strength of the daily & weekly seasonality, max(0, 1 - Var(R)/Var(S+R)),
+                       with the seasonal (S) & remainder (R) components of an STL decomposition
+                       (of the hourly values for daily seasonality, of daily means for weekly)
+Series are run in parallel in a process pool. Results are cached by the hash of the series values
+(and the diagnostics settings), so after a data refresh only the series that changed are recomputed.
+Series with the same values (e.g., source production in the direct & lifecycle files) are run once.
+'''
+
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.seasonal import STL
+from statsmodels.tsa.stattools import acf, adfuller, pacf
+
+import dataCleaning
+from config_manager import Config
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SRC_DIR, "..", "data")
+CACHE_FILE_NAME = os.path.join(DATA_DIR, "diagnostics_cache.json")
+EMISSION_FACTOR_TYPES = ["direct", "lifecycle"]
+REPORT_LAGS = [1, 24, 168]
+SEASONAL_PERIODS = {"daily": (1, 24), "weekly": (24, 7)} # (hours aggregated, period)
+DIAGNOSTICS_VERSION = "1" # change to invalidate the cache when the diagnostics change
+NON_SERIES_COLUMNS = ["UTC time", "Unnamed: 0"]
+
+
+def getADF(values):
+    result = adfuller(values, autolag="AIC")
+    adf = {"adf_stat": result[0], "adf_pvalue": result[1], "adf_lags": int(result[2]), "adf_nobs": int(result[3])}
+    for key, value in result[4].items():
+        adf["adf_critical_"+key] = value
+    return adf
+
+def getSeasonalityStrength(values, period):
+    decomposition = STL(values, period=period).fit()
+    remainderVar = np.var(decomposition.resid)
+    return max(0.0, 1 - remainderVar / np.var(decomposition.seasonal + decomposition.resid))
+
+def runDiagnostics(values, reportLags=REPORT_LAGS, seasonalPeriods=SEASONAL_PERIODS):
+    """All diagnostics of one hourly series, as {name: value}"""
+    values = np.asarray(values, dtype=np.float64)
+    if (np.all(np.isnan(values))):
+        return {"error": "no data"}
+    if (np.nanmax(values) == np.nanmin(values)):
+        return {"error": "constant series"}
+    values = dataCleaning.fillMissingData(values.reshape(-1, 1)).ravel()
+    diagnostics = getADF(values)
+    maxLag = min(max(reportLags), len(values)//2 - 1)
+    acfValues = acf(values, nlags=maxLag, fft=True)
+    pacfValues = pacf(values, nlags=maxLag)
+    for lag in reportLags:
+        diagnostics["acf_"+str(lag)] = acfValues[lag] if lag <= maxLag else np.nan
+        diagnostics["pacf_"+str(lag)] = pacfValues[lag] if lag <= maxLag else np.nan
+    for name, (aggregationHours, period) in seasonalPeriods.items():
+        numSteps = len(values)//aggregationHours
+        if (numSteps >= 2*period):
+            aggregated = np.mean(np.reshape(values[:numSteps*aggregationHours], (numSteps, aggregationHours)), axis=1)
+            diagnostics[name+"_seasonality_strength"] = getSeasonalityStrength(aggregated, period)
+        else:
+            diagnostics[name+"_seasonality_strength"] = np.nan
+    return {key: float(value) if isinstance(value, (float, np.floating)) else value
+                for key, value in diagnostics.items()}
+
+def runCachedDiagnostics(job):
+    key, values = job
+    try:
+        return key, runDiagnostics(values)
+    except Exception as e:
+        return key, {"error": str(e)}
+
+def getSeriesKey(values):
+    # content hash of the series, with the diagnostics settings
+    sha = hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    sha.update(json.dumps([DIAGNOSTICS_VERSION, REPORT_LAGS, SEASONAL_PERIODS]).encode())
+    return sha.hexdigest()
+
+def getPeriods(utcTime):
+    # [(period name, mask of the hours in the period)]: each calendar year, and all hours
+    years = utcTime.year.values
+    periods = [(str(year), years == year) for year in np.unique(years)]
+    if (len(periods) > 1):
+        periods.append(("all", np.ones(len(utcTime), dtype=bool)))
+    return periods
+
+def getRegionSeries(region, emissionFactorTypes=EMISSION_FACTOR_TYPES, dataDir=DATA_DIR):
+    # [(series info, values)] of each series & period of a region
+    seriesList = []
+    for emissionFactorType in emissionFactorTypes:
+        inFileName = os.path.join(dataDir, region, region+"_"+emissionFactorType+"_emissions.csv")
+        if (not os.path.exists(inFileName)):
+            continue
+        dataset = pd.read_csv(inFileName, header=0)
+        utcTime = pd.DatetimeIndex(pd.to_datetime(dataset["UTC time"].values))
+        periods = getPeriods(utcTime)
+        for col in dataset.columns:
+            if (col in NON_SERIES_COLUMNS):
+                continue
+            values = dataset[col].to_numpy(dtype=np.float64)
+            for period, mask in periods:
+                info = {"region": region, "emission_factors": emissionFactorType, "series": col, "period": period,
+                        "start": str(utcTime[mask][0]), "end": str(utcTime[mask][-1]), "num_hours": int(np.sum(mask))}
+                seriesList.append((info, values[mask]))
+    return seriesList
+
+def readCache(cacheFileName):
+    if (cacheFileName is None or not os.path.exists(cacheFileName)):
+        return {}
+    with open(cacheFileName, "r") as cacheFile:
+        return json.load(cacheFile)
+
+def writeCache(cacheFileName, cache):
+    if (cacheFileName is None):
+        return
+    with open(cacheFileName+".tmp", "w") as cacheFile:
+        json.dump(cache, cacheFile)
+    os.replace(cacheFileName+".tmp", cacheFileName)
+
+def runAllDiagnostics(regions, outFileName=None, emissionFactorTypes=EMISSION_FACTOR_TYPES, numWorkers=None,
+                      cacheFileName=CACHE_FILE_NAME, dataDir=DATA_DIR):
+    """Diagnostics of all series of the given regions, computing only the series not in the cache"""
+    startTime = time.time()
+    seriesList = []
+    for region in regions:
+        seriesList.extend(getRegionSeries(region, emissionFactorTypes, dataDir))
+    keys = [getSeriesKey(values) for _, values in seriesList]
+    cache = readCache(cacheFileName)
+    jobs = {}
+    for key, (_, values) in zip(keys, seriesList):
+        if (key not in cache and key not in jobs):
+            jobs[key] = values
+    print(len(seriesList), " series, ", len(jobs), " to compute (", len(seriesList)-len(jobs), " cached/duplicate)")
+    if (len(jobs) > 0):
+        with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            for key, diagnostics in executor.map(runCachedDiagnostics, jobs.items()):
+                cache[key] = diagnostics
+        writeCache(cacheFileName, cache)
+    table = pd.DataFrame([dict(info, hash=key, **cache[key]) for key, (info, _) in zip(keys, seriesList)])
+    if (outFileName is not None):
+        table.to_csv(outFileName, index=False)
+        print("Diagnostics written to ", outFileName)
+    print("Done in ", round(time.time() - startTime, 3), "s")
+    return table
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 2):
+        print("Usage: python3 timeSeriesDiagnostics.py <out_file.csv> [region ...] [--workers n]")
+        print("If no region is given, all regions under data/ are used.")
+        exit(0)
+    args = sys.argv[2:]
+    numWorkers = None
+    if ("--workers" in args):
+        idx = args.index("--workers")
+        numWorkers = int(args[idx+1])
+        args = args[:idx] + args[idx+2:]
+    regions = args
+    if (len(regions) == 0):
+        regions = Config().get_regions()
+    table = runAllDiagnostics(regions, sys.argv[1], numWorkers=numWorkers)
+    columns = ["region", "emission_factors", "series", "period", "adf_pvalue", "acf_24",
+               "daily_seasonality_strength", "weekly_seasonality_strength"]
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(table[[col for col in columns if col in table.columns]].to_string(index=False))
@@ -0,0 +1,59 @@
+'''
+Local timezone of each region, and vectorized conversion of UTC times to local time.
+
+Times in the datasets are in UTC, as naive timestamps (or strings). They are converted to local time
+for the whole array at once (tz_localize/tz_convert), instead of one timestamp at a time with pytz.
+Daily & hourly aggregates in local time are calculated with one groupby over the local date/hour.
+'''
+
+import numpy as np
+import pandas as pd
+
+# same as LOCAL_TIMEZONE in firstTierConfig.json & secondTierConfig.json
+# (AUS_SA is only used by weather/cleanWeatherData.py)
+REGION_TIMEZONES = {"AUS_QLD": "UTC", "AUS_SA": "Australia/Adelaide", "BPAT": "US/Pacific",
+                    "CISO": "US/Pacific", "DE": "CET", "DK-DK2": "CET", "ERCO": "US/Central", "ES": "CET",
+                    "FPL": "US/Eastern", "GB": "UTC", "ISNE": "US/Eastern", "MISO": "US/Eastern", "NL": "CET",
+                    "NYIS": "US/Eastern", "NYISO": "US/Eastern", "PJM": "US/Eastern", "PL": "CET",
+                    "SE": "CET", "SOCO": "US/Central", "SWPP": "US/Central"}
+AGGREGATION_LEVELS = ["date", "hour", "date_hour"]
+
+
+def getRegionTimeZone(region):
+    if (region not in REGION_TIMEZONES):
+        raise ValueError(f"Unknown timezone for region: {region}. Known regions: {sorted(REGION_TIMEZONES)}")
+    return REGION_TIMEZONES[region]
+
+def toUTC(dateTime):
+    # DatetimeIndex in UTC. Naive times are taken as UTC.
+    dateTime = pd.DatetimeIndex(pd.to_datetime(np.asarray(dateTime).ravel()))
+    if (dateTime.tz is None):
+        return dateTime.tz_localize("UTC")
+    return dateTime.tz_convert("UTC")
+
+def toLocalTime(dateTime, localTimeZone):
+    # timezone aware DatetimeIndex in local time
+    return toUTC(dateTime).tz_convert(localTimeZone)
+
+def getLocalDayStarts(dateTime, localTimeZone, hoursPerDay=24):
+    # local time of the first hour of every block of hoursPerDay (UTC) hours, e.g., to label daily values
+    return toLocalTime(np.asarray(dateTime).ravel()[::hoursPerDay], localTimeZone)
+
+def getLocalDateAndHour(dateTime, localTimeZone):
+    # local date (datetime64[D]) & local hour (0-23) of each time
+    localTime = toLocalTime(dateTime, localTimeZone).tz_localize(None)
+    return localTime.values.astype("datetime64[D]"), localTime.hour.values
+
+def aggregateLocalTime(data, dateTime, localTimeZone, by="date", func="mean"):
+    '''
+    Aggregate hourly data (Series, DataFrame or array with one row per time) by local date, local
+    hour or both. func: any pandas groupby aggregation, e.g., "mean", "sum", "count", "max".
+    '''
+    if (by not in AGGREGATION_LEVELS):
+        raise ValueError(f"Unknown aggregation level: {by}. Available levels: {AGGREGATION_LEVELS}")
+    if (not isinstance(data, (pd.Series, pd.DataFrame))):
+        data = pd.DataFrame(np.asarray(data))
+    localDates, localHours = getLocalDateAndHour(dateTime, localTimeZone)
+    keys = {"date": pd.DatetimeIndex(localDates, name="date"), "hour": pd.Index(localHours, name="hour")}
+    groups = [keys["date"], keys["hour"]] if by == "date_hour" else [keys[by]]
+    return data.reset_index(drop=True).groupby(groups).agg(func)
@@ -1,34 +1,25 @@
 import numpy as np
 import pandas as pd
-import pytz as pytz
 from scipy.fftpack import ss_diff
-import tensorflow as tf
 import matplotlib.pyplot as plt
 import csv
 import math
 import seaborn as sns
-from statsmodels.tsa.stattools import adfuller
 import matplotlib.dates as mdates
 import sys
 
+import analyticsCube
+import carbonIntensityEngine
+import common
+import forecastMetrics
+import timeZones
+import timeSeriesDiagnostics
 
+# Emission factors used for carbon intensity from source forecasts
+FORECAST_CARBON_RATE = common.FORECAST_CARBON_RATE # one table, defined in common
 
 def inverseDataScaling(data, cmax, cmin):
-    cdiff = cmax-cmin
-    unscaledData = np.zeros_like(data)
-    for i in range(data.shape[0]):
-        unscaledData[i] = round(max(data[i]*cdiff + cmin, 0), 5)
-    return unscaledData
-
-def getDatesInLocalTimeZone(dateTime):
-    global LOCAL_TIMEZONE
-    dates = []
-    fromZone = pytz.timezone("UTC")
-    for i in range(0, len(dateTime), 24):
-        day = pd.to_datetime(dateTime[i]).replace(tzinfo=fromZone)
-        day = day.astimezone(LOCAL_TIMEZONE)
-        dates.append(day)    
-    return dates
+    return common.inverseDataScaling(data, cmax, cmin)
 
 def getAvgContributionBySource(dataset):
     contribution = {}
@@ -42,13 +33,8 @@ def getAvgContributionBySource(dataset):
 
 def getScores(scaledActual, scaledPredicted, unscaledActual, unscaledPredicted):
     print("Actual data shape, Predicted data shape: ", scaledActual.shape, scaledPredicted.shape)
-    mse = tf.keras.losses.MeanSquaredError()
-    rmseScore = round(math.sqrt(mse(scaledActual, scaledPredicted)), 6)
-
-    mape = tf.keras.losses.MeanAbsolutePercentageError()
-    mapeTensor =  mape(unscaledActual, unscaledPredicted)
-    mapeScore = mapeTensor.numpy()
-
+    rmseScore = forecastMetrics.getRMSE(scaledActual, scaledPredicted)
+    mapeScore = forecastMetrics.getMAPE(unscaledActual, unscaledPredicted)
     return rmseScore, mapeScore
 
 def writeOutFile(outFileName, data, fuel):
@@ -69,75 +55,7 @@ def showPlots():
 
 def scaleDataset(trainData, valData, testData):
     # Scaling columns to range (0, 1)
-    row, col = trainData.shape[0], trainData.shape[1]
-    ftMin, ftMax = [], []
-    for i in range(col):
-        fmax= trainData[0, i]
-        fmin = trainData[0, i]
-        for j in range(len(trainData[:, i])):
-            if(fmax < trainData[j, i]):
-                fmax = trainData[j, i]
-            if (fmin > trainData[j, i]):
-                fmin = trainData[j, i]
-        ftMin.append(fmin)
-        ftMax.append(fmax)
-        # print(fmax, fmin)
-
-    for i in range(col):
-        if((ftMax[i] - ftMin[i]) == 0):
-            continue
-        trainData[:, i] = (trainData[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
-        valData[:, i] = (valData[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
-        testData[:, i] = (testData[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
-
-    return trainData, valData, testData, ftMin, ftMax
-
-# Date time feature engineering
-def addDateTimeFeatures(dataset, dateTime, startCol):
-    dates = []
-    hourList = []
-    hourSin, hourCos = [], []
-    monthList = []
-    monthSin, monthCos = [], []
-    weekendList = []
-    columns = dataset.columns
-    secInDay = 24 * 60 * 60 # Seconds in day 
-    secInYear = year = (365.25) * secInDay # Seconds in year 
-
-    day = pd.to_datetime(dateTime[0])
-    isWeekend = 0
-    zero = 0
-    one = 0
-    for i in range(0, len(dateTime)):
-        day = pd.to_datetime(dateTime[i])
-        dates.append(day)
-        hourList.append(day.hour)
-        hourSin.append(np.sin(day.hour * (2 * np.pi / 24)))
-        hourCos.append(np.cos(day.hour * (2 * np.pi / 24)))
-        monthList.append(day.month)
-        monthSin.append(np.sin(day.timestamp() * (2 * np.pi / secInYear)))
-        monthCos.append(np.cos(day.timestamp() * (2 * np.pi / secInYear)))
-        if (day.weekday() < 5):
-            isWeekend = 0
-            zero +=1
-        else:
-            isWeekend = 1
-            one +=1
-        weekendList.append(isWeekend)        
-    loc = startCol+1
-    print(zero, one)
-    # hour of day feature
-    dataset.insert(loc=loc, column="hour_sin", value=hourSin)
-    dataset.insert(loc=loc+1, column="hour_cos", value=hourCos)
-    # month of year feature
-    dataset.insert(loc=loc+2, column="month_sin", value=monthSin)
-    dataset.insert(loc=loc+3, column="month_cos", value=monthCos)
-    # is weekend feature
-    dataset.insert(loc=loc+4, column="weekend", value=weekendList)
-
-    # print(dataset.columns)
-    print(dataset.head())
-    return dataset
+    return common.scaleDataset(trainData, valData, testData)
 
 def splitDataset(dataset, testDataSize, valDataSize): # testDataSize, valDataSize are in days
     print("No. of rows in dataset:", len(dataset))
@@ -145,14 +63,14 @@ def splitDataset(dataset, testDataSize, valDataSize): # testDataSize, valDataSiz
     numTestEntries = testDataSize * 24
     numValEntries = valDataSize * 24
     trainData, testData = dataset[:-numTestEntries], dataset[-numTestEntries:]
-    fullTrainData = np.copy(trainData)
+    fullTrainData = trainData # train + val rows (view, not a copy)
     trainData, valData = trainData[:-numValEntries], trainData[-numValEntries:]
     print("No. of rows in training set:", len(trainData))
     print("No. of rows in validation set:", len(valData))
     print("No. of rows in test set:", len(testData))
     return trainData, valData, testData, fullTrainData
 
-def showModelSummary(history, model):
+def showModelSummary(history, model, outFileName=None):
     print("Showing model summary...")
     model.summary()
     print("***** Model summary shown *****")
@@ -173,16 +91,17 @@ def showModelSummary(history, model):
     # plt.xlabel('epoch')
     # plt.ylabel("RMSE")
     # plt.title('Training loss (RMSE)')
+    if (outFileName is not None):
+        # write the figure instead of keeping it open, e.g., when training in a loop
+        fig.savefig(outFileName, bbox_inches="tight")
+        plt.close(fig)
     return
 
-def analyzeTimeSeries(dataset, trainData, unscaledCarbonIntensity, dateTime):
-    global NUM_FEATURES
-    global LOCAL_TIMEZONE
-    global START_COL
+def analyzeTimeSeries(dataset, trainData, unscaledCarbonIntensity, dateTime, startCol, numFeatures):
     # checkStationarity(dataset)
-    # showTrends(dataset, dateTime, LOCAL_TIMEZONE)
+    # showTrends(dataset, dateTime, localTimeZone)
     print("Plotting each feature distribution...")
-    features = dataset.columns.values[START_COL:START_COL+NUM_FEATURES]
+    features = dataset.columns.values[startCol:startCol+numFeatures]
     trainDataFrame = pd.DataFrame(unscaledCarbonIntensity, columns=features)
     createFeatureViolinGraph(features, trainDataFrame, dateTime)
     print("***** Feature distribution plotting done *****")
@@ -192,21 +111,23 @@ def checkStationarity(dataset):
     print(dataset.columns)
     carbon = dataset["carbon_intensity"].values
     print(len(carbon))
-    result = adfuller(carbon, autolag='AIC')
-    print(f'ADF Statistic: {result[0]}')
-    print(f'n_lags: {result[1]}')
-    print(f'p-value: {result[1]}')
-    for key, value in result[4].items():
-        print('Critial Values:')
-        print(f'   {key}, {value}')
-    return
+    # see timeSeriesDiagnostics.py for all regions & sources
+    result = timeSeriesDiagnostics.getADF(carbon)
+    print(f'ADF Statistic: {result["adf_stat"]}')
+    print(f'n_lags: {result["adf_lags"]}')
+    print(f'p-value: {result["adf_pvalue"]}')
+    print('Critial Values:')
+    for key in ["1%", "5%", "10%"]:
+        print(f'   {key}, {result["adf_critical_"+key]}')
+    return result
 
 def showTrends(dataset, dateTime, localTimeZone):
     global MONTH_INTERVAL
-    carbon = np.array(dataset["carbon_intensity"].values)
-    carbon = np.resize(carbon, (carbon.shape[0]//24, 24))
-    dailyAvgCarbon = np.mean(carbon, axis = 1)
-    dates = getDatesInLocalTimeZone(dateTime)    
+    # daily average over local days
+    cube = analyticsCube.AnalyticsCube.build(pd.DataFrame({"UTC time": dateTime,
+                    "carbon_intensity": dataset["carbon_intensity"].values}), localTimeZone)
+    dailyAvgCarbon = cube.average("carbon_intensity", by="date")
+    dates = dailyAvgCarbon.index
     
     fig, ax = plt.subplots()
     ax.plot(dates, dailyAvgCarbon)
@@ -240,43 +161,33 @@ def createFeatureViolinGraph(features, dataset, dateTime):
 
 def calcCarbonIntensity(sourceVal, energySource):
     # both variables should have sources in the same order
-    carbonRate = {"coal":908, "nat_gas":440, "nuclear":15, "oil":890, "hydro":13.5, 
-                        "solar":50, "wind":22.5, "other":0}
-    carbonIntensity = 0
-    sum = 0
-    for val in sourceVal:
-        sum += val
-    idx=0
-    for idx in range(len(energySource)):
-        source = energySource[idx]
-        sourceContribFrac = sourceVal[idx]/sum
-        carbonIntensity += (sourceContribFrac * carbonRate[source])
-    return carbonIntensity
+    sourceVal = np.array(sourceVal, dtype=np.float64).reshape(1, -1)
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(energySource, FORECAST_CARBON_RATE)
+    carbonIntensity, _, _ = carbonIntensityEngine.calculateCarbonIntensity(sourceVal, emissionFactors, 
+                                    fillMissingRows=False, decimals=None)
+    return carbonIntensity[0]
 
 def calcCarbonIntensityFromForecasts(dataset):
     carbonIntensity = [None]* len(dataset)
-    sourceForecasts = []
     energySource = []
+    forecastCols = []
     for col in dataset.columns:
         if("forecast" in col):
-            sourceForecasts.append(dataset[col].values)
+            forecastCols.append(col)
             energySource.append(col[9:]) # removing "forecast_"
             # sources are stored in the same order
-    sourceForecasts = np.array(sourceForecasts, dtype=np.float)
-    sourceForecasts = sourceForecasts.T
-    for i in range(24):
-        carbonIntensity[i] = dataset.iloc[i][0]
-    for i in range(24, len(dataset)):
-        carbonIntensity[i] = round(calcCarbonIntensity(sourceForecasts[i-24, :], energySource), 6)
+    sourceForecasts = dataset[forecastCols].to_numpy(dtype=np.float64)
+    for i in range(min(24, len(dataset))):
+        carbonIntensity[i] = dataset.iloc[i, 0]
+    # CI of hour i is calculated from the source forecasts of hour i-24
+    emissionFactors = carbonIntensityEngine.getEmissionFactorVector(energySource, FORECAST_CARBON_RATE)
+    forecastCarbonIntensity, _, _ = carbonIntensityEngine.calculateCarbonIntensity(sourceForecasts[:-24], 
+                                        emissionFactors, fillMissingRows=False, decimals=6)
+    carbonIntensity[24:] = forecastCarbonIntensity.tolist()
     return carbonIntensity
 
 def plotFeatures(X, trainDates, features, localTimeZone, dayInterval = 1, selectedFeatures=False):
-    localTrainDates = []
-    fromZone = pytz.timezone("UTC")
-    for i in range(0, len(trainDates)):
-        localTrainDay = pd.to_datetime(trainDates[i]).replace(tzinfo=fromZone)
-        localTrainDay = localTrainDay.astimezone(localTimeZone)
-        localTrainDates.append(localTrainDay)
+    localTrainDates = timeZones.toLocalTime(trainDates, localTimeZone)
     plotData = X #np.reshape(X, (X.shape[0]*X.shape[1], X.shape[2]))
     # plotData = plotData[:31*24, :] # plot features for only 1 month --> January in this case
     # localTrainDates = localTrainDates[:31*24]
@@ -345,12 +256,7 @@ def plotGraphs(actualVal, predictedVal, testDates, plotTitle, localTimeZone, day
     
     baseline = actualVal[:-1]
     baseline = np.insert(baseline, 0, actualVal[0])
-    localTestDates = []
-    fromZone = pytz.timezone("UTC")
-    for i in range(0, len(testDates)):
-        localTestDay = pd.to_datetime(testDates[i]).replace(tzinfo=fromZone)
-        localTestDay = localTestDay.astimezone(localTimeZone)
-        localTestDates.append(localTestDay)
+    localTestDates = timeZones.toLocalTime(testDates, localTimeZone)
 
     # localTestDates = []
     # for i in range(72):
@@ -474,21 +380,18 @@ def plotCDF(iso, directory):
     cdata3 = pd.read_csv(carbonCastFile3, header=None)
     # print(cdata3.head())
     # print(cdata1.shape, cdata2.shape)
-    cdata = pd.DataFrame(index=range(cdata1.shape[0]),columns=range(cdata1.shape[1]))
-    for i in range(cdata1.shape[0]):
-        for j in range(cdata1.shape[1]):
-            cdata.iloc[i, j] = cdata1.iloc[i, j] + cdata2.iloc[i, j] + cdata3.iloc[i, j] 
-    cdata = cdata.to_numpy()
-    cdata = cdata/3
+    cdata = (cdata1.to_numpy(dtype=np.float64) + cdata2.to_numpy(dtype=np.float64) + 
+             cdata3.to_numpy(dtype=np.float64))/3
     print(cdata.shape)
     print("Daywise statistics...")
+    statistics = forecastMetrics.getDaywiseStatistics(cdata[:, :4])
     for i in range(0, 4):
         print("Prediction day ", i+1, "(", (i*24), " - ", (i+1)*24, " hrs)")
-        print("Mean MAPE: ", round(np.mean(cdata[:, i]), 2))
-        print("Median MAPE: ", round(np.percentile(cdata[:, i], 50), 2))
-        print("90th percentile MAPE: ", round(np.percentile(cdata[:, i], 90), 2))
-        print("95th percentile MAPE: ", round(np.percentile(cdata[:, i], 95), 2))
-        print("99th percentile MAPE: ", round(np.percentile(cdata[:, i], 99), 2))
+        print("Mean MAPE: ", round(statistics["mean"][i], 2))
+        print("Median MAPE: ", round(statistics["p50"][i], 2))
+        print("90th percentile MAPE: ", round(statistics["p90"][i], 2))
+        print("95th percentile MAPE: ", round(statistics["p95"][i], 2))
+        print("99th percentile MAPE: ", round(statistics["p99"][i], 2))
     # print(cdata)
 
     print("Mean : ", round(np.mean(cdata), 2))
@@ -6,16 +6,16 @@ from datetime import timezone as tz
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 import pandas as pd
-import pytz as pytz
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import timeZones
 
 ISO = "AUS_SA"
-LOCAL_TIMEZONES = {"BPAT": "US/Pacific", "CISO": "US/Pacific", "ERCO": "US/Central", 
-                    "SOCO" :"US/Central", "SWPP": "US/Central", "FPL": "US/Eastern", 
-                    "ISNE": "US/Eastern", "NYIS": "US/Eastern", "PJM": "US/Eastern", 
-                    "MISO": "US/Eastern", "SE": "CET", "GB": "UTC", "DK-DK2": "CET",
-                    "DE": "CET", "PL": "CET"}
-# LOCAL_TIMEZONE = pytz.timezone(LOCAL_TIMEZONES[ISO])
+# region timezones are in timeZones.REGION_TIMEZONES
+# LOCAL_TIMEZONE = timeZones.getRegionTimeZone(ISO)
 # FILE_DIR = "../final_weather_data/"+ISO+"/" #/2019_weather_data
 FILE_DIR = "../extn/"+ISO+"/weather_data/"
 IN_FILE_NAMES = [ISO+"_AVG_WIND_SPEED.csv", ISO+"_AVG_TEMP.csv", ISO+"_AVG_DPT.csv", ISO+"_AVG_DSWRF.csv", ISO+"_AVG_PCP.csv"]
@@ -36,18 +36,8 @@ def readFile(inFileName):
     dateTime = dataset.index.values
     return dataset, dateTime
 
-def getDatesInLocalTimeZone(dateTime):
-    global LOCAL_TIMEZONE
-    dates = []
-    fromZone = pytz.timezone("UTC")
-    for i in range(0, len(dateTime)):
-        day = pd.to_datetime(dateTime[i]).replace(tzinfo=fromZone)
-        day = day.astimezone(LOCAL_TIMEZONE)
-        dates.append(day)
-    return dates
-
 def writeLocalTimeToFile(dataset, dateTime, outFileName):
-    localDates = getDatesInLocalTimeZone(dateTime)
+    localDates = timeZones.toLocalTime(dateTime, timeZones.getRegionTimeZone(ISO))
     modifiedDataset = pd.DataFrame(index=dateTime)
     modifiedDataset["local_time"] = localDates
     modifiedDataset.index.name = "datetime"
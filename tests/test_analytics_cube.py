@@ -0,0 +1,70 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analyticsCube
+
+def make_dataset(rng, numHours=24*400):
+    dataset = pd.DataFrame()
+    dataset["UTC time"] = pd.date_range("2020-01-01", periods=numHours, freq="h")
+    dataset["carbon_intensity"] = rng.uniform(100, 500, numHours)
+    dataset["coal"] = rng.uniform(0, 1000, numHours)
+    dataset["solar"] = np.where(rng.uniform(size=numHours) < 0.3, 0, rng.uniform(0, 500, numHours))
+    dataset.loc[5, "coal"] = np.nan
+    dataset.loc[7, "carbon_intensity"] = np.nan
+    return dataset
+
+class TestAnalyticsCube:
+
+    def test_averages_match_groupby(self):
+        """Test cube rollups against groupby over the hourly data in local time"""
+        rng = np.random.default_rng(0)
+        dataset = make_dataset(rng)
+        cube = analyticsCube.AnalyticsCube.build(dataset, "Europe/Berlin")
+        local = pd.DatetimeIndex(dataset["UTC time"]).tz_localize("UTC").tz_convert("Europe/Berlin")
+        hourly = dataset.copy()
+        hourly["hour"], hourly["month"], hourly["date"] = local.hour, local.month, local.tz_localize(None).normalize()
+        total = hourly[["coal", "solar"]].sum(axis=1)
+        hourly["solar_share"] = hourly["solar"] / total
+
+        q3 = hourly[hourly["month"].isin([7, 8, 9])]
+        expected = q3.groupby("hour")["solar_share"].mean()
+        assert np.allclose(cube.average("share", "hour", months=[7, 8, 9])["solar"], expected)
+        expected = hourly.groupby("month")["carbon_intensity"].mean()
+        assert np.allclose(cube.average("carbon_intensity", "month"), expected)
+        expected = hourly.groupby("date")["coal"].mean()
+        daily = cube.average("generation", "date")["coal"]
+        assert np.allclose(daily, expected) and (daily.index == expected.index).all()
+        expected = hourly[hourly["hour"].isin([18, 19])].groupby(["month", "hour"])["coal"].mean()
+        assert np.allclose(cube.average("generation", "month_hour", hours=[18, 19])["coal"], expected)
+        assert cube.average("carbon_intensity", None).iloc[0] == pytest.approx(hourly["carbon_intensity"].mean())
+
+    def test_dst_hours(self):
+        # 2:00 local time is repeated when DST ends
+        dataset = pd.DataFrame({"UTC time": pd.date_range("2021-10-30 22:00", periods=6, freq="h"),
+                                "carbon_intensity": [1.0, 2, 3, 5, 7, 11]})
+        cube = analyticsCube.AnalyticsCube.build(dataset, "Europe/Berlin")
+        assert cube.counts["carbon_intensity"].sum() == 6
+        assert cube.average("carbon_intensity", "hour", hours=[2]).iloc[0] == 4
+        assert cube.sources == []
+        with pytest.raises(ValueError):
+            cube.average("solar")
+
+    def test_cube_saved_per_dataset_version(self, tmp_path):
+        rng = np.random.default_rng(0)
+        inFileName = os.path.join(tmp_path, "XX_direct_emissions.csv")
+        make_dataset(rng, 24*40).to_csv(inFileName)
+        cube = analyticsCube.getCube("XX", localTimeZone="US/Pacific", inFileName=inFileName)
+        cubeFileName = os.path.join(tmp_path, "XX_direct_emissions_cube.npz")
+        assert os.path.exists(cubeFileName)
+        loaded = analyticsCube.getCube("XX", localTimeZone="US/Pacific", inFileName=inFileName)
+        assert loaded.version == cube.version and loaded.sources == ["coal", "solar"]
+        assert np.allclose(loaded.average("share", "hour"), cube.average("share", "hour"), equal_nan=True)
+        make_dataset(rng, 24*41).to_csv(inFileName)
+        rebuilt = analyticsCube.getCube("XX", localTimeZone="US/Pacific", inFileName=inFileName)
+        assert rebuilt.version != cube.version and len(rebuilt.dates) == 42
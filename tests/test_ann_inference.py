@@ -0,0 +1,36 @@
+import pytest
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import annInference
+
+def build_model(numFeatures, activation="relu"):
+    from keras.layers import Dense, Flatten, Input
+    from keras.models import Sequential
+    # same layers as firstTierForecasts.trainANN
+    model = Sequential([Input((24, numFeatures)), Flatten(), Dense(50, activation=activation),
+                        Dense(34, activation=activation), Dense(24)])
+    model.compile(loss="mse", optimizer="adam")
+    return model
+
+class TestAnnInference:
+
+    @pytest.mark.parametrize("activation", ["relu", "tanh"])
+    def test_numpy_forward_pass_matches_keras(self, tmp_path, activation):
+        """Test the exported weights give the forecasts of model.predict()"""
+        model = build_model(6, activation)
+        modelFileName = os.path.join(tmp_path, "best_model_ann.h5")
+        model.save(modelFileName)
+        annInference.exportWeights(modelFileName)
+        numpyModel = annInference.NumpyANN.load(os.path.join(tmp_path, "best_model_ann.npz"))
+        x = np.random.default_rng(0).uniform(0, 1, (100, 24, 6))
+        assert np.allclose(numpyModel.predict(x), model.predict(x, verbose=0), atol=1e-5)
+        assert numpyModel.activations == [activation, activation, "linear"]
+
+    def test_unknown_activation(self):
+        with pytest.raises(ValueError, match="Unknown activation"):
+            annInference.NumpyANN([np.zeros((2, 2))], [np.zeros(2)], ["swish2"])
@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import calendarFeatures
+
+class TestCalendarFeatures:
+
+    def get_dataset(self, dateTime):
+        return pd.DataFrame({"carbon_intensity": np.arange(len(dateTime), dtype=np.float64),
+                             "coal": np.ones(len(dateTime))}, index=dateTime)
+
+    def test_features_match_per_timestamp_calculation(self):
+        """Test features against a per timestamp calculation"""
+        dateTime = pd.date_range("2020-12-30 00:00", periods=24*5, freq="h").values
+        dataset = calendarFeatures.addDateTimeFeatures(self.get_dataset(dateTime), dateTime, 0)
+        assert list(dataset.columns) == ["carbon_intensity"] + calendarFeatures.CALENDAR_FEATURES + ["coal"]
+        secInYear = 365.25 * 24 * 60 * 60
+        for i, value in enumerate(dateTime):
+            day = pd.to_datetime(value)
+            assert dataset["hour_sin"].iloc[i] == np.sin(day.hour * (2 * np.pi / 24))
+            assert dataset["hour_cos"].iloc[i] == np.cos(day.hour * (2 * np.pi / 24))
+            assert dataset["month_sin"].iloc[i] == np.sin(day.timestamp() * (2 * np.pi / secInYear))
+            assert dataset["month_cos"].iloc[i] == np.cos(day.timestamp() * (2 * np.pi / secInYear))
+            assert dataset["weekend"].iloc[i] == (1 if day.weekday() >= 5 else 0)
+
+    def test_regular_periods_are_memoized(self):
+        calendarFeatures.getCalendarFeaturesForPeriod.cache_clear()
+        dateTime = pd.date_range("2021-01-01", periods=48, freq="h")
+        features = calendarFeatures.getCalendarFeatures(dateTime)
+        assert calendarFeatures.getCalendarFeatures(dateTime.values) is features
+        assert calendarFeatures.getCalendarFeaturesForPeriod.cache_info().hits == 1
+        assert not features["hour_sin"].flags.writeable
+        # dataset columns are not the memoized arrays
+        dataset = calendarFeatures.addDateTimeFeatures(self.get_dataset(dateTime), dateTime, 0)
+        dataset.loc[dateTime[0], "hour_sin"] = 5
+        assert features["hour_sin"][0] == 0
+
+    def test_irregular_timestamps(self):
+        dateTime = pd.DatetimeIndex(["2021-01-01 00:00", "2021-01-01 01:00", "2021-01-02 05:00"])
+        features = calendarFeatures.getCalendarFeatures(dateTime)
+        assert np.array_equal(features["hour_sin"], np.sin(np.array([0, 1, 5]) * (2 * np.pi / 24)))
+        assert np.array_equal(features["weekend"], [0, 0, 1])
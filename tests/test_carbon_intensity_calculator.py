@@ -7,7 +7,8 @@ import os
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from carbonIntensityCalculator import calculateCarbonIntensity, initialize
+from carbonIntensityCalculator import (calculateCarbonIntensity, calculateCarbonIntensitySweep, initialize,
+                                       inferNumSources, calculateCarbonIntensityStreaming)
 
 class TestCarbonIntensityCalculator:
     
@@ -53,6 +54,50 @@ class TestCarbonIntensityCalculator:
         # With all zeros, carbon intensity should be 0
         assert all(ci == 0 for ci in result['carbon_intensity_calculated'])
 
+    def test_calculate_carbon_intensity_fills_missing_hour(self):
+        """Test that an hour with all sources missing uses the previous hour's values"""
+        data = {
+            'Unnamed: 0': [0, 1, 2],
+            'UTC time': pd.to_datetime(['2021-07-01 00:00:00', '2021-07-01 01:00:00',
+                                        '2021-07-01 02:00:00']),
+            'carbon_intensity': [0, 0, 0],
+            'coal': [100, 0, 150],
+            'gas': [300, 0, 250],
+            'solar': [100, 0, 75]
+        }
+        df = pd.DataFrame(data)
+
+        carbon_rates = {"coal": 760, "gas": 370, "solar": 0}
+
+        result = calculateCarbonIntensity(df, carbon_rates, 3)
+        ci = result['carbon_intensity_calculated']
+        assert ci[0] == round(100/500*760 + 300/500*370, 2)
+        assert ci[1] == ci[0]
+        assert result['coal'][1] == 100
+        assert result['gas'][1] == 300
+
+    def test_calculate_carbon_intensity_sweep(self):
+        """Test that each emission factor set in a sweep matches a single calculation"""
+        data = {
+            'Unnamed: 0': [0, 1, 2],
+            'UTC time': pd.to_datetime(['2021-07-01 00:00:00', '2021-07-01 01:00:00',
+                                        '2021-07-01 02:00:00']),
+            'carbon_intensity': [0, 0, 0],
+            'coal': [100, 150, 120],
+            'gas': [200, 250, 0],
+            'solar': [50, 75, 300]
+        }
+        carbon_rates = {"direct": {"coal": 760, "gas": 370, "solar": 0},
+                        "lifecycle": {"coal": 820, "gas": 490, "solar": 45}}
+
+        result = calculateCarbonIntensitySweep(pd.DataFrame(data), carbon_rates, 3, False)
+
+        assert list(result.columns) == ['UTC time', 'carbon_intensity_direct', 'carbon_intensity_lifecycle']
+        for name, rates in carbon_rates.items():
+            single = calculateCarbonIntensity(pd.DataFrame(data), rates, 3)
+            assert np.array_equal(result['carbon_intensity_'+name].values,
+                                  single['carbon_intensity_calculated'].values)
+
     @pytest.fixture
     def sample_csv_file(self, tmp_path):
         """Create a temporary CSV file for testing"""
@@ -70,4 +115,31 @@ class TestCarbonIntensityCalculator:
         
         assert isinstance(result, pd.DataFrame)
         assert 'UTC time' in result.columns
-        assert len(result) == 2
\ No newline at end of file
+        assert len(result) == 2
+
+    def test_infer_num_sources(self, tmp_path):
+        """Test that source columns are inferred from the header, stopping at non-source columns"""
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text(",UTC time,carbon_intensity,coal,nat_gas,solar,forecast_avg_wind_speed_wMean\n")
+        carbon_rates = {"coal": 760, "nat_gas": 370, "solar": 0}
+        assert inferNumSources(str(csv_file), carbon_rates, 3) == 3
+
+    def test_streaming_matches_in_memory(self, tmp_path):
+        """Test that chunked calculation carries missing hours across chunk boundaries"""
+        df = pd.DataFrame({
+            'Unnamed: 0': range(7),
+            'UTC time': pd.date_range('2021-07-01', periods=7, freq='h'),
+            'carbon_intensity': [0] * 7,
+            'coal': [0, 100, 0, 0, 120, 0, 80],
+            'gas': [0, 200, 0, 0, 180, 0, 90],
+        })
+        in_file, out_file = tmp_path / "in.csv", tmp_path / "out.csv"
+        df.to_csv(in_file, index=False)
+        carbon_rates = {"coal": 760, "gas": 370}
+
+        expected = calculateCarbonIntensity(initialize(str(in_file)), carbon_rates, 2)
+        num_hours, _ = calculateCarbonIntensityStreaming(str(in_file), str(out_file), carbon_rates, 2, 2)
+        result = pd.read_csv(out_file)
+        assert num_hours == 7
+        assert np.array_equal(result['carbon_intensity_calculated'].values,
+                              expected['carbon_intensity_calculated'].values)
@@ -0,0 +1,108 @@
+import pytest
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import common
+
+class TestScaler:
+
+    def get_data(self):
+        rng = np.random.default_rng(0)
+        data = rng.uniform(-10, 500, (200, 4))
+        data[:, 2] = 7.0 # constant column is not scaled
+        return data
+
+    def test_scale_dataset_matches_per_column_scaling(self):
+        """Test scaleDataset against per column min-max scaling"""
+        trainData, valData, testData = self.get_data(), self.get_data()[:50] * 2, self.get_data()[:30] - 5
+        expected = []
+        ftMin, ftMax = trainData.min(axis=0), trainData.max(axis=0)
+        for data in [trainData, valData, testData]:
+            scaled = data.copy()
+            for i in range(data.shape[1]):
+                if (ftMax[i] - ftMin[i] != 0):
+                    scaled[:, i] = (data[:, i] - ftMin[i]) / (ftMax[i] - ftMin[i])
+            expected.append(scaled)
+        scaled = common.scaleDataset(trainData, valData, testData)
+        for i in range(3):
+            assert np.array_equal(scaled[i], expected[i])
+        assert np.array_equal(scaled[3], ftMin) and np.array_equal(scaled[4], ftMax)
+        # scaled in place
+        assert scaled[0] is trainData
+
+    def test_inverse_transform(self):
+        """Test inverse scaling clips negative values and rounds to 5 decimals"""
+        data = self.get_data()
+        scaler = common.Scaler().fit(data)
+        scaledCol = scaler.transform(data.copy())[:, 0]
+        unscaled = scaler.inverseTransform(scaledCol, 0)
+        expected = [round(max(x*(scaler.ftMax[0]-scaler.ftMin[0]) + scaler.ftMin[0], 0), 5) for x in scaledCol]
+        assert np.allclose(unscaled, expected, rtol=0, atol=1e-9)
+        assert unscaled.min() == 0
+
+    def test_fit_ignores_nan(self):
+        data = self.get_data()
+        data[0, 1] = np.nan
+        scaler = common.Scaler().fit(data)
+        assert scaler.ftMin[1] == np.nanmin(data[:, 1])
+        assert not np.isnan(scaler.ftMax).any()
+
+    def test_save_and_load(self, tmp_path):
+        """Test a saved scaler scales data in the same way"""
+        data = self.get_data()
+        scaler = common.Scaler().fit(data)
+        fileName = os.path.join(tmp_path, "CISO_scaler.npz")
+        scaler.save(fileName)
+        loadedScaler = common.Scaler.load(fileName)
+        assert np.array_equal(loadedScaler.ftMin, scaler.ftMin)
+        assert np.array_equal(loadedScaler.ftMax, scaler.ftMax)
+        assert np.array_equal(loadedScaler.transform(data.copy()), scaler.transform(data.copy()))
+
+
+class TestTrainingWindows:
+
+    def get_windows_by_loop(self, data, trainWindowHours, labelWindowHours, weatherData, weatherForecastWindowHours):
+        X, y, weatherX = [], [], []
+        weatherIdx, hourIdx = 0, 0
+        for i in range(len(data)-(trainWindowHours+labelWindowHours)+1):
+            X.append(data[i:i+trainWindowHours, :])
+            weatherX.append(weatherData[weatherIdx:weatherIdx+trainWindowHours])
+            weatherIdx += 1
+            hourIdx += 1
+            if (hourIdx == 24):
+                hourIdx = 0
+                weatherIdx += (weatherForecastWindowHours-24)
+            y.append(data[i+trainWindowHours:i+trainWindowHours+labelWindowHours, 0])
+        return np.append(np.array(X), np.array(weatherX), axis=2), np.array(y)
+
+    def test_windows_match_loop(self):
+        """Test windows & weather forecast windows against one window at a time"""
+        rng = np.random.default_rng(0)
+        numDays = 10
+        data = rng.uniform(0, 1, (numDays*24, 3))
+        weatherData = rng.uniform(0, 1, (numDays*96, 2))
+        X, y = common.getTrainingWindows(data, 24, 24, 0, weatherData, 96)
+        expectedX, expectedY = self.get_windows_by_loop(data, 24, 24, weatherData, 96)
+        assert X.shape == (numDays*24-47, 24, 5)
+        assert np.array_equal(X, expectedX)
+        assert np.array_equal(y, expectedY)
+
+    def test_windows_without_weather(self):
+        data = np.arange(100, dtype=np.float64).reshape(50, 2)
+        X, y = common.getTrainingWindows(data, 24, 12, 1)
+        assert X.shape == (15, 24, 2) and y.shape == (15, 12)
+        assert np.array_equal(X[3], data[3:27])
+        assert np.array_equal(y[3], data[27:39, 1])
+
+    def test_labels_of_several_columns(self):
+        """Test labels of a list of columns are the labels of each column one after the other"""
+        data = np.random.default_rng(0).uniform(0, 1, (100, 4))
+        X, y = common.getTrainingWindows(data, 24, 24, [0, 2])
+        _, y0 = common.getTrainingWindows(data, 24, 24, 0)
+        _, y2 = common.getTrainingWindows(data, 24, 24, 2)
+        assert y.shape == (len(X), 48)
+        assert np.array_equal(y, np.concatenate([y0, y2], axis=1))
@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config_manager import Config
+from consumptionCarbonIntensity import (
+    calculateConsumptionCarbonIntensity,
+    getExchangeEdges,
+    getProductionData,
+)
+
+
+class TestConsumptionCarbonIntensity:
+    def test_two_regions_with_export(self):
+        # A produces 100 MW @ 500 and exports 50 MW to B, B produces 100 MW @ 100
+        production = np.array([[100.0, 100.0]])
+        productionCarbonIntensity = np.array([[500.0, 100.0]])
+        edges = np.array([[0, 1]])
+        edgeFlows = np.array([[50.0]])
+        ci = calculateConsumptionCarbonIntensity(production, productionCarbonIntensity, edges, edgeFlows)
+        assert np.isclose(ci[0, 0], 500.0)
+        assert np.isclose(ci[0, 1], (100*100 + 50*500) / 150)
+
+    def test_batched_solve_matches_per_hour_solve(self):
+        rng = np.random.default_rng(0)
+        numHours, numRegions = 48, 4
+        production = rng.uniform(0, 1000, (numHours, numRegions))
+        production[3, 2] = 0
+        productionCarbonIntensity = rng.uniform(0, 900, (numHours, numRegions))
+        edges = np.array([[0, 1], [1, 2], [0, 3], [2, 3]])
+        edgeFlows = rng.uniform(-300, 300, (numHours, len(edges)))
+        ci = calculateConsumptionCarbonIntensity(production, productionCarbonIntensity, edges, edgeFlows)
+        for h in range(numHours):
+            flows = np.zeros((numRegions, numRegions))
+            for (a, b), f in zip(edges, edgeFlows[h]):
+                if f >= 0:
+                    flows[a, b] += f
+                else:
+                    flows[b, a] -= f
+            A = np.diag(production[h] + flows.sum(axis=0)) - flows.T
+            expected = np.linalg.solve(A, production[h] * productionCarbonIntensity[h])
+            assert np.allclose(ci[h], expected)
+
+    def test_exchange_edges_average_both_sides(self):
+        dateTime = pd.date_range("2021-01-01", periods=2, freq="h")
+        exchangeDatasets = {"A": pd.DataFrame({"B": [10.0, -20.0]}, index=dateTime),
+                            "B": pd.DataFrame({"A": [-14.0, 20.0]}, index=dateTime)}
+        edges, edgeFlows = getExchangeEdges(["A", "B"], exchangeDatasets, dateTime)
+        # A imports from B == flow from B to A, i.e., negative flow from A to B
+        assert edges.tolist() == [[0, 1]]
+        assert np.allclose(edgeFlows[:, 0], [-12.0, 20.0])
+
+    def test_exchange_edges_missing_on_one_side(self):
+        """Test an hour reported by only one region of a pair uses that region's flow, not half of it"""
+        dateTime = pd.date_range("2021-01-01", periods=4, freq="h")
+        exchangeDatasets = {"A": pd.DataFrame({"B": [10.0, np.nan, -20.0, np.nan]}, index=dateTime),
+                            "B": pd.DataFrame({"A": [-14.0, 30.0, np.nan]}, index=dateTime[:3])}
+        edges, edgeFlows = getExchangeEdges(["A", "B"], exchangeDatasets, dateTime)
+        assert np.allclose(edgeFlows[:, 0], [-12.0, 30.0, 20.0, 0.0])
+
+    def test_production_data_uses_config_carbon_rates(self, tmp_path):
+        """Test the emission factor overrides of the config file are used for production carbon intensity"""
+        os.makedirs(tmp_path / "XX")
+        pd.DataFrame({"UTC time": pd.date_range("2021-01-01", periods=3, freq="h"), "carbon_intensity": 0.0,
+                      "coal": [100.0, 50.0, 0.0], "solar": [0.0, 50.0, 100.0]}).to_csv(
+                      tmp_path / "XX" / "XX_direct_emissions.csv")
+        configFileName = str(tmp_path / "config.json")
+        with open(configFileName, "w") as configFile:
+            json.dump({"data_path": str(tmp_path), "carbon_rates": {"coal": 2000}}, configFile)
+        productionDataset = getProductionData("XX", False, Config(configFileName), configFileName)
+        assert np.allclose(productionDataset["production"], 100.0)
+        assert np.allclose(productionDataset["carbon_intensity"], [2000.0, 1000.0, 0.0])
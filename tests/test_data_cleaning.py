@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import dataCleaning
+
+class TestDataCleaning:
+
+    def fill_by_loop(self, data):
+        # previous fillMissingData of the forecasting tiers
+        for i in range(data.shape[0]):
+            for j in range(data.shape[1]):
+                if(np.isnan(data[i, j])):
+                    data[i, j] = data[i-1, j]
+        return data
+
+    def test_forward_fill_matches_loop(self):
+        """Test forward fill against the per cell loop, when the first row is available"""
+        rng = np.random.default_rng(0)
+        data = rng.uniform(0, 100, (500, 6))
+        data[rng.uniform(size=data.shape) < 0.2] = np.nan
+        data[0] = 1
+        filled, touched = dataCleaning.forwardFill(data)
+        assert np.array_equal(filled, self.fill_by_loop(data.copy()))
+        assert np.array_equal(touched, np.isnan(data))
+
+    def test_leading_gap_policies(self):
+        data = np.array([[np.nan, 1], [np.nan, 2], [3, np.nan], [4, 5]])
+        filled, touched = dataCleaning.forwardFill(data, "backfill")
+        assert np.array_equal(filled, [[3, 1], [3, 2], [3, 2], [4, 5]])
+        assert touched.sum() == 3
+        filled, _ = dataCleaning.forwardFill(data, "wrap")
+        assert np.array_equal(filled, self.fill_by_loop(data.copy()))
+        filled, touched = dataCleaning.forwardFill(data, "keep")
+        assert np.isnan(filled[:2, 0]).all() and touched.sum() == 1
+        with pytest.raises(ValueError):
+            dataCleaning.forwardFill(data, "bfill")
+
+    def test_fill_missing_data_in_place(self):
+        data = np.array([[np.nan, 1.0], [2.0, np.nan]])
+        view = data[:, :]
+        assert dataCleaning.fillMissingData(view) is view
+        assert np.array_equal(data, [[2, 1], [2, 1]])
+
+    def test_repair_zero_rows(self):
+        """Test rows where all sources are 0 are filled from the previous producing row"""
+        data = np.array([[0, 0], [1, 2], [0, 0], [0, np.nan], [3, 0]], dtype=np.float64)
+        repaired, touched, zeroRows, fillIdx = dataCleaning.repairZeroRows(data)
+        assert np.array_equal(zeroRows, [True, False, True, True, False])
+        assert np.array_equal(repaired, [[1, 2], [1, 2], [1, 2], [1, np.nan], [3, 0]], equal_nan=True)
+        assert np.array_equal(fillIdx, [1, 1, 1, 1, 4])
+        assert touched.sum() == 5
+        repaired, _, _, _ = dataCleaning.repairZeroRows(data, "wrap")
+        assert np.array_equal(repaired[0], [3, 0])
+
+    def test_clean_data(self):
+        data = np.array([[-1, 0], [0, 0], [np.nan, 4]], dtype=np.float64)
+        cleaned, touched = dataCleaning.cleanData(data, "zero", repairZeroSourceRows=True)
+        assert np.array_equal(cleaned, [[0, 4], [0, 4], [0, 4]])
+        assert np.array_equal(touched, [[True, True], [False, True], [True, False]])
@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+import json
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emissionFactorTables import getEmissionFactorTable
+import carbonIntensityCalculator
+
+class TestEmissionFactorTables:
+
+    def test_region_override_does_not_change_defaults(self):
+        """Test that SE lifecycle factors do not leak into other regions"""
+        se = getEmissionFactorTable("SE", "lifecycle")
+        ciso = getEmissionFactorTable("CISO", "lifecycle")
+        assert se["unknown"] == 292.9 and se["avg_other_production_forecast"] == 292.9
+        assert ciso["unknown"] == 700
+        assert carbonIntensityCalculator.carbonRateLifecycle["unknown"] == 700
+        with pytest.raises(TypeError):
+            carbonIntensityCalculator.carbonRateLifecycle["unknown"] = 292.9
+
+    def test_column_aligned_vector(self):
+        """Test that vectors follow the column order of both schemas and are read-only"""
+        table = getEmissionFactorTable("CISO", "direct")
+        vector = table.getVector(["nat_gas", "coal"])
+        assert vector.tolist() == [370, 760]
+        assert table.getVector(["nat_gas", "coal"]) is vector
+        assert table.getVector(["avg_nat_gas_production_forecast"]).tolist() == [370]
+        with pytest.raises(ValueError):
+            vector[0] = 0
+
+    def test_config_overrides(self, tmp_path):
+        """Test global and per-region carbon_rates from the config file"""
+        config_file = tmp_path / "config.json"
+        config_file.write_text(json.dumps({
+            "carbon_rates": {"coal": 800},
+            "DE": {"carbon_rates": {"lifecycle": {"coal": 900}}}
+        }))
+        assert getEmissionFactorTable("DE", "direct", str(config_file))["coal"] == 800
+        assert getEmissionFactorTable("DE", "lifecycle", str(config_file))["coal"] == 900
+        assert getEmissionFactorTable("CISO", "lifecycle", str(config_file))["coal"] == 820
@@ -0,0 +1,68 @@
+import pytest
+import pandas as pd
+import numpy as np
+import json
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import forecastMetrics
+import experimentResults
+
+def write_runs(tmp_path, issue_days, num_runs, rng):
+    times = np.concatenate([pd.date_range(day, periods=96, freq='h') for day in issue_days])
+    actual = rng.uniform(100, 500, len(times))
+    forecasts = []
+    for run in range(num_runs):
+        forecasts.append(actual + rng.normal(0, 20, len(times)))
+        pd.DataFrame({'datetime': times, 'coal_actual': actual,
+                      'avg_coal_production_forecast': forecasts[-1]}).to_csv(
+            os.path.join(tmp_path, 'XX_ANN_DA_coal_iter'+str(run)+'.csv'), index=False)
+    return actual, np.array(forecasts)
+
+class TestExperimentResults:
+
+    def test_run_discovery(self, tmp_path):
+        for fileName in ['XX_ANN_DA_coal_iter10.csv', 'XX_ANN_DA_coal_iter2.csv', 'XX_ANN_DA_coal_iterx.csv',
+                         'XX_lifecycle_0.csv', 'XX_lifecycle_old_1.csv']:
+            open(os.path.join(tmp_path, fileName), 'w').close()
+        runFiles = experimentResults.getFirstTierRunFiles(os.path.join(tmp_path, 'XX_ANN_DA'), 'COAL')
+        assert list(runFiles.keys()) == [2, 10]
+        runFiles = experimentResults.getSecondTierRunFiles(os.path.join(tmp_path, 'XX_lifecycle'))
+        assert list(runFiles.keys()) == [0]
+
+    def test_aggregate_runs_by_period(self, tmp_path):
+        """Test per run, per period & ensemble daily MAPE statistics"""
+        rng = np.random.default_rng(0)
+        issue_days = pd.date_range('2021-01-01', periods=5, freq='D')
+        actual, forecasts = write_runs(tmp_path, issue_days, 3, rng)
+        # MAPE files as the first tier writes them: str() of the per period scores. Runs on numpy >= 2
+        # before getMAPE returned a float wrote np.float64(...) reprs.
+        with open(os.path.join(tmp_path, 'XX_MAPE_iter1coal.txt'), 'w') as scoreFile:
+            scoreFile.write(str([[np.float64(1.5)], [np.float64(2.5)]]))
+        mape = forecastMetrics.getMAPE(actual[:2*96], forecasts[0, :2*96])
+        with open(os.path.join(tmp_path, 'XX_MAPE_iter0coal.txt'), 'w') as scoreFile:
+            scoreFile.write(str([[mape], [forecastMetrics.getMAPE(actual[2*96:], forecasts[0, 2*96:])]]))
+        periodConfig = {'PERIOD_0': {'NUM_TEST_DAYS': 2, 'OUT_FILE_SUFFIX': 'p0'},
+                        'PERIOD_1': {'NUM_TEST_DAYS': 3, 'OUT_FILE_SUFFIX': 'p1'}}
+        runFiles = experimentResults.getFirstTierRunFiles(os.path.join(tmp_path, 'XX_ANN_DA'), 'COAL')
+        scoreFiles = {run: (os.path.join(tmp_path, 'XX_RMSE_iter'+str(run)+'coal.txt'),
+                            os.path.join(tmp_path, 'XX_MAPE_iter'+str(run)+'coal.txt')) for run in runFiles}
+        table = experimentResults.aggregateRuns({'region': 'XX', 'tier': 'first', 'series': 'coal'},
+                                                runFiles, periodConfig, scoreFiles)
+        assert len(table) == 4 * 2 * 4 # (3 runs + ensemble) x 2 periods x 4 lead days
+        assert list(table['period'].unique()) == ['p0', 'p1']
+
+        ensemble = forecasts.mean(axis=0)
+        expected = forecastMetrics.getDailyMAPE(actual[2*96:], ensemble[2*96:], 96).mean(axis=0)
+        rows = table[(table['run'] == 'ensemble') & (table['period'] == 'p1')]
+        assert np.allclose(rows['mean_mape'], np.round(expected, 3))
+        assert (rows['num_days'] == 3).all()
+        expected = forecastMetrics.getDailyMAPE(actual[:2*96], forecasts[1, :2*96], 96).mean(axis=0)
+        rows = table[(table['run'] == '1') & (table['period'] == 'p0')]
+        assert np.allclose(rows['mean_mape'], np.round(expected, 3))
+        assert (rows['reported_mape'] == 1.5).all() and rows['reported_rmse'].isna().all()
+        rows = table[(table['run'] == '0') & (table['period'] == 'p0')]
+        assert np.allclose(rows['reported_mape'], mape)
@@ -0,0 +1,326 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+import json
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import firstTierForecasts
+
+def write_datasets(tmp_path, numHours=24*20):
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2021-01-01", periods=numHours, freq="h")
+    dataset = pd.DataFrame({"UTC time": times.strftime("%m/%d/%Y %H:%M:%S"),
+                            "Local time": times.strftime("%Y-%m-%d %H:%M:%S"),
+                            "carbon_intensity": rng.uniform(100, 500, numHours),
+                            "coal": rng.integers(0, 100, numHours),
+                            "avg_coal_production_forecast": rng.integers(0, 100, numHours)})
+    inFileName = os.path.join(tmp_path, "XX_coal_clean.csv")
+    dataset.to_csv(inFileName)
+    weatherTimes = pd.date_range("2021-01-01", periods=numHours*4, freq="h")
+    weatherDataset = pd.DataFrame({"UTC time": weatherTimes, "temperature": rng.uniform(0, 30, numHours*4)})
+    weatherFileName = os.path.join(tmp_path, "XX_weather_forecast.csv")
+    weatherDataset.to_csv(weatherFileName, index=False)
+    return inFileName, weatherFileName
+
+class TestFirstTierForecasts:
+
+    def test_datasets_are_read_once(self, tmp_path, monkeypatch):
+        """Test each period of the cached datasets is the same as reading the files for that period"""
+        inFileName, weatherFileName = write_datasets(tmp_path)
+        monkeypatch.setattr(firstTierForecasts, "BUFFER_HOURS", 72)
+        numReads = []
+        readCsv = pd.read_csv
+        def countingReadCsv(*args, **kwargs):
+            numReads.append(args[0])
+            return readCsv(*args, **kwargs)
+        monkeypatch.setattr(firstTierForecasts.pd, "read_csv", countingReadCsv)
+
+        datasetCache = {}
+        for datasetLimiter in [24*10, 24*15, 24*10]:
+            cached = firstTierForecasts.initialize(inFileName, weatherFileName, 3, datasetLimiter,
+                                                   datasetLimiter//24*96, datasetCache)
+            expected = firstTierForecasts.initialize(inFileName, weatherFileName, 3, datasetLimiter,
+                                                     datasetLimiter//24*96)
+            for cachedValue, expectedValue in zip(cached, expected):
+                if (isinstance(expectedValue, pd.DataFrame)):
+                    pd.testing.assert_frame_equal(cachedValue, expectedValue)
+                else:
+                    assert np.array_equal(cachedValue, expectedValue)
+            dataset, dateTime, bufferPeriod, bufferDates, weatherDataset = cached
+            assert len(dataset) == datasetLimiter and len(bufferPeriod) == 72 and len(bufferDates) == 72
+            assert len(weatherDataset) == datasetLimiter//24*96
+        # 2 reads for the cache, 2 for each uncached period
+        assert len(numReads) == 2 + 2*3
+        assert len(datasetCache) == 2
+
+    def test_cached_dataset_is_not_modified(self, tmp_path, monkeypatch):
+        """Test cleaning & scaling the data of a job leaves the cached datasets unchanged"""
+        config = write_region_datasets(tmp_path, ["SOLAR"])
+        firstTierForecasts.setGlobals(config)
+        scaledInputs = []
+        class StopJob(Exception):
+            pass
+        def stopBeforeTraining(trainData, wTrainData, valData, wValData, firstTierConfig, *args):
+            scaledInputs.append([np.copy(data) for data in [trainData, wTrainData, valData, wValData]])
+            raise StopJob()
+        monkeypatch.setattr(firstTierForecasts, "trainingandValidationPhase", stopBeforeTraining)
+        job = firstTierForecasts.getFirstTierJobs(config)[0]
+        datasetCache = {}
+        for _ in range(2):
+            with pytest.raises(StopJob):
+                firstTierForecasts.runFirstTierJob(config, job, datasetCache)
+        inFileName = os.path.join(tmp_path, "XX_solar_2019_clean.csv")
+        expected, _ = firstTierForecasts.loadDataset(inFileName, 2)
+        pd.testing.assert_frame_equal(datasetCache[("dataset", inFileName, 2)][0], expected)
+        expectedWeather = firstTierForecasts.loadWeatherDataset(config["XX"]["WEATHER_FORECAST_IN_FILE_NAME"])
+        pd.testing.assert_frame_equal(datasetCache[("weather", config["XX"]["WEATHER_FORECAST_IN_FILE_NAME"])],
+                                      expectedWeather)
+        # both runs got the same scaled inputs (training data in the range 0-1)
+        for first, second in zip(*scaledInputs):
+            assert np.array_equal(first, second)
+        trainData = scaledInputs[0][0].astype(np.float64)
+        assert np.min(trainData) >= 0 and np.max(trainData) <= 1 + 1e-9
+
+    def test_training_leaves_no_figure_open(self, tmp_path, monkeypatch):
+        """Test the training history is written next to the checkpoint instead of left open as a figure"""
+        plt = pytest.importorskip("matplotlib.pyplot")
+        plt.close("all")
+        monkeypatch.setattr(firstTierForecasts, "CHECKPOINT_FILE_NAME", os.path.join(tmp_path, "best_model_ann.h5"))
+        rng = np.random.default_rng(0)
+        hyperParams = {"epoch": 2, "batchsize": [8], "loss": "mse", "actv": "relu", "hidden": [4, 4], "lr": 0.01}
+        firstTierForecasts.trainANN(rng.uniform(size=(16, 24, 2)), rng.uniform(size=(16, 24)),
+                                    rng.uniform(size=(8, 24, 2)), rng.uniform(size=(8, 24)), hyperParams)
+        assert plt.get_fignums() == []
+        assert os.path.exists(os.path.join(tmp_path, "best_model_ann.png"))
+
+def get_config(tmp_path):
+    return {"REGION": ["XX", "YY"], "NUMBER_OF_EXPERIMENTS_PER_REGION": 2,
+            "TRAINING_WINDOW_HOURS": 24, "PREDICTION_WINDOW_HOURS": 96, "MODEL_SLIDING_WINDOW_LEN": 24,
+            "TRAIN_TEST_PERIOD": {"PERIOD_1": {"DATASET_LIMITER": 240, "NUM_TEST_DAYS": 2},
+                                  "PERIOD_2": {"DATASET_LIMITER": 360, "NUM_TEST_DAYS": 3}},
+            "XX": {"SOURCES": ["COAL", "SOLAR"], "OUT_FILE_NAME_PREFIX": os.path.join(tmp_path, "XX")},
+            "YY": {"SOURCES": ["NAT_GAS"], "OUT_FILE_NAME_PREFIX": os.path.join(tmp_path, "YY")}}
+
+def fake_job_result(job):
+    numHours = 96*(job["periodIdx"]+1)
+    dates = np.array([str(hour) for hour in range(numHours)])
+    value = job["exptNum"]*10 + job["periodIdx"]
+    return dates, np.full(numHours, value, dtype=np.float64), np.full(numHours, value+0.5), value, value+0.5
+
+class TestFirstTierJobs:
+
+    def test_jobs_cover_all_combinations(self, tmp_path):
+        """Test there is one job per region, source, experiment & period, with the output files of the sequential run"""
+        jobs = firstTierForecasts.getFirstTierJobs(get_config(tmp_path))
+        assert len(jobs) == (2+1)*2*2
+        assert len(set((job["region"], job["source"], job["exptNum"], job["period"]) for job in jobs)) == len(jobs)
+        job = jobs[-1]
+        assert job["outFileName"] == os.path.join(tmp_path, "YY") + "_nat_gas_iter1.csv"
+        assert job["rmseFileName"] == "../data/YY/fuel_forecast/YY_RMSE_iter1nat_gas.txt"
+        assert job["periodIdx"] == 1 and job["sourceIdx"] == 0
+
+    def test_experiment_results_do_not_depend_on_order(self, tmp_path):
+        """Test an experiment is written the same whichever order its periods finished in"""
+        jobs = firstTierForecasts.getFirstTierJobs(get_config(tmp_path))[:2]
+        outputs = []
+        for order in [jobs, jobs[::-1]]:
+            for job in order:
+                job["rmseFileName"] = os.path.join(tmp_path, "rmse.txt")
+                job["mapeFileName"] = os.path.join(tmp_path, "mape.txt")
+            firstTierForecasts.writeExperimentResults([(job, fake_job_result(job)) for job in order])
+            outputs.append([open(job["outFileName"]).read(), open(os.path.join(tmp_path, "rmse.txt")).read(),
+                            open(os.path.join(tmp_path, "mape.txt")).read()])
+        assert outputs[0] == outputs[1]
+        written = pd.read_csv(jobs[0]["outFileName"])
+        assert len(written) == 96 + 96*2
+        assert list(written.iloc[[0, -1], 1]) == [0, 1]
+        assert outputs[0][1] == "[[0], [1]]"
+
+    def test_sequential_run_writes_every_experiment(self, tmp_path, monkeypatch):
+        """Test the sequential run writes the forecasts & scores of every experiment"""
+        config = get_config(tmp_path)
+        configFileName = os.path.join(tmp_path, "config.json")
+        with open(configFileName, "w") as configFile:
+            json.dump(config, configFile)
+        scoreFiles = []
+        def fake_run_job(firstTierConfig, job, datasetCache=None):
+            assert datasetCache is not None
+            return fake_job_result(job)
+        monkeypatch.setattr(firstTierForecasts, "runFirstTierJob", fake_run_job)
+        monkeypatch.setattr(firstTierForecasts.common, "dumpRandomDataToFile",
+                            lambda fileName, data, writeMode: scoreFiles.append((fileName, data)))
+        numThreads = []
+        monkeypatch.setattr(firstTierForecasts, "setNumThreads", numThreads.append)
+        firstTierForecasts.runFirstTier(configFileName, numThreadsPerWorker=2)
+        # thread cap is also applied without workers
+        assert numThreads == [2]
+        assert len(scoreFiles) == (2+1)*2*2
+        for region, source in [("XX", "coal"), ("XX", "solar"), ("YY", "nat_gas")]:
+            for exptNum in range(2):
+                written = pd.read_csv(os.path.join(tmp_path, region) + "_" + source + "_iter" + str(exptNum) + ".csv")
+                assert len(written) == 96*3
+                assert written.iloc[-1, 2] == exptNum*10 + 1.5
+
+class FakeModel:
+    def __init__(self, numFeatures, seed=0):
+        self.weights = np.random.default_rng(seed).normal(0, 0.1, (24*numFeatures, 24))
+        self.numCalls = 0
+
+    def predict(self, x, batch_size=None, verbose=0):
+        self.numCalls += 1
+        return 0.5 + 0.5*np.tanh(np.reshape(x, (len(x), -1)) @ self.weights)
+
+def forecast_by_loop(model, history, testData, numFeatures, wTestData, weatherData, partialForecast, numDays):
+    # previous getDayAheadForecasts, one model input at a time
+    predictions = []
+    weatherIdx = 0
+    for i in range(numDays):
+        dayAheadPredictions = []
+        tempHistory = history.copy()
+        for j in range(0, 96, 24):
+            input_x = np.array(tempHistory, dtype=np.float64)[-24:]
+            if (weatherData is not None):
+                input_x = np.append(input_x, weatherData[j:j+24], axis=1)
+            yhat = model.predict(input_x.reshape((1, 24, numFeatures)))[0]
+            if (j == 0 and partialForecast is not None):
+                yhat[:24] = partialForecast[i*24:i*24+24]
+            dayAheadPredictions.extend(yhat)
+            latestHistory = testData[i*24+j:i*24+j+24, :].tolist()
+            for k in range(24):
+                latestHistory[k][0] = yhat[k]
+            tempHistory.extend(latestHistory)
+        history.extend(testData[i*24:(i+1)*24, :].tolist())
+        predictions.append(dayAheadPredictions)
+        if (wTestData is not None):
+            weatherData = wTestData[weatherIdx:weatherIdx+96, :]
+            weatherIdx += 96
+    return np.array(predictions)
+
+class TestDayAheadForecasts:
+
+    @pytest.mark.parametrize("withWeather", [False, True])
+    @pytest.mark.parametrize("withPartialForecast", [False, True])
+    def test_batched_forecasts_match_loop(self, monkeypatch, withWeather, withPartialForecast):
+        """Test forecasting all test days together gives the forecasts of one day & step at a time"""
+        for name, value in [("TRAINING_WINDOW_HOURS", 24), ("PREDICTION_WINDOW_HOURS", 96),
+                            ("MODEL_SLIDING_WINDOW_LEN", 24), ("BUFFER_HOURS", 72)]:
+            monkeypatch.setattr(firstTierForecasts, name, value)
+        rng = np.random.default_rng(1)
+        numDays = 7
+        testData = rng.uniform(0, 1, ((numDays+3)*24, 3))
+        history = rng.uniform(0, 1, (24, 3))
+        numFeatures = 3
+        wTestData, weatherData, partialForecast = None, None, None
+        if (withWeather):
+            numFeatures = 5
+            wTestData = rng.uniform(0, 1, (numDays*96, 2))
+            weatherData = rng.uniform(0, 1, (96, 2))
+        if (withPartialForecast):
+            partialForecast = rng.uniform(0, 1, numDays*24)
+        model = FakeModel(numFeatures)
+        predictions = firstTierForecasts.getDayAheadForecasts(model, history.tolist(), testData, numFeatures,
+                                                              wTestData, weatherData, partialForecast)
+        assert model.numCalls == (3 if withPartialForecast else 4)
+        expected = forecast_by_loop(model, history.tolist(), testData, numFeatures, wTestData, weatherData,
+                                    partialForecast, numDays)
+        assert predictions.shape == (numDays, 96)
+        assert np.allclose(predictions, expected, atol=1e-5)
+
+def write_region_datasets(tmp_path, sources, numHours=24*40):
+    # one file per source, as <region>_<source>_2019_clean.csv
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2021-01-01", periods=numHours, freq="h")
+    for source in sources:
+        dataset = pd.DataFrame({"UTC time": times.strftime("%m/%d/%Y %H:%M:%S"),
+                                "Local time": times.strftime("%Y-%m-%d %H:%M:%S"),
+                                source.lower(): 50 + 40*np.sin(np.arange(numHours)*2*np.pi/24) + rng.uniform(0, 5, numHours),
+                                "avg_"+source.lower()+"_production_forecast": rng.uniform(10, 90, numHours)})
+        dataset.to_csv(os.path.join(tmp_path, "XX_"+source.lower()+"_2019_clean.csv"))
+    weatherTimes = pd.date_range("2021-01-01", periods=numHours*4, freq="h")
+    pd.DataFrame({"UTC time": weatherTimes, "temperature": rng.uniform(0, 30, numHours*4)}).to_csv(
+        os.path.join(tmp_path, "XX_weather_forecast.csv"), index=False)
+    return {"REGION": ["XX"], "NUMBER_OF_EXPERIMENTS_PER_REGION": 1, "NUM_VAL_DAYS": 5,
+            "TRAINING_WINDOW_HOURS": 24, "PREDICTION_WINDOW_HOURS": 96, "MODEL_SLIDING_WINDOW_LEN": 24,
+            "IN_FILE_NAME_SUFFIX": "_2019_clean.csv",
+            "TRAIN_TEST_PERIOD": {"PERIOD_0": {"DATASET_LIMITER": 24*30, "NUM_TEST_DAYS": 4}},
+            "FIRST_TIER_ANN_MODEL_HYPERPARAMS": {"EPOCH": 2, "BATCH_SIZE": [32], "ACTIVATION_FUNC": "relu",
+                                                 "LOSS_FUNC": "mse", "LEARNING_RATE": 0.01, "HIDDEN_UNITS": [8, 8]},
+            "XX": {"IN_FILE_NAME_PREFIX": os.path.join(tmp_path, "XX_"),
+                   "WEATHER_FORECAST_IN_FILE_NAME": os.path.join(tmp_path, "XX_weather_forecast.csv"),
+                   "OUT_FILE_NAME_PREFIX": os.path.join(tmp_path, "XX_ANN_DA"), "NUM_FEATURES": 6,
+                   "NUM_WEATHER_FEATURES": 1, "SOURCES": sources, "SOURCE_COL": [2]*len(sources),
+                   "PARTIAL_FORECAST_AVAILABILITY_LIST": [1] + [0]*(len(sources)-1), "PARTIAL_FORECAST_HOURS": 24}}
+
+class TestMultiOutputModel:
+
+    def test_jobs_of_all_sources(self, tmp_path):
+        """Test there is one multi-output job per region, experiment & period, with the jobs of all sources"""
+        config = get_config(tmp_path)
+        jobs = firstTierForecasts.getFirstTierJobs(config, multiOutput=True)
+        assert len(jobs) == 2*2*2
+        assert [source["source"] for source in jobs[0]["sourceJobs"]] == ["COAL", "SOLAR"]
+        sourceJobs = [sourceJob for job in jobs for sourceJob in job["sourceJobs"]]
+        assert sorted(map(str, sourceJobs)) == sorted(map(str, firstTierForecasts.getFirstTierJobs(config)))
+
+    def test_one_model_forecasts_all_sources(self, tmp_path, monkeypatch):
+        """Test one model is trained for all sources of a region, with the results of each source"""
+        config = write_region_datasets(tmp_path, ["COAL", "SOLAR"])
+        firstTierForecasts.setGlobals(config)
+        monkeypatch.setattr(firstTierForecasts, "CHECKPOINT_FILE_NAME", os.path.join(tmp_path, "best_model_ann.h5"))
+        numTrainings = []
+        trainANN = firstTierForecasts.trainANN
+        def countingTrainANN(X, y, valX, valY, hyperParams):
+            numTrainings.append((X.shape, y.shape))
+            return trainANN(X, y, valX, valY, hyperParams)
+        monkeypatch.setattr(firstTierForecasts, "trainANN", countingTrainANN)
+        job = firstTierForecasts.getFirstTierJobs(config, multiOutput=True)[0]
+        results = firstTierForecasts.runMultiOutputJob(config, job, {})
+        # inputs: 2 sources, 5 date & time features & 1 weather feature. Labels: 24 hours of each source.
+        assert numTrainings == [((24*21-47, 24, 8), (24*21-47, 48))]
+        assert len(results) == 2
+        dataset = pd.read_csv(os.path.join(tmp_path, "XX_coal_2019_clean.csv"))
+        for formattedTestDates, unscaledTestData, unscaledPredictedData, rmseScore, mapeScore in results:
+            assert len(formattedTestDates) == len(unscaledTestData) == len(unscaledPredictedData) == 4*96
+            assert np.isfinite(mapeScore)
+        # actual values of each source, and the partial forecast for the first day of coal
+        assert np.allclose(results[0][1][:24], dataset["coal"].values[24*26:24*27], atol=1e-4)
+        assert np.allclose(results[0][2][:24], dataset["avg_coal_production_forecast"].values[24*26:24*27], atol=1e-3)
+        assert os.path.exists(os.path.join(tmp_path, "best_model_ann.npz"))
+
+class TestProcessPool:
+
+    def test_pool_outputs_match_sequential_run(self, tmp_path, monkeypatch):
+        """Test jobs run in 2 worker processes write the same per-source outputs as the sequential run"""
+        config = write_region_datasets(tmp_path, ["COAL", "SOLAR"])
+        config["TRAIN_TEST_PERIOD"]["PERIOD_1"] = {"DATASET_LIMITER": 24*34, "NUM_TEST_DAYS": 4}
+        config["RANDOM_SEED"] = 0
+        os.makedirs(os.path.join(tmp_path, "data", "XX", "fuel_forecast"))
+        os.makedirs(os.path.join(tmp_path, "src"))
+        monkeypatch.chdir(os.path.join(tmp_path, "src"))
+        outputs = {}
+        for run, numWorkers in [("pool", 2), ("sequential", 1)]:
+            config["XX"]["OUT_FILE_NAME_PREFIX"] = os.path.join(tmp_path, run)
+            configFileName = os.path.join(tmp_path, run+".json")
+            with open(configFileName, "w") as configFile:
+                json.dump(config, configFile)
+            firstTierForecasts.runFirstTier(configFileName, numWorkers)
+            for source in ["coal", "solar"]:
+                outputs[(run, source)] = pd.read_csv(os.path.join(tmp_path, run+"_"+source+"_iter0.csv"))
+                with open(os.path.join(tmp_path, "data", "XX", "fuel_forecast", "XX_MAPE_iter0"+source+".txt")) as scoreFile:
+                    outputs[(run, source, "mape")] = scoreFile.read()
+            if (run == "pool"):
+                # checkpoints of the workers are deleted after each job
+                assert os.listdir(".") == []
+        for source in ["coal", "solar"]:
+            pool, sequential = outputs[("pool", source)], outputs[("sequential", source)]
+            assert len(pool) == 2*4*96
+            # periods are written in order of periodIdx
+            issueTimes = pd.to_datetime(pool["datetime"]).iloc[::96]
+            assert list(issueTimes) == list(pd.date_range("2021-01-27", periods=8, freq="D"))
+            assert pool.iloc[:, :2].equals(sequential.iloc[:, :2])
+            assert np.allclose(pool.iloc[:, 2], sequential.iloc[:, 2], atol=1e-3)
+            assert outputs[("pool", source, "mape")].count("],") == 1
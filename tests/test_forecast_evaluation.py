@@ -0,0 +1,44 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import forecastMetrics
+from forecastEvaluation import stackForecastWindows, evaluateForecasts
+
+def get_series(issue_days, rng):
+    times = np.concatenate([pd.date_range(day, periods=96, freq='h') for day in issue_days])
+    actual = rng.uniform(100, 500, len(times))
+    return pd.DataFrame({'UTC time': times, 'actual': actual,
+                         'forecast': actual + rng.normal(0, 20, len(times))})
+
+class TestForecastEvaluation:
+
+    def test_series_aligned_on_issue_day(self):
+        """Test alignment of series with missing and duplicate issue days"""
+        rng = np.random.default_rng(0)
+        dacf = get_series(['2021-07-01', '2021-07-02', '2021-07-02', '2021-07-04'], rng)
+        carbonCast = get_series(['2021-07-02', '2021-07-03'], rng)
+        actual, forecast, issueTimes = stackForecastWindows([dacf, carbonCast])
+        assert actual.shape == (2, 5, 96)
+        assert [str(day.date()) for day in issueTimes] == ['2021-07-01', '2021-07-02', '2021-07-02',
+                                                          '2021-07-03', '2021-07-04']
+        assert np.isnan(actual[1, [0, 2, 4]]).all() and np.isnan(actual[0, 3]).all()
+        assert np.array_equal(forecast[1, 3], carbonCast['forecast'].values[96:])
+
+    def test_daily_mape_matches_single_series(self):
+        """Test that stacked evaluation gives the same daily MAPE as per-series metrics"""
+        rng = np.random.default_rng(1)
+        dacf = get_series(['2021-07-01', '2021-07-02', '2021-07-03'], rng)
+        carbonCast = get_series(['2021-07-02', '2021-07-03'], rng)
+        actual, forecast, _ = stackForecastWindows([dacf, carbonCast])
+        dailyMape, statistics = evaluateForecasts(actual, forecast)
+        expected = forecastMetrics.getDailyMAPE(carbonCast['actual'], carbonCast['forecast'], 96)
+        assert np.allclose(dailyMape[1, 1:], expected)
+        assert np.allclose(statistics['mean'][1], expected.mean(axis=0))
+        assert np.allclose(statistics['p90'][0], 
+                           np.percentile(forecastMetrics.getDailyMAPE(dacf['actual'], dacf['forecast'], 96), 90, axis=0))
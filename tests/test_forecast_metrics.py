@@ -0,0 +1,49 @@
+import pytest
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import forecastMetrics
+
+class TestForecastMetrics:
+
+    def get_forecasts(self):
+        rng = np.random.default_rng(0)
+        actual = rng.uniform(0, 500, 5*96)
+        actual[10] = 0
+        predicted = actual + rng.normal(0, 20, actual.shape)
+        return actual, predicted
+
+    def test_mape_and_rmse(self):
+        """Test MAPE & RMSE against a per-hour calculation"""
+        actual, predicted = self.get_forecasts()
+        ape = [100 * abs(a - p) / max(abs(a), 1e-7) for a, p in zip(actual, predicted)]
+        assert np.isclose(forecastMetrics.getMAPE(actual, predicted), np.mean(ape))
+        assert np.isclose(forecastMetrics.getMAPE(actual[:, np.newaxis], predicted), np.mean(ape))
+        rmse = np.sqrt(np.mean([(a - p)**2 for a, p in zip(actual, predicted)]))
+        assert forecastMetrics.getRMSE(actual, predicted) == round(rmse, 6)
+
+    def test_daily_scores(self):
+        """Test daily MAPE/RMSE against per 24 hour block calculation"""
+        actual, predicted = self.get_forecasts()
+        dailyMape = forecastMetrics.getDailyMAPE(actual, predicted, 96)
+        dailyRmse = forecastMetrics.getDailyRMSE(actual, predicted, 96)
+        assert dailyMape.shape == (5, 4)
+        for i in range(0, len(actual), 96):
+            for j in range(0, 96, 24):
+                block = slice(i+j, i+j+24)
+                assert np.isclose(dailyMape[i//96, j//24], 
+                                  forecastMetrics.getMAPE(actual[block], predicted[block]))
+                assert dailyRmse[i//96, j//24] == forecastMetrics.getRMSE(actual[block], predicted[block])
+
+    def test_lead_hour_error_and_percentiles(self):
+        actual, predicted = self.get_forecasts()
+        leadHourMape, leadHourBias = forecastMetrics.getLeadHourError(actual, predicted, 96)
+        assert leadHourMape.shape == (96,)
+        assert np.isclose(leadHourBias[5], np.mean(predicted[5::96] - actual[5::96]))
+        dailyMape = forecastMetrics.getDailyMAPE(actual, predicted, 96)
+        percentiles = forecastMetrics.getPercentiles(dailyMape)
+        assert np.allclose(percentiles[90], np.percentile(dailyMape, 90, axis=0))
@@ -0,0 +1,44 @@
+import pytest
+import pandas as pd
+import numpy as np
+import json
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import forecastReport
+
+class TestForecastReport:
+
+    def test_cdf_ignores_missing_days(self):
+        data = np.array([[3.0, 1.0], [1.0, np.nan], [2.0, 2.0]])
+        values, cdf = forecastReport.getCDF(data)
+        assert np.array_equal(values[:, 0], [1, 2, 3])
+        assert np.allclose(cdf[:, 0], [1/3, 2/3, 1])
+        assert np.allclose(cdf[:2, 1], [0.5, 1]) and np.isnan(cdf[2, 1])
+
+    def test_report_files_and_stats(self, tmp_path):
+        """Test report of a region with CarbonCast forecasts only"""
+        rng = np.random.default_rng(0)
+        times = pd.date_range("2021-07-01", periods=96*3, freq="h")
+        actual = rng.uniform(100, 500, len(times))
+        for exptNum in range(2):
+            pd.DataFrame({"datetime": times, "carbon_intensity_actual": actual,
+                          "avg_carbon_intensity_forecast": actual + rng.normal(0, 20, len(times))}).to_csv(
+                os.path.join(tmp_path, "XX_direct_"+str(exptNum)+".csv"), index=False)
+        configFileName = os.path.join(tmp_path, "secondTierConfig.json")
+        with open(configFileName, "w") as configFile:
+            json.dump({"XX": {"DIRECT_CEF_OUT_FILE_NAME_PREFIX": "XX_direct"}}, configFile)
+        outDir = os.path.join(tmp_path, "report")
+
+        reports = forecastReport.runReport(["XX"], ["direct"], outDir, ["png", "svg"], 1, configFileName)
+        assert reports[0]["status"] == "ok"
+        assert list(reports[0]["series"].keys()) == ["CarbonCast 0", "CarbonCast 1"]
+        assert reports[0]["series"]["CarbonCast 0"]["num_days"] == 3
+        for fileName in reports[0]["files"] + ["mape_boxplots.png", "mape_boxplots.svg"]:
+            assert os.path.exists(os.path.join(outDir, fileName))
+        with open(os.path.join(outDir, "report_stats.json")) as statsFile:
+            stats = json.load(statsFile)
+        assert len(stats["regions"][0]["series"]["CarbonCast 1"]["p90"]) == 4
@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+import sys
+import os
+import warnings
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from carbonIntensityEngine import calculateCarbonIntensity
+from generationMixScenarios import (calculateScenarioCarbonIntensity, getScenarioGrid,
+                                    getScenarioMatrices, summarizeScenarios)
+
+class TestGenerationMixScenarios:
+
+    sources = ["coal", "nat_gas", "solar"]
+    emission_factors = np.array([760.0, 370.0, 0.0])
+    source_data = np.array([[100.0, 200.0, 50.0],
+                            [150.0, 250.0, 0.0],
+                            [120.0, 300.0, 400.0]])
+
+    def test_baseline_scenario_matches_carbon_intensity(self):
+        """Test that a scenario without perturbations gives the real carbon intensity"""
+        names, scale, offset = getScenarioMatrices(self.sources, [{"name": "baseline"}])
+        result = calculateScenarioCarbonIntensity(self.source_data, self.emission_factors, scale, offset,
+                                                  dtype=np.float64)
+        expected, _, _ = calculateCarbonIntensity(self.source_data, self.emission_factors, decimals=None)
+        assert names == ["baseline"]
+        assert np.allclose(result[0], expected)
+
+    def test_scale_and_add(self):
+        """Test additive and multiplicative perturbations, clipping negative production to 0"""
+        scenarios = [{"scale": {"nat_gas": 0.5}, "add": {"solar": 100}},
+                     {"add": {"coal": -1000}}]
+        _, scale, offset = getScenarioMatrices(self.sources, scenarios)
+        result = calculateScenarioCarbonIntensity(self.source_data, self.emission_factors, scale, offset,
+                                                  dtype=np.float64)
+        mix = np.array([100.0, 100.0, 150.0])
+        assert result[0, 0] == pytest.approx(np.dot(mix, self.emission_factors) / mix.sum())
+        mix = np.array([0.0, 200.0, 50.0])
+        assert result[1, 0] == pytest.approx(np.dot(mix, self.emission_factors) / mix.sum())
+
+    def test_chunking_gives_same_result(self):
+        """Test that small scenario chunks give the same result as a single chunk"""
+        scenarios = getScenarioGrid({"nat_gas": [0.5, 1.0, 1.5]}, {"solar": [0, 500, 1000]})
+        assert len(scenarios) == 9
+        _, scale, offset = getScenarioMatrices(self.sources, scenarios)
+        single = calculateScenarioCarbonIntensity(self.source_data, self.emission_factors, scale, offset)
+        chunked = calculateScenarioCarbonIntensity(self.source_data, self.emission_factors, scale, offset,
+                                                   maxChunkBytes=1)
+        assert np.array_equal(single, chunked)
+
+    def test_zero_baseline_has_no_relative_change(self):
+        """Test an all-zero baseline gives NaN instead of inf for the relative change of the mean"""
+        scenarioCarbonIntensity = np.array([[0.0, 0.0, 0.0], [10.0, 20.0, 30.0]])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            summary = summarizeScenarios(["baseline", "gas"], scenarioCarbonIntensity, np.zeros(3))
+        assert summary["mean_change_percent"].isna().all()
+        summary = summarizeScenarios(["baseline", "gas"], scenarioCarbonIntensity, np.full(3, 10.0))
+        assert np.allclose(summary["mean_change_percent"], [-100.0, 100.0])
@@ -0,0 +1,53 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from hourlyReindex import reindexHourly
+
+class TestHourlyReindex:
+
+    def get_dataset_with_gap(self):
+        return pd.DataFrame({
+            'UTC time': pd.to_datetime(['2021-07-01 00:00:00', '2021-07-01 01:00:00', '2021-07-01 04:00:00']),
+            'coal': [100, 160, 250],
+            'solar': [0.0, 30.0, 60.0]
+        })
+
+    def test_reindex_inserts_missing_hours(self):
+        """Test that missing hours are inserted and flagged"""
+        result, inserted = reindexHourly(self.get_dataset_with_gap())
+        assert len(result) == 5
+        assert (result['UTC time'].diff().dropna() == pd.Timedelta(hours=1)).all()
+        assert inserted.tolist() == [False, False, True, True, False]
+        assert result['coal'].tolist() == [100, 160, 160, 160, 250]
+        assert result['coal'].dtype == np.int64
+
+    @pytest.mark.parametrize("fill_policy, expected", [
+        ("linear", [0.0, 30.0, 40.0, 50.0, 60.0]),
+        ("zero", [0.0, 30.0, 0.0, 0.0, 60.0]),
+        ("nan", [0.0, 30.0, np.nan, np.nan, 60.0]),
+    ])
+    def test_reindex_fill_policies(self, fill_policy, expected):
+        """Test the fill policies for inserted hours"""
+        result, _ = reindexHourly(self.get_dataset_with_gap(), fillPolicy=fill_policy)
+        np.testing.assert_array_equal(result['solar'].values, expected)
+
+    def test_reindex_unordered_with_leading_gap(self):
+        """Test unordered, timezone-aware input and a leading gap before the first row"""
+        df = pd.DataFrame({
+            'UTC time': pd.to_datetime(['2021-07-01 01:00:00+00:00', '2021-07-01 00:00:00+00:00']),
+            'coal': [150, 100]
+        })
+        result, inserted = reindexHourly(df, startDate='2021-06-30 23:00:00')
+        assert not inserted[1:].any() and inserted[0]
+        assert result['coal'].tolist() == [100, 100, 150]
+        assert str(result['UTC time'].dt.tz) == 'UTC'
+
+    def test_reindex_unknown_fill_policy(self):
+        with pytest.raises(ValueError):
+            reindexHourly(self.get_dataset_with_gap(), fillPolicy="mean")
@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import common
+import noiseSweep
+
+TRAIN_WINDOW_HOURS = 24
+PREDICTION_WINDOW_HOURS = 96
+
+def make_predict(numFeatures, seed=0):
+    weights = np.random.default_rng(seed).normal(0, 0.1, (TRAIN_WINDOW_HOURS*numFeatures, 24))
+    def predict(x):
+        return 0.5 + 0.5*np.tanh(np.reshape(x, (len(x), -1)) @ weights)
+    return predict
+
+def forecast_by_loop(predict, history, testData, weatherWindows, numDays):
+    # previous secondTierForecasts.getDayAheadForecasts, one model input at a time
+    history = history.tolist()
+    predictions = []
+    for i in range(numDays):
+        dayAheadPredictions = []
+        tempHistory = history.copy()
+        weatherData = weatherWindows[i]
+        for j in range(0, PREDICTION_WINDOW_HOURS, 24):
+            input_x = np.array(tempHistory, dtype=np.float64)[-TRAIN_WINDOW_HOURS:]
+            input_x = np.append(input_x, weatherData[j:j+24], axis=1)
+            yhat = predict(input_x[np.newaxis].astype(np.float32))[0]
+            dayAheadPredictions.extend(yhat)
+            latestHistory = testData[i*24+j:i*24+j+24, :].tolist()
+            for k in range(24):
+                latestHistory[k][0] = yhat[k]
+            tempHistory.extend(latestHistory)
+        history.extend(testData[i*24:(i+1)*24, :].tolist())
+        predictions.append(dayAheadPredictions)
+    return np.array(predictions)
+
+def make_inputs(rng, numDays=6):
+    testData = rng.uniform(0, 1, ((numDays+3)*24, 3))
+    weatherWindows = rng.uniform(100, 200, (numDays, PREDICTION_WINDOW_HOURS, 2))
+    weatherScaler = common.Scaler().fit(np.reshape(weatherWindows, (-1, 2)))
+    return {"history": rng.uniform(0, 1, (48, 3)), "testData": testData, "weatherWindows": weatherWindows,
+            "weatherScaler": weatherScaler, "ciMin": 100.0, "ciMax": 500.0,
+            "trainWindowHours": TRAIN_WINDOW_HOURS, "predictionWindowHours": PREDICTION_WINDOW_HOURS,
+            "slidingWindowLen": 24}
+
+class TestNoiseSweep:
+
+    def test_batched_forecasts_match_loop(self):
+        """Test batched walk-forward forecasts against the forecast of one day at a time"""
+        rng = np.random.default_rng(0)
+        inputs = make_inputs(rng)
+        predict = make_predict(5)
+        weatherWindows = rng.uniform(0, 1, (3, 6, PREDICTION_WINDOW_HOURS, 2))
+        predictions = common.getBatchedDayAheadForecasts(predict, inputs["history"], inputs["testData"],
+                            weatherWindows, TRAIN_WINDOW_HOURS, PREDICTION_WINDOW_HOURS, 24)
+        assert predictions.shape == (3, 6, PREDICTION_WINDOW_HOURS)
+        for b in range(3):
+            expected = forecast_by_loop(predict, inputs["history"][-TRAIN_WINDOW_HOURS:], inputs["testData"],
+                                        weatherWindows[b], 6)
+            assert np.allclose(predictions[b], expected, atol=1e-5)
+
+    def test_noisy_forecasts(self):
+        rng = np.random.default_rng(0)
+        forecast = np.tile(np.repeat([10.0, 1000.0], 24), (200, 2)) # (days x 96), block means 10 & 1000
+        noisy = noiseSweep.getNoisyForecasts(forecast, np.array([0.01, 0.1]), 2, rng)
+        assert noisy.shape == (2, 2, 200, 96)
+        # same standard normal samples for all noise levels of a seed
+        assert np.allclose((noisy[1]-forecast), 10*(noisy[0]-forecast))
+        assert np.std(noisy[1, :, :, 24:48]-1000) == pytest.approx(100, rel=0.05)
+        assert (noiseSweep.getNoisyForecasts(forecast, np.array([5.0]), 1, rng) >= 0).all()
+
+    def test_sweep_table(self):
+        rng = np.random.default_rng(0)
+        inputs = make_inputs(rng)
+        sources = noiseSweep.getForecastSources(["avg_coal_production_forecast", "temperature",
+                                                 "avg_nat_gas_production_forecast"])
+        assert sources == {"coal": 0, "nat_gas": 2}
+        levels = noiseSweep.getNoiseLevels(4, 0.4)
+        assert np.allclose(levels, [0.1, 0.2, 0.3, 0.4])
+        table = noiseSweep.sweepSources(make_predict(5), inputs, {"coal": 0, "wind": 1}, levels, 3,
+                                        maxBatchSamples=20)
+        assert len(table) == 2 * 5 * 4 # sources x (no noise + levels) x lead days
+        clean = table[table["noise_level"] == 0]
+        assert (clean["mape_degradation"] == 0).all()
+        assert np.allclose(clean[clean["source"] == "coal"]["mean_mape"], clean[clean["source"] == "wind"]["mean_mape"])
+        assert (table[table["noise_level"] > 0]["mean_mape_std"] > 0).all()
@@ -0,0 +1,63 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import timeSeriesDiagnostics
+
+def write_region(dataDir, region, rng, numHours=24*60):
+    os.makedirs(os.path.join(dataDir, region), exist_ok=True)
+    hours = np.arange(numHours)
+    dataset = pd.DataFrame()
+    dataset["UTC time"] = pd.date_range("2020-12-01", periods=numHours, freq="h")
+    dataset["carbon_intensity"] = 300 + 50*np.sin(2*np.pi*hours/24) + rng.normal(0, 5, numHours)
+    dataset["solar"] = np.maximum(0, np.sin(2*np.pi*hours/24)) * 100
+    dataset["wind"] = np.cumsum(rng.normal(0, 1, numHours))
+    dataset["nuclear"] = 50.0
+    for emissionFactorType in ["direct", "lifecycle"]:
+        dataset.to_csv(os.path.join(dataDir, region, region+"_"+emissionFactorType+"_emissions.csv"))
+    return dataset
+
+class TestTimeSeriesDiagnostics:
+
+    def test_diagnostics(self):
+        rng = np.random.default_rng(0)
+        hours = np.arange(24*60)
+        seasonal = timeSeriesDiagnostics.runDiagnostics(300 + 50*np.sin(2*np.pi*hours/24) + rng.normal(0, 5, len(hours)))
+        assert seasonal["adf_pvalue"] < 0.05
+        assert seasonal["daily_seasonality_strength"] > 0.9
+        assert seasonal["acf_24"] > 0.8 and seasonal["acf_24"] > seasonal["acf_1"] - 0.2
+        randomWalk = timeSeriesDiagnostics.runDiagnostics(np.cumsum(rng.normal(0, 1, len(hours))))
+        assert randomWalk["adf_pvalue"] > 0.05
+        assert randomWalk["daily_seasonality_strength"] < 0.5
+        assert timeSeriesDiagnostics.runDiagnostics(np.full(100, 3.0)) == {"error": "constant series"}
+
+    def test_only_changed_series_are_recomputed(self, tmp_path, capsys):
+        """Test the content hash cache across runs and data refreshes"""
+        rng = np.random.default_rng(0)
+        dataDir = os.path.join(tmp_path, "data")
+        cacheFileName = os.path.join(tmp_path, "cache.json")
+        dataset = write_region(dataDir, "XX", rng)
+        table = timeSeriesDiagnostics.runAllDiagnostics(["XX"], numWorkers=1, cacheFileName=cacheFileName,
+                                                        dataDir=dataDir)
+        # 2 files x 4 series x (2020, 2021, all), same values in both files
+        assert len(table) == 24
+        assert "12  to compute" in capsys.readouterr().out
+        assert list(table[table["series"] == "nuclear"]["error"].unique()) == ["constant series"]
+        assert (table[table["series"] == "carbon_intensity"]["daily_seasonality_strength"] > 0.9).all()
+
+        timeSeriesDiagnostics.runAllDiagnostics(["XX"], numWorkers=1, cacheFileName=cacheFileName, dataDir=dataDir)
+        assert "0  to compute" in capsys.readouterr().out
+
+        # wind changes in 2021 only
+        dataset.loc[dataset["UTC time"] >= "2021-01-15", "wind"] += 10
+        for emissionFactorType in ["direct", "lifecycle"]:
+            dataset.to_csv(os.path.join(dataDir, "XX", "XX_"+emissionFactorType+"_emissions.csv"))
+        refreshed = timeSeriesDiagnostics.runAllDiagnostics(["XX"], numWorkers=1, cacheFileName=cacheFileName,
+                                                            dataDir=dataDir)
+        assert "2  to compute" in capsys.readouterr().out
+        assert (refreshed["hash"] != table["hash"]).sum() == 4
@@ -0,0 +1,66 @@
+import pytest
+import pandas as pd
+import numpy as np
+import json5
+import pytz
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import timeZones
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+def local_time_by_loop(dateTime, localTimeZone):
+    # previous getDatesInLocalTimeZone, one timestamp at a time
+    dates = []
+    fromZone = pytz.timezone("UTC")
+    for i in range(0, len(dateTime)):
+        day = pd.to_datetime(dateTime[i]).replace(tzinfo=fromZone)
+        dates.append(day.astimezone(pytz.timezone(localTimeZone)))
+    return dates
+
+class TestTimeZones:
+
+    def test_registry_matches_configs(self):
+        for configFileName in ["firstTierConfig.json", "secondTierConfig.json"]:
+            with open(os.path.join(SRC_DIR, configFileName), "r") as configFile:
+                config = json5.load(configFile)
+            for region, value in config.items():
+                if (isinstance(value, dict) and "LOCAL_TIMEZONE" in value):
+                    assert timeZones.getRegionTimeZone(region) == value["LOCAL_TIMEZONE"]
+        with pytest.raises(ValueError):
+            timeZones.getRegionTimeZone("XX")
+
+    def test_weather_default_region_has_timezone(self):
+        """Test AUS_SA, the default region of weather/cleanWeatherData.py, has a timezone"""
+        localTime = timeZones.toLocalTime(["2021-07-01 00:00:00"], timeZones.getRegionTimeZone("AUS_SA"))
+        assert str(localTime[0]) == "2021-07-01 09:30:00+09:30" # ACST
+
+    def test_local_time_matches_loop(self):
+        """Test vectorized conversion against pytz, one timestamp at a time, across DST changes"""
+        dateTime = pd.date_range("2021-03-01", "2021-11-30", freq="h").values
+        for localTimeZone in ["US/Pacific", "CET"]:
+            localTime = timeZones.toLocalTime(dateTime, localTimeZone)
+            expected = local_time_by_loop(dateTime, localTimeZone)
+            assert all(a == b and a.utcoffset() == b.utcoffset() for a, b in zip(localTime, expected))
+            dayStarts = timeZones.getLocalDayStarts(dateTime.astype(str), localTimeZone)
+            assert list(dayStarts) == expected[::24]
+
+    def test_aggregate_local_time(self):
+        dateTime = pd.date_range("2021-10-30 21:00", periods=30, freq="h")
+        data = pd.DataFrame({"ci": np.arange(30, dtype=float)})
+        # DST ends on 2021-10-31 in CET: local 02:00 happens twice
+        counts = timeZones.aggregateLocalTime(data, dateTime, "CET", by="date_hour", func="count")
+        assert counts.loc[(pd.Timestamp("2021-10-31"), 2), "ci"] == 2 and counts["ci"].sum() == 30
+        hourly = timeZones.aggregateLocalTime(data, dateTime, "CET", by="hour", func="count")
+        assert hourly.loc[2, "ci"] == 3 and hourly.loc[3, "ci"] == 2
+        daily = timeZones.aggregateLocalTime(data["ci"], dateTime, "CET", by="date")
+        assert list(daily.index.strftime("%Y-%m-%d")) == ["2021-10-30", "2021-10-31", "2021-11-01"]
+        assert daily.iloc[0] == 0 and daily.iloc[1] == np.mean(np.arange(1, 26)) # 25 hours
+        both = timeZones.aggregateLocalTime(np.arange(30), dateTime, "CET", by="date_hour", func="sum")
+        assert both.index.names == ["date", "hour"] and both.values.sum() == np.arange(30).sum()
+        with pytest.raises(ValueError):
+            timeZones.aggregateLocalTime(data, dateTime, "CET", by="week")